@@ -0,0 +1,135 @@
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from core.activity_facets import record_facets
+from core.caching import bump_content_version
+from core.metrics import Gauge
+from core.models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+# Rows touched per transaction; keeps row locks short on large selections
+BULK_CHUNK_SIZE = 500
+
+# Selections larger than this run in the background worker
+BULK_ASYNC_THRESHOLD = 2000
+
+JOB_KEY_PREFIX = 'bulk-job:'
+JOB_TTL = 60 * 60
+
+# A single worker keeps background bulk jobs from competing for table locks
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bulk-action')
+_pending_jobs = 0
+_pending_lock = threading.Lock()
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _audit_rows(user, action, content_type, objects, ip_address):
+    return [
+        ActivityLog(
+            user=user,
+            action=action,
+            content_type=content_type,
+            object_id=obj.pk,
+            object_repr=str(obj)[:200],
+            ip_address=ip_address,
+        )
+        for obj in objects
+    ]
+
+
+def _apply_chunk(model, action, ids, user, content_type, ip_address):
+    """Apply the action to one chunk of ids and audit every affected row"""
+    with transaction.atomic():
+        objects = list(model.objects.filter(id__in=ids))
+        if not objects:
+            return 0
+
+        if action == 'delete':
+            model.objects.filter(id__in=[obj.pk for obj in objects]).delete()
+            log_action = 'delete'
+        elif action == 'approve':
+            model.objects.filter(id__in=[obj.pk for obj in objects]).update(is_approved=True, approved_by=user)
+            log_action = 'update'
+        elif action == 'mark_read':
+            model.objects.filter(id__in=[obj.pk for obj in objects]).update(is_read=True)
+            log_action = 'update'
+        else:
+            raise ValueError(f"Unsupported bulk action '{action}'")
+
+        audit_rows = ActivityLog.objects.bulk_create(_audit_rows(user, log_action, content_type, objects, ip_address))
+        record_facets(audit_rows)
+        return len(objects)
+
+
+def run_bulk_action(model, action, object_ids, user, content_type, ip_address=None, job_id=None):
+    """Run a bulk action in bounded chunks, returning the number of affected rows"""
+    ids = sorted(set(object_ids))
+    processed = 0
+
+    for chunk in _chunks(ids, BULK_CHUNK_SIZE):
+        processed += _apply_chunk(model, action, chunk, user, content_type, ip_address)
+        if job_id:
+            _update_job(job_id, status='running', processed=processed)
+
+    if action != 'delete':
+        # update() sends no post_save, so invalidate cached pages explicitly
+        bump_content_version(model)
+
+    return processed
+
+
+def _update_job(job_id, **fields):
+    key = JOB_KEY_PREFIX + job_id
+    job = cache.get(key, {})
+    job.update(fields)
+    cache.set(key, job, JOB_TTL)
+
+
+def get_job(job_id):
+    """Return the progress record of a background bulk job, or None"""
+    return cache.get(JOB_KEY_PREFIX + job_id)
+
+
+def _run_job(job_id, model, action, object_ids, user, content_type, ip_address):
+    global _pending_jobs
+    close_old_connections()
+    try:
+        processed = run_bulk_action(model, action, object_ids, user, content_type, ip_address, job_id)
+        _update_job(job_id, status='done', processed=processed)
+    except Exception as e:
+        logger.exception("Bulk job %s failed", job_id)
+        _update_job(job_id, status='failed', error=str(e))
+    finally:
+        close_old_connections()
+        with _pending_lock:
+            _pending_jobs -= 1
+
+
+def pending_bulk_jobs():
+    """Background bulk jobs queued or running in this process"""
+    return _pending_jobs
+
+
+Gauge('bulk_action_queue_depth', 'Background bulk actions queued or running', pending_bulk_jobs)
+
+
+def submit_bulk_action(model, action, object_ids, user, content_type, ip_address=None):
+    """Queue a bulk action for the background worker and return its job id"""
+    global _pending_jobs
+    job_id = uuid.uuid4().hex
+    with _pending_lock:
+        _pending_jobs += 1
+    _update_job(job_id, status='queued', action=action, content_type=content_type,
+                total=len(set(object_ids)), processed=0)
+    _executor.submit(_run_job, job_id, model, action, list(object_ids), user, content_type, ip_address)
+    return job_id
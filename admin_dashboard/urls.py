@@ -25,12 +25,20 @@ urlpatterns = [
     path('ajax/toggle-approval/', views.toggle_approval, name='toggle_approval'),
     path('ajax/mark-as-read/', views.mark_as_read, name='mark_as_read'),
     path('ajax/bulk-action/', views.bulk_action, name='bulk_action'),
+    path('ajax/bulk-action/<str:job_id>/', views.bulk_action_status, name='bulk_action_status'),
     
     # Export functionality
     path('export/<str:content_type>/', views.export_csv, name='export_csv'),
     
     # Activity logs
     path('activity-logs/', views.activity_logs, name='activity_logs'),
+    path('ajax/activity-log-users/', views.activity_log_users, name='activity_log_users'),
+    
+    # Performance
+    path('performance/', views.performance, name='performance'),
+    path('performance/slow-queries/', views.slow_queries, name='slow_queries'),
+    path('performance/profiles/', views.profiling, name='profiling'),
+    path('performance/profiles/<str:profile_id>/', views.profile_detail, name='profile_detail'),
     
     # Settings
     path('settings/', views.admin_settings, name='admin_settings'),
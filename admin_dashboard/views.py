@@ -23,8 +23,16 @@ import json
 from datetime import datetime, timedelta
 from django.utils import timezone
 
+from .bulk import BULK_ASYNC_THRESHOLD, get_job, run_bulk_action, submit_bulk_action
 from .decorators import admin_required, superuser_required
 from core.models import *
+from core.audit import log_activity
+from core.activity_archive import search_archives
+from core.activity_facets import get_facets, search_users
+from core.instrumentation import reset_route_stats, route_stats
+from core.slow_queries import clear_slow_queries, slow_query_groups
+from core.profiling import PROFILE_SESSION_KEY, flame_boxes, get_profile, profile_url, stored_profiles
+from core.query_budgets import query_budget
 from core.forms import (
     AboutUsForm,
     SolutionForm,
@@ -37,6 +45,7 @@ from core.forms import (
 )
 
 
+@query_budget(5)
 def admin_login(request):
     """Admin login view"""
     if request.user.is_authenticated and request.user.has_admin_access():
@@ -52,7 +61,7 @@ def admin_login(request):
             messages.success(request, f'Welcome back, {user.first_name or user.username}!')
             
             # Log activity
-            ActivityLog.objects.create(
+            log_activity(
                 user=user,
                 action='view',
                 content_type='Admin Dashboard',
@@ -72,7 +81,7 @@ def admin_logout(request):
     """Admin logout view"""
     if request.user.is_authenticated:
         # Log activity
-        ActivityLog.objects.create(
+        log_activity(
             user=request.user,
             action='view',
             content_type='Admin Dashboard',
@@ -85,6 +94,7 @@ def admin_logout(request):
     messages.success(request, 'You have been logged out successfully.')
     return redirect('admin_login')
 
+@query_budget(33)
 @admin_required
 def admin_dashboard(request):
     """Main admin dashboard view"""
@@ -274,6 +284,13 @@ def content_form(request, content_type, object_id=None):
                 obj.created_by = request.user
 
             obj.save()
+            log_activity(
+                user=request.user,
+                action='update' if instance else 'create',
+                content_type=content_type.capitalize(),
+                obj=obj,
+                ip_address=get_client_ip(request)
+            )
             messages.success(
                 request,
                 f"{content_type.capitalize()} {'updated' if instance else 'created'} successfully."
@@ -319,7 +336,16 @@ def delete_content(request, content_type, object_id):
     instance = get_object_or_404(model, id=object_id)
 
     if request.method == 'POST':
+        object_id, object_repr = instance.pk, str(instance)
         instance.delete()
+        log_activity(
+            user=request.user,
+            action='delete',
+            content_type=content_type.capitalize(),
+            object_id=object_id,
+            object_repr=object_repr,
+            ip_address=get_client_ip(request)
+        )
         messages.success(request, f"{content_type.capitalize()} deleted successfully.")
         return redirect('content_list', content_type=content_type)
 
@@ -405,6 +431,7 @@ def mark_as_read(request):
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)})
 
+@query_budget(8)
 @admin_required
 def change_password(request):
     """Change admin password"""
@@ -422,6 +449,7 @@ def change_password(request):
     
     return render(request, 'admin/change_password.html', {'form': form})
 
+@query_budget(8)
 def password_reset_request(request):
     """Password reset request view"""
     if request.method == 'POST':
@@ -460,6 +488,7 @@ def password_reset_request(request):
     
     return render(request, 'admin/password_reset.html', {'form': form})
 
+@query_budget(5)
 def password_reset_confirm(request, uidb64, token):
     """Password reset confirmation view"""
     try:
@@ -503,86 +532,238 @@ def bulk_action(request):
                 'solutions': Solution,
                 'users': CustomUser,
                 'newsletter': Newsletter,
-                'team': TeamMemberForm,
+                'team': TeamMember,
                 'about': AboutUs,
             }
             
             if content_type not in model_mapping:
                 return JsonResponse({'success': False, 'error': 'Invalid content type'})
             
+            if not (action == 'delete'
+                    or (action == 'approve' and content_type == 'feedback')
+                    or (action == 'mark_read' and content_type == 'inquiries')):
+                return JsonResponse({'success': False, 'error': 'Invalid action'})
+            
             model = model_mapping[content_type]
-            queryset = model.objects.filter(id__in=object_ids)
+            args = (model, action, object_ids, request.user, content_type.capitalize(), get_client_ip(request))
+            
+            # Large selections are processed by the background worker
+            if len(object_ids) > BULK_ASYNC_THRESHOLD:
+                job_id = submit_bulk_action(*args)
+                return JsonResponse({
+                    'success': True,
+                    'job_id': job_id,
+                    'status_url': reverse('bulk_action_status', kwargs={'job_id': job_id}),
+                })
+            
+            count = run_bulk_action(*args)
             
             if action == 'delete':
-                count = queryset.count()
-                queryset.delete()
                 messages.success(request, f'{count} items deleted successfully.')
-            elif action == 'approve' and content_type == 'feedback':
-                queryset.update(is_approved=True, approved_by=request.user)
-                messages.success(request, f'{queryset.count()} feedback items approved.')
-            elif action == 'mark_read' and content_type == 'inquiries':
-                queryset.update(is_read=True)
-                messages.success(request, f'{queryset.count()} inquiries marked as read.')
+            elif action == 'approve':
+                messages.success(request, f'{count} feedback items approved.')
+            elif action == 'mark_read':
+                messages.success(request, f'{count} inquiries marked as read.')
             
-            # Log bulk action
-            ActivityLog.objects.create(
-                user=request.user,
-                action='bulk_' + action,
-                content_type=content_type.capitalize(),
-                object_id=0,
-                object_repr=f'Bulk action on {len(object_ids)} items',
-                ip_address=get_client_ip(request)
-            )
-            
-            return JsonResponse({'success': True})
+            return JsonResponse({'success': True, 'processed': count})
             
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
+@query_budget(5)
+@admin_required
+def bulk_action_status(request, job_id):
+    """Progress of a background bulk action"""
+    job = get_job(job_id)
+    if job is None:
+        return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+    return JsonResponse({'success': True, **job})
+
+def _day_start(value):
+    """Parse a YYYY-MM-DD filter into the aware start of that day, or None"""
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+    return timezone.make_aware(day)
+
+@query_budget(11)
 @admin_required
 def activity_logs(request):
-    """View activity logs"""
-    logs = ActivityLog.objects.select_related('user').order_by('-timestamp')
-    
-    # Filter by user if specified
-    user_filter = request.GET.get('user')
-    if user_filter:
-        logs = logs.filter(user__username__icontains=user_filter)
-    
-    # Filter by action if specified
-    action_filter = request.GET.get('action')
-    if action_filter:
-        logs = logs.filter(action=action_filter)
-    
-    # Filter by date range if specified
-    date_from = request.GET.get('date_from')
-    date_to = request.GET.get('date_to')
-    if date_from:
-        logs = logs.filter(timestamp__date__gte=date_from)
-    if date_to:
-        logs = logs.filter(timestamp__date__lte=date_to)
+    """View activity logs, from the database or from the monthly archives"""
+    source = request.GET.get('source', 'live')
+    user_filter = request.GET.get('user', '')
+    action_filter = request.GET.get('action', '')
+    object_filter = request.GET.get('object', '')
+    date_from = request.GET.get('date_from', '')
+    date_to = request.GET.get('date_to', '')
+    
+    # Actions and users for the filters come from the cached facet table
+    facets = get_facets()
+    user_id = int(user_filter) if user_filter.isdigit() else None
+    selected_user = facets['users'].get(user_id, {}).get('username', '')
+    
+    # Date filters become plain timestamp ranges so the indexes can be used
+    start = _day_start(date_from)
+    end = _day_start(date_to)
+    if end:
+        end += timedelta(days=1)
+    
+    if source == 'archive':
+        logs = search_archives(user_id=user_id, action=action_filter, start=start, end=end,
+                               object_query=object_filter)
+    else:
+        logs = ActivityLog.objects.select_related('user').order_by('-timestamp')
+        
+        # Filter by user if specified
+        if user_id is not None:
+            logs = logs.filter(user_id=user_id)
+        
+        # Filter by action if specified
+        if action_filter:
+            logs = logs.filter(action=action_filter)
+        
+        if start:
+            logs = logs.filter(timestamp__gte=start)
+        if end:
+            logs = logs.filter(timestamp__lt=end)
     
     # Pagination
     paginator = Paginator(logs, 50)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Get unique actions for filter
-    actions = ActivityLog.objects.values_list('action', flat=True).distinct()
+    # Keep the filters when paging
+    filter_query = request.GET.copy()
+    filter_query.pop('page', None)
     
     context = {
         'page_obj': page_obj,
-        'actions': actions,
-        'user_filter': user_filter,
+        'actions': facets['actions'],
+        'filter_query': filter_query.urlencode(),
+        'source': source,
+        'user_filter': user_id or '',
+        'selected_user': selected_user,
         'action_filter': action_filter,
+        'object_filter': object_filter,
         'date_from': date_from,
         'date_to': date_to,
     }
     
     return render(request, 'admin/activity_logs.html', context)
 
+@query_budget(6)
+@admin_required
+def activity_log_users(request):
+    """Username autocomplete for the activity log user filter"""
+    users = search_users(request.GET.get('q', ''))
+    return JsonResponse({
+        'results': [{'id': user['id'], 'username': user['username']} for user in users]
+    })
+
+def _instrumented_url_names():
+    """Namespaced names of every named URL in core.urls and admin_dashboard.urls"""
+    from core import urls as core_urls
+    from admin_dashboard import urls as admin_urls
+    
+    names = []
+    for module in (core_urls, admin_urls):
+        for pattern in module.urlpatterns:
+            name = getattr(pattern, 'name', None)
+            if name and name not in names:
+                names.append(name)
+    return names
+
+@query_budget(8)
+@admin_required
+def performance(request):
+    """Per-route latency and query percentiles collected by RequestTimingMiddleware"""
+    if request.method == 'POST':
+        reset_route_stats()
+        messages.success(request, 'Performance statistics reset.')
+        return redirect('performance')
+    
+    stats = route_stats()
+    routes = []
+    for name in _instrumented_url_names():
+        routes.append({'name': name, 'stats': stats.pop(name, None)})
+    
+    # Slowest routes first; routes without traffic at the end
+    routes.sort(key=lambda route: -route['stats']['p95'] if route['stats'] else 0)
+    
+    context = {
+        'routes': routes,
+        'total_requests': sum(route['stats']['requests'] for route in routes if route['stats']),
+    }
+    
+    return render(request, 'admin/performance.html', context)
+
+@query_budget(8)
+@admin_required
+def slow_queries(request):
+    """Slow queries captured by this server process, grouped by fingerprint"""
+    if request.method == 'POST':
+        clear_slow_queries()
+        messages.success(request, 'Slow query log cleared.')
+        return redirect('slow_queries')
+    
+    context = {
+        'groups': slow_query_groups(),
+        'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+        'sample_rate': settings.SLOW_QUERY_SAMPLE_RATE,
+        'buffer_size': settings.SLOW_QUERY_BUFFER_SIZE,
+    }
+    
+    return render(request, 'admin/slow_queries.html', context)
+
+@query_budget(8)
+@admin_required
+def profiling(request):
+    """Stored request profiles, the session profiling switch and signed profile links"""
+    signed_url = None
+    
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'toggle':
+            enabled = not request.session.get(PROFILE_SESSION_KEY, False)
+            request.session[PROFILE_SESSION_KEY] = enabled
+            messages.success(request, f"Profiling of your requests {'enabled' if enabled else 'disabled'}.")
+            return redirect('profiling')
+        if action == 'link':
+            path = request.POST.get('path', '').strip()
+            if path.startswith('/'):
+                signed_url = profile_url(request.user, path)
+            else:
+                messages.error(request, 'Enter a path starting with /.')
+    
+    context = {
+        'profiles': stored_profiles(),
+        'session_profiling': request.session.get(PROFILE_SESSION_KEY, False),
+        'signed_url': signed_url,
+    }
+    
+    return render(request, 'admin/profiling.html', context)
+
+@query_budget(5)
+@admin_required
+def profile_detail(request, profile_id):
+    """Flame graph or cProfile statistics of one profiled request"""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise Http404("Profile not found")
+    
+    boxes, depth = flame_boxes(profile['stacks'])
+    
+    context = {
+        'profile': profile,
+        'boxes': boxes,
+        'flame_height': depth * 18,
+    }
+    
+    return render(request, 'admin/profile_detail.html', context)
+
 @admin_required
 def admin_settings(request):
     """Admin settings view"""
@@ -591,15 +772,14 @@ def admin_settings(request):
     if request.method == 'POST':
         # Update site settings
         site_settings.site_name = request.POST.get('site_name', '')
-        site_settings.site_description = request.POST.get('site_description', '')
         site_settings.contact_email = request.POST.get('contact_email', '')
         site_settings.contact_phone = request.POST.get('contact_phone', '')
         site_settings.address = request.POST.get('address', '')
-        site_settings.social_facebook = request.POST.get('social_facebook', '')
-        site_settings.social_twitter = request.POST.get('social_twitter', '')
-        site_settings.social_linkedin = request.POST.get('social_linkedin', '')
-        site_settings.google_analytics_id = request.POST.get('google_analytics_id', '')
-        site_settings.maintenance_mode = request.POST.get('maintenance_mode') == 'on'
+        site_settings.facebook_url = request.POST.get('facebook_url', '')
+        site_settings.twitter_url = request.POST.get('twitter_url', '')
+        site_settings.linkedin_url = request.POST.get('linkedin_url', '')
+        site_settings.instagram_url = request.POST.get('instagram_url', '')
+        site_settings.youtube_url = request.POST.get('youtube_url', '')
         site_settings.save()
         
         messages.success(request, 'Settings updated successfully.')
@@ -620,6 +800,7 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 # Content List View
+@query_budget(11)
 @admin_required
 def content_list(request, content_type):
     """Generic content listing view"""
@@ -689,6 +870,7 @@ def content_list(request, content_type):
     return render(request, 'admin/content_list.html', context)
 
 # Content Form View
+@query_budget(9)
 @admin_required
 def content_form(request, content_type, object_id=None):
     """
@@ -739,6 +921,13 @@ def content_form(request, content_type, object_id=None):
             if content_type == 'events' and not obj.created_by:
                 obj.created_by = request.user
             obj.save()
+            log_activity(
+                user=request.user,
+                action='update' if instance else 'create',
+                content_type=content_type.capitalize(),
+                obj=obj,
+                ip_address=get_client_ip(request)
+            )
             messages.success(request, f"{content_type.capitalize()} {'updated' if instance else 'created'} successfully.")
             return redirect('content_list', content_type=content_type)
         else:
@@ -779,7 +968,16 @@ def delete_content(request, content_type, object_id):
     instance = get_object_or_404(model, id=object_id)
     
     if request.method == 'POST':
+        object_id, object_repr = instance.pk, str(instance)
         instance.delete()
+        log_activity(
+            user=request.user,
+            action='delete',
+            content_type=content_type.capitalize(),
+            object_id=object_id,
+            object_repr=object_repr,
+            ip_address=get_client_ip(request)
+        )
         messages.success(request, f'{content_type.capitalize()} deleted successfully.')
         return redirect('content_list', content_type=content_type)
     
@@ -789,6 +987,7 @@ def delete_content(request, content_type, object_id):
     })
 
 # Export Content to CSV
+@query_budget(6)
 @admin_required
 def export_csv(request, content_type):
     """Export content to CSV"""
@@ -1,5 +1,5 @@
 import os
-from decouple import config
+from decouple import config, Csv
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -39,18 +40,28 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.replicas.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'ai_solution.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    # Parse each template once per process in production
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -66,21 +77,58 @@ TEMPLATES = [
 WSGI_APPLICATION = 'ai_solution.wsgi.application'
 
 # Database
+# Connections come from a bounded pool per worker process (see core.db_pool):
+# at most DB_POOL_SIZE open connections, a request waits up to
+# DB_POOL_TIMEOUT seconds for one, and connections are replaced after
+# DB_POOL_MAX_AGE seconds. DB_POOL_SIZE=0 opens a connection per request.
+DB_POOL = {
+    'MAX_SIZE': config('DB_POOL_SIZE', default=10, cast=int),
+    'TIMEOUT': config('DB_POOL_TIMEOUT', default=5.0, cast=float),
+    'MAX_AGE': config('DB_POOL_MAX_AGE', default=300, cast=int),
+}
 DATABASES = {
   'default': {
-    'ENGINE': 'django.db.backends.mysql',
+    'ENGINE': 'core.db_backends.mysql',
     'NAME': config('DB_NAME'),
     'USER': config('DB_USER'),
     'PASSWORD': config('DB_PASSWORD'),
     'HOST': config('DB_HOST'),
     'PORT': config('DB_PORT'),
     'OPTIONS': {'charset': 'utf8mb4'},
+    'POOL': DB_POOL,
   },
   'sqlite_old': {  # SOURCE (SQLite)
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     },
 }
+
+# Read replicas (see core.replicas). DB_REPLICAS lists replicas as
+# "host=weight" (weight defaults to 1) that share the primary's credentials;
+# a path ending in .sqlite3 stands in for a replica in local testing. Each
+# becomes the database alias replica_<n>.
+DATABASE_REPLICAS = {}
+for index, replica in enumerate(config('DB_REPLICAS', default='', cast=Csv()), start=1):
+    location, _, weight = replica.partition('=')
+    alias = f'replica_{index}'
+    if location.endswith('.sqlite3'):
+        DATABASES[alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': location}
+    else:
+        DATABASES[alias] = {**DATABASES['default'], 'HOST': location}
+    # Tests run against the primary's test database only
+    DATABASES[alias]['TEST'] = {'MIRROR': 'default'}
+    DATABASE_REPLICAS[alias] = int(weight or 1)
+
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
+# Anonymous GETs to views in these modules read from replicas. A browser that
+# wrote reads from the primary for REPLICA_PIN_SECONDS. Replicas are checked
+# every REPLICA_HEALTH_INTERVAL seconds and dropped when unreachable or more
+# than REPLICA_MAX_LAG seconds behind.
+REPLICA_VIEW_MODULES = ['core.views']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=10, cast=int)
+REPLICA_HEALTH_INTERVAL = config('REPLICA_HEALTH_INTERVAL', default=5, cast=float)
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=30, cast=int)
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -133,11 +181,110 @@ EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='your-email@gmail.com')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='your-app-password')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Two-tier cache (see core.cache_backends): a per-process LRU in front of a
+# cache shared by every worker, Redis when REDIS_URL is set and otherwise
+# files under CACHE_DIR, which only workers on one host can share. Workers
+# drop entries other workers changed within CACHE_SYNC_INTERVAL seconds.
+# Locks, sessions and counters skip the L1.
+REDIS_URL = config('REDIS_URL', default='')
+CACHE_DIR = config('CACHE_DIR', default=str(BASE_DIR / 'logs' / 'cache'))
+CACHE_L1_MAX_ENTRIES = config('CACHE_L1_MAX_ENTRIES', default=2000, cast=int)
+CACHE_L1_MAX_BYTES = config('CACHE_L1_MAX_BYTES', default=32 * 1024 * 1024, cast=int)
+CACHE_L1_TIMEOUT = config('CACHE_L1_TIMEOUT', default=30, cast=int)
+CACHE_SYNC_INTERVAL = config('CACHE_SYNC_INTERVAL', default=1.0, cast=float)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache_backends.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'L1_MAX_ENTRIES': CACHE_L1_MAX_ENTRIES,
+            'L1_MAX_BYTES': CACHE_L1_MAX_BYTES,
+            'L1_TIMEOUT': CACHE_L1_TIMEOUT,
+            'SYNC_INTERVAL': CACHE_SYNC_INTERVAL,
+            'L1_EXCLUDE': ['lock:', 'cache-metrics:', 'core.cached_sessions:'],
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'core.cache_backends.LockedFileBasedCache',
+        'LOCATION': CACHE_DIR,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
 # Session Configuration
 SESSION_COOKIE_AGE = 1800  # 30 minutes
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_SAVE_EVERY_REQUEST = True
 
+# Sessions are read from the cache and written to the database in the
+# background (see core.cached_sessions). The sliding expiry is only written
+# once less than SESSION_REFRESH_THRESHOLD seconds of it remain, i.e. at most
+# every five minutes per session. purge_expired_sessions deletes expired rows
+# SESSION_PURGE_BATCH_SIZE at a time.
+SESSION_ENGINE = 'core.cached_sessions'
+SESSION_REFRESH_THRESHOLD = config('SESSION_REFRESH_THRESHOLD', default=SESSION_COOKIE_AGE - 300, cast=int)
+SESSION_WRITE_ASYNC = config('SESSION_WRITE_ASYNC', default=True, cast=bool)
+SESSION_WRITE_BATCH_SIZE = config('SESSION_WRITE_BATCH_SIZE', default=200, cast=int)
+SESSION_WRITE_FLUSH_MS = config('SESSION_WRITE_FLUSH_MS', default=1000, cast=int)
+SESSION_PURGE_BATCH_SIZE = config('SESSION_PURGE_BATCH_SIZE', default=1000, cast=int)
+
+# Full-page cache for anonymous visitors (seconds)
+PAGE_CACHE_TIMEOUT = config('PAGE_CACHE_TIMEOUT', default=600, cast=int)
+
+# Stampede protection: stale entries are served for up to CACHE_STALE_GRACE
+# seconds while one worker holds the recompute lock (CACHE_LOCK_TIMEOUT).
+CACHE_STALE_GRACE = config('CACHE_STALE_GRACE', default=300, cast=int)
+CACHE_LOCK_TIMEOUT = config('CACHE_LOCK_TIMEOUT', default=10, cast=int)
+CACHE_LOCK_WAIT = config('CACHE_LOCK_WAIT', default=2.0, cast=float)
+
+# Header/footer fragment cache (seconds, 0 disables it)
+FRAGMENT_CACHE_TIMEOUT = config('FRAGMENT_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Activity log writer: records are written in batches of AUDIT_LOG_BATCH_SIZE
+# or every AUDIT_LOG_FLUSH_MS milliseconds. Disable AUDIT_LOG_ASYNC in tests
+# to write each record synchronously.
+AUDIT_LOG_ASYNC = config('AUDIT_LOG_ASYNC', default=True, cast=bool)
+AUDIT_LOG_BATCH_SIZE = config('AUDIT_LOG_BATCH_SIZE', default=100, cast=int)
+AUDIT_LOG_FLUSH_MS = config('AUDIT_LOG_FLUSH_MS', default=500, cast=int)
+
+# Activity log retention: months older than this are moved from the database
+# into compressed JSONL archives by the archive_activity_logs command.
+ACTIVITY_LOG_RETENTION_MONTHS = config('ACTIVITY_LOG_RETENTION_MONTHS', default=12, cast=int)
+ACTIVITY_LOG_ARCHIVE_DIR = config('ACTIVITY_LOG_ARCHIVE_DIR', default=str(BASE_DIR / 'logs' / 'archive'))
+
+# Add a Server-Timing header (total, db, template, cache) to every response.
+# Per-route latency histograms are collected either way.
+SERVER_TIMING_HEADER = config('SERVER_TIMING_HEADER', default=True, cast=bool)
+
+# Queries slower than SLOW_QUERY_THRESHOLD_MS are sampled (at
+# SLOW_QUERY_SAMPLE_RATE, 0 disables) with their parameters, view, stack and
+# EXPLAIN into a ring buffer of SLOW_QUERY_BUFFER_SIZE entries per process.
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=100, cast=int)
+SLOW_QUERY_SAMPLE_RATE = config('SLOW_QUERY_SAMPLE_RATE', default=1.0, cast=float)
+SLOW_QUERY_BUFFER_SIZE = config('SLOW_QUERY_BUFFER_SIZE', default=200, cast=int)
+
+# Admins can profile single requests (see core.profiling). Signed profile links
+# expire after PROFILE_TOKEN_MAX_AGE seconds; the newest PROFILE_STORE_SIZE
+# profiles are kept.
+PROFILE_TOKEN_MAX_AGE = config('PROFILE_TOKEN_MAX_AGE', default=3600, cast=int)
+PROFILE_SAMPLE_INTERVAL_MS = config('PROFILE_SAMPLE_INTERVAL_MS', default=2, cast=int)
+PROFILE_STORE_SIZE = config('PROFILE_STORE_SIZE', default=50, cast=int)
+
+# /metrics is served to requests bearing METRICS_TOKEN ("Authorization: Bearer
+# <token>") or, when set explicitly, coming from METRICS_ALLOWED_IPS. The
+# allow-list is empty by default: behind a reverse proxy on the same host
+# every request arrives from 127.0.0.1. Each worker writes its metrics
+# to METRICS_MULTIPROC_DIR every METRICS_FLUSH_INTERVAL seconds so any worker
+# can report the totals; clear the directory when the server starts.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='', cast=Csv())
+METRICS_MULTIPROC_DIR = config('METRICS_MULTIPROC_DIR', default=str(BASE_DIR / 'logs' / 'metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5, cast=int)
+
 # Security Settings (for production)
 if not DEBUG:
     SECURE_BROWSER_XSS_FILTER = True
@@ -151,14 +298,42 @@ if not DEBUG:
     SECURE_HSTS_PRELOAD = True
 
 # Logging
+# Log records are queued and written by a background thread. The file rotates
+# at LOG_MAX_BYTES or at LOG_ROTATE_WHEN ('midnight' or 'hourly'), rotated files
+# are gzipped and LOG_BACKUP_COUNT of them are kept. LOG_FORMAT is 'text' or
+# 'json' (one object per line with request ID and view name).
+LOG_FORMAT = config('LOG_FORMAT', default='text')
+LOG_MAX_BYTES = config('LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+LOG_BACKUP_COUNT = config('LOG_BACKUP_COUNT', default=14, cast=int)
+LOG_ROTATE_WHEN = config('LOG_ROTATE_WHEN', default='midnight')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'request_context': {
+            '()': 'core.log_handlers.RequestContextFilter',
+        },
+    },
+    'formatters': {
+        'text': {
+            'format': '{asctime} {levelname} {name} [{request_id}] {message}',
+            'style': '{',
+        },
+        'json': {
+            '()': 'core.log_handlers.JsonFormatter',
+        },
+    },
     'handlers': {
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            'class': 'core.log_handlers.QueueFileHandler',
             'filename': BASE_DIR / 'logs' / 'django.log',
+            'max_bytes': LOG_MAX_BYTES,
+            'backup_count': LOG_BACKUP_COUNT,
+            'when': LOG_ROTATE_WHEN,
+            'formatter': LOG_FORMAT,
+            'filters': ['request_context'],
         },
     },
     'loggers': {
@@ -167,6 +342,14 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'core': {
+            'handlers': ['file'],
+            'level': 'INFO',
+        },
+        'admin_dashboard': {
+            'handlers': ['file'],
+            'level': 'INFO',
+        },
     },
 }
 
@@ -0,0 +1,463 @@
+"""
+Monthly storage, retention and archival of ActivityLog rows.
+
+On MySQL the activity log table is RANGE COLUMNS partitioned by month (see
+migration 0007), so expiring a month is a DROP PARTITION. On other backends
+expired months are deleted in bounded chunks. Either way each month is first
+written to ``ACTIVITY_LOG_ARCHIVE_DIR`` as a gzip-compressed JSONL file that
+the admin activity log page can still search.
+
+Archives are written as a series of independently compressed gzip members of
+``ARCHIVE_BLOCK_SIZE`` records each (still a valid .gz file), next to a small
+binary ``.idx`` file holding the time range, byte range and users of every
+block. Searches mmap both files and only decompress the blocks that can match.
+"""
+import bisect
+import gzip
+import json
+import mmap
+import os
+import struct
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ActivityLog
+
+ARCHIVE_PATTERN = 'activitylog-{year:04d}-{month:02d}.jsonl.gz'
+INDEX_SUFFIX = '.idx'
+ARCHIVE_BLOCK_SIZE = 500
+PURGE_CHUNK_SIZE = 5000
+
+# Index layout: header, block table sorted by time, (user_id, block) pairs
+# sorted by user, then a JSON map of user ids to usernames.
+INDEX_MAGIC = b'ALIX'
+INDEX_HEADER = struct.Struct('<4sII')          # magic, block count, user pair count
+INDEX_BLOCK = struct.Struct('<qqQI')           # first/last timestamp (us), offset, length
+INDEX_USER = struct.Struct('<II')              # user id, block number
+
+
+def add_months(year, month, count):
+    index = year * 12 + (month - 1) + count
+    return index // 12, index % 12 + 1
+
+
+def month_bounds(year, month):
+    """[start, end) of a calendar month in UTC, the timezone the database stores"""
+    start = datetime(year, month, 1, tzinfo=dt_timezone.utc)
+    next_year, next_month = add_months(year, month, 1)
+    return start, datetime(next_year, next_month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(year, month):
+    return f'p{year:04d}{month:02d}'
+
+
+def archive_dir():
+    return Path(settings.ACTIVITY_LOG_ARCHIVE_DIR)
+
+
+def archive_path(year, month):
+    return archive_dir() / ARCHIVE_PATTERN.format(year=year, month=month)
+
+
+def index_path(year, month):
+    path = archive_path(year, month)
+    return path.with_name(path.name + INDEX_SUFFIX)
+
+
+def archived_months():
+    """(year, month) of every archive file, oldest first"""
+    months = []
+    for path in archive_dir().glob('activitylog-*.jsonl.gz'):
+        year, month = path.name[len('activitylog-'):-len('.jsonl.gz')].split('-')
+        months.append((int(year), int(month)))
+    return sorted(months)
+
+
+def _table():
+    return ActivityLog._meta.db_table
+
+
+def existing_partitions():
+    """Names of the monthly partitions of the activity log table (MySQL only)"""
+    if connection.vendor != 'mysql':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [_table()],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_partitions(months_ahead=3):
+    """Split the catch-all partition so every month up to ``months_ahead`` has its own"""
+    partitions = existing_partitions()
+    monthly = [name for name in partitions if name != 'pmax']
+    if not monthly:
+        return []
+
+    last = monthly[-1]
+    year, month = add_months(int(last[1:5]), int(last[5:7]), 1)
+    now = timezone.now()
+    target = add_months(now.year, now.month, months_ahead)
+
+    created = []
+    while (year, month) <= target:
+        _, end = month_bounds(year, month)
+        name = partition_name(year, month)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"ALTER TABLE {_table()} REORGANIZE PARTITION pmax INTO ("
+                f"PARTITION {name} VALUES LESS THAN ('{end:%Y-%m-%d}'), "
+                f"PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+            )
+        created.append(name)
+        year, month = add_months(year, month, 1)
+    return created
+
+
+def expired_months(keep_months):
+    """Months that hold rows older than the retention window, oldest first (months without rows are skipped)"""
+    now = timezone.now()
+    cutoff, _ = month_bounds(*add_months(now.year, now.month, -keep_months))
+    months = (ActivityLog.objects.filter(timestamp__lt=cutoff).order_by()
+              .datetimes('timestamp', 'month', tzinfo=dt_timezone.utc))
+    return [(month.year, month.month) for month in months]
+
+
+def archive_record(row):
+    return {
+        'id': row['id'],
+        'timestamp': row['timestamp'].astimezone(dt_timezone.utc).isoformat(),
+        'user_id': row['user_id'],
+        'username': row['user__username'],
+        'action': row['action'],
+        'content_type': row['content_type'],
+        'object_id': row['object_id'],
+        'object_repr': row['object_repr'],
+        'ip_address': row['ip_address'],
+    }
+
+
+def _timestamp_us(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1_000_000)
+
+
+def _write_archive(path, records):
+    """
+    Write records (sorted by timestamp) as a blocked archive plus its index.
+
+    Both files are written to temporary names and renamed, index first, so an
+    existing archive is always complete and always has its index.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    idx = path.with_name(path.name + INDEX_SUFFIX)
+    tmp_idx = idx.with_name(idx.name + '.tmp')
+
+    blocks = []
+    user_blocks = set()
+    usernames = {}
+    count = 0
+
+    with open(tmp_path, 'wb') as archive:
+        block = []
+
+        def flush():
+            data = gzip.compress(''.join(
+                json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n' for record in block
+            ).encode('utf-8'), mtime=0)
+            blocks.append((
+                _timestamp_us(block[0]['timestamp']),
+                _timestamp_us(block[-1]['timestamp']),
+                archive.tell(),
+                len(data),
+            ))
+            archive.write(data)
+            block.clear()
+
+        for record in records:
+            block.append(record)
+            user_blocks.add((record['user_id'], len(blocks)))
+            usernames[record['user_id']] = record['username']
+            count += 1
+            if len(block) >= ARCHIVE_BLOCK_SIZE:
+                flush()
+        if block:
+            flush()
+
+    if not count:
+        # Never leave an empty archive behind for a month without rows
+        tmp_path.unlink()
+        return 0
+
+    with open(tmp_idx, 'wb') as index:
+        index.write(INDEX_HEADER.pack(INDEX_MAGIC, len(blocks), len(user_blocks)))
+        for entry in blocks:
+            index.write(INDEX_BLOCK.pack(*entry))
+        for user_id, block_number in sorted(user_blocks):
+            index.write(INDEX_USER.pack(user_id, block_number))
+        index.write(json.dumps({str(k): v for k, v in usernames.items()}).encode('utf-8'))
+
+    os.replace(tmp_idx, idx)
+    os.replace(tmp_path, path)
+    return count
+
+
+def archive_month(year, month):
+    """
+    Write a month of logs to its compressed JSONL archive.
+
+    Returns the number of rows written (0, and no archive, for a month
+    without rows), or None if the month was already archived.
+    """
+    path = archive_path(year, month)
+    if path.exists():
+        return None
+
+    start, end = month_bounds(year, month)
+    rows = (
+        ActivityLog.objects
+        .filter(timestamp__gte=start, timestamp__lt=end)
+        .order_by('timestamp', 'id')
+        .values('id', 'timestamp', 'user_id', 'user__username', 'action',
+                'content_type', 'object_id', 'object_repr', 'ip_address')
+    )
+    return _write_archive(path, (archive_record(row) for row in rows.iterator(chunk_size=2000)))
+
+
+def index_archive(year, month):
+    """Rewrite an archive without an index (older format) into the indexed format"""
+    path = archive_path(year, month)
+    if index_path(year, month).exists():
+        return False
+
+    with gzip.open(path, 'rt', encoding='utf-8') as archive:
+        records = [json.loads(line) for line in archive]
+    records.sort(key=lambda record: (record['timestamp'], record['id']))
+    _write_archive(path, records)
+    return True
+
+
+def purge_month(year, month):
+    """Remove an archived month from the database"""
+    start, end = month_bounds(year, month)
+    name = partition_name(year, month)
+    partitions = existing_partitions()
+
+    # Only the oldest partition can be dropped, and only when it holds nothing
+    # from before this month (the first partition has no lower bound).
+    if partitions and partitions[0] == name and not ActivityLog.objects.filter(timestamp__lt=start).exists():
+        with connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {_table()} DROP PARTITION {name}")
+        return
+
+    queryset = ActivityLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    while True:
+        ids = list(queryset.values_list('id', flat=True)[:PURGE_CHUNK_SIZE])
+        if not ids:
+            break
+        with transaction.atomic():
+            ActivityLog.objects.filter(id__in=ids).delete()
+
+
+class _Column:
+    """Read-only sequence over one field of a packed table, for bisect"""
+
+    def __init__(self, buffer, offset, count, layout, field):
+        self.buffer = buffer
+        self.offset = offset
+        self.count = count
+        self.layout = layout
+        self.field = field
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.layout.unpack_from(self.buffer, self.offset + i * self.layout.size)[self.field]
+
+
+class ArchiveIndex:
+    """The memory-mapped index of one archive month"""
+
+    def __init__(self, buffer):
+        magic, self.block_count, self.user_count = INDEX_HEADER.unpack_from(buffer, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError('Not an activity log archive index')
+        self.buffer = buffer
+        self.blocks_offset = INDEX_HEADER.size
+        self.users_offset = self.blocks_offset + self.block_count * INDEX_BLOCK.size
+        self.names_offset = self.users_offset + self.user_count * INDEX_USER.size
+
+    def block(self, number):
+        return INDEX_BLOCK.unpack_from(self.buffer, self.blocks_offset + number * INDEX_BLOCK.size)
+
+    def block_range(self, start=None, end=None):
+        """Numbers of the blocks that may hold timestamps in [start, end)"""
+        first = 0
+        last = self.block_count
+        if start is not None:
+            last_ts = _Column(self.buffer, self.blocks_offset, self.block_count, INDEX_BLOCK, 1)
+            first = bisect.bisect_left(last_ts, _timestamp_us(start))
+        if end is not None:
+            first_ts = _Column(self.buffer, self.blocks_offset, self.block_count, INDEX_BLOCK, 0)
+            last = bisect.bisect_left(first_ts, _timestamp_us(end))
+        return range(first, max(first, last))
+
+    def usernames(self):
+        return {int(k): v for k, v in json.loads(bytes(self.buffer[self.names_offset:])).items()}
+
+    def user_blocks(self, user_ids):
+        """Numbers of the blocks holding records of any of the given users"""
+        user_column = _Column(self.buffer, self.users_offset, self.user_count, INDEX_USER, 0)
+        blocks = set()
+        for user_id in user_ids:
+            i = bisect.bisect_left(user_column, user_id)
+            while i < self.user_count:
+                pair_user, block_number = INDEX_USER.unpack_from(self.buffer, self.users_offset + i * INDEX_USER.size)
+                if pair_user != user_id:
+                    break
+                blocks.add(block_number)
+                i += 1
+        return blocks
+
+
+def _record_matches(record, user_id, username, action, content_type, object_query, start, end):
+    if user_id is not None and record['user_id'] != user_id:
+        return False
+    if action and record['action'] != action:
+        return False
+    if content_type and record['content_type'] != content_type:
+        return False
+    if username and username.lower() not in (record['username'] or '').lower():
+        return False
+    if object_query and object_query.lower() not in (record['object_repr'] or '').lower():
+        return False
+    timestamp = datetime.fromisoformat(record['timestamp'])
+    if (start and timestamp < start) or (end and timestamp >= end):
+        return False
+    record['timestamp'] = timestamp
+    return True
+
+
+def _line_prefilter(filters):
+    """
+    Cheap substring tests on the raw JSON line, run before parsing it.
+
+    Every needle is JSON-escaped the way it appears in the archive, so a line
+    failing any of them cannot match.
+    """
+    needles = []
+    if filters['user_id'] is not None:
+        needles.append(f'"user_id":{filters["user_id"]},')
+    if filters['action']:
+        needles.append('"action":' + json.dumps(filters['action'], ensure_ascii=False))
+    if filters['content_type']:
+        needles.append('"content_type":' + json.dumps(filters['content_type'], ensure_ascii=False))
+    lowered = [json.dumps(filters[name], ensure_ascii=False)[1:-1].lower()
+               for name in ('username', 'object_query') if filters[name]]
+
+    def accept(line):
+        if any(needle not in line for needle in needles):
+            return False
+        if lowered:
+            line = line.lower()
+            return all(needle in line for needle in lowered)
+        return True
+    return accept
+
+
+def _search_indexed(year, month, filters, start, end, limit):
+    """Matching records of one indexed month, newest first"""
+    with open(index_path(year, month), 'rb') as index_file, \
+            mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ) as index_map:
+        index = ArchiveIndex(index_map)
+        candidates = index.block_range(start, end)
+        if not candidates:
+            return []
+
+        if filters['user_id'] is not None:
+            candidates = sorted(index.user_blocks([filters['user_id']]).intersection(candidates))
+        elif filters['username']:
+            needle = filters['username'].lower()
+            user_ids = [uid for uid, name in index.usernames().items() if needle in (name or '').lower()]
+            candidates = sorted(index.user_blocks(user_ids).intersection(candidates))
+
+        blocks = [index.block(number) for number in candidates]
+
+    if not blocks:
+        return []
+
+    accept = _line_prefilter(filters)
+    results = []
+    with open(archive_path(year, month), 'rb') as archive_file, \
+            mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ) as archive_map:
+        for _, _, offset, length in reversed(blocks):
+            data = zlib.decompress(archive_map[offset:offset + length], 16 + zlib.MAX_WBITS)
+            lines = data.decode('utf-8').splitlines()
+            for line in reversed(lines):
+                if not accept(line):
+                    continue
+                record = json.loads(line)
+                if _record_matches(record, start=start, end=end, **filters):
+                    results.append(record)
+            if len(results) >= limit:
+                break
+    return results
+
+
+def _search_scan(year, month, filters, start, end):
+    """Matching records of one unindexed month, newest first"""
+    matches = []
+    with gzip.open(archive_path(year, month), 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            record = json.loads(line)
+            if _record_matches(record, start=start, end=end, **filters):
+                matches.append(record)
+    matches.reverse()
+    return matches
+
+
+def search_archives(username='', action='', start=None, end=None, content_type='', object_query='',
+                    user_id=None, limit=500):
+    """
+    Search archived logs, newest first.
+
+    ``start`` and ``end`` are aware datetimes bounding the timestamp range;
+    archives outside the range are not opened at all. ``user_id`` matches one
+    user exactly, ``username`` any username containing it. Indexed archives only
+    decompress the blocks whose time range and users can match; archives
+    from before indexing are scanned until index_archive() rewrites them.
+    """
+    filters = {
+        'user_id': user_id,
+        'username': username,
+        'action': action,
+        'content_type': content_type,
+        'object_query': object_query,
+    }
+    results = []
+    for year, month in reversed(archived_months()):
+        month_start, month_end = month_bounds(year, month)
+        if (start and month_end <= start) or (end and month_start >= end):
+            continue
+
+        if index_path(year, month).exists():
+            results.extend(_search_indexed(year, month, filters, start, end, limit - len(results)))
+        else:
+            results.extend(_search_scan(year, month, filters, start, end))
+
+        if len(results) >= limit:
+            return results[:limit]
+    return results
@@ -0,0 +1,103 @@
+"""
+Filter facets of the activity log page.
+
+The distinct actions and the users that have logged activity are kept in the
+small ActivityLogFacet table instead of being recomputed with SELECT DISTINCT
+over the whole log. The table is upserted whenever logs are written (see
+core.audit.on_flush) and read through the shared cache, versioned on the
+ActivityLogFacet content version.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .audit import on_flush
+from .caching import bump_content_version, get_content_versions, get_or_recompute
+from .models import ActivityLog, ActivityLogFacet
+
+FACETS_CACHE_KEY = 'activity-log-facets'
+FACETS_TIMEOUT = 60 * 60
+
+# How stale a user's last_seen may get before a new log refreshes it
+LAST_SEEN_RESOLUTION = timedelta(hours=1)
+
+
+def _load_facets():
+    facets = {'actions': [], 'users': {}}
+    for kind, value, label, last_seen in ActivityLogFacet.objects.values_list('kind', 'value', 'label', 'last_seen'):
+        if kind == 'action':
+            facets['actions'].append(value)
+        else:
+            facets['users'][int(value)] = {'username': label, 'last_seen': last_seen}
+    facets['actions'].sort()
+    return facets
+
+
+def get_facets():
+    """{'actions': [action, ...], 'users': {user_id: {'username', 'last_seen'}}}"""
+    return get_or_recompute(
+        FACETS_CACHE_KEY,
+        _load_facets,
+        FACETS_TIMEOUT,
+        version=get_content_versions([ActivityLogFacet]),
+    )
+
+
+def search_users(query, limit=10):
+    """Users with logged activity whose username contains ``query``, most recent first"""
+    query = query.lower()
+    users = [
+        {'id': user_id, 'username': user['username'], 'last_seen': user['last_seen']}
+        for user_id, user in get_facets()['users'].items()
+        if query in user['username'].lower()
+    ]
+    users.sort(key=lambda user: user['last_seen'], reverse=True)
+    return users[:limit]
+
+
+def record_facets(entries):
+    """Add the actions and users of newly written logs to the facet table"""
+    facets = get_facets()
+    now = timezone.now()
+
+    rows = {}
+    for entry in entries:
+        if entry.action not in facets['actions']:
+            rows['action', entry.action] = ActivityLogFacet(
+                kind='action', value=entry.action, label=entry.action, last_seen=now)
+
+        user = facets['users'].get(entry.user_id)
+        if user is None or now - user['last_seen'] > LAST_SEEN_RESOLUTION:
+            rows['user', entry.user_id] = ActivityLogFacet(
+                kind='user', value=str(entry.user_id), label=entry.user.username, last_seen=now)
+
+    if not rows:
+        return
+
+    ActivityLogFacet.objects.bulk_create(
+        rows.values(),
+        update_conflicts=True,
+        unique_fields=['kind', 'value'],
+        update_fields=['label', 'last_seen'],
+    )
+    bump_content_version(ActivityLogFacet)
+
+
+def rebuild_facets():
+    """Recompute the facet table from the activity log (one pass per facet)"""
+    now = timezone.now()
+    rows = [
+        ActivityLogFacet(kind='action', value=action, label=action, last_seen=now)
+        for action in ActivityLog.objects.order_by().values_list('action', flat=True).distinct()
+    ]
+    rows += [
+        ActivityLogFacet(kind='user', value=str(user_id), label=username, last_seen=now)
+        for user_id, username in ActivityLog.objects.order_by().values_list('user_id', 'user__username').distinct()
+    ]
+    ActivityLogFacet.objects.all().delete()
+    ActivityLogFacet.objects.bulk_create(rows)
+    bump_content_version(ActivityLogFacet)
+    return len(rows)
+
+
+on_flush(record_facets)
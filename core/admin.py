@@ -135,12 +135,13 @@ class ArticleAdmin(admin.ModelAdmin):
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('title', 'event_type', 'date', 'location', 'status', 'capacity', 'is_featured')
+    list_display = ('title', 'event_type', 'date', 'location', 'status', 'registered_count', 'capacity',
+                    'is_featured')
     list_filter = ('event_type', 'status', 'is_featured', 'date')
     search_fields = ('title', 'description', 'location')
     list_editable = ('status', 'is_featured')
     ordering = ('date', 'time')
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('registered_count', 'created_at', 'updated_at')
 
 
 @admin.register(GalleryItem)
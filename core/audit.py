@@ -0,0 +1,153 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .metrics import Gauge
+from .models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class AuditLogWriter:
+    """
+    Buffer ActivityLog rows in memory and write them from a background thread.
+
+    Rows are flushed with bulk_create once ``batch_size`` records are queued
+    or ``flush_interval`` seconds have passed since the first queued record,
+    whichever comes first. The queue is drained when the process exits.
+    """
+
+    def __init__(self, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, entry):
+        self._ensure_started()
+        self._queue.put(entry)
+
+    def qsize(self):
+        return self._queue.qsize()
+
+    def _ensure_started(self):
+        # Restart after a fork: threads do not survive into worker processes
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        stopping = False
+
+        while not stopping:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                entry = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                entry = None
+
+            if entry is _STOP:
+                stopping = True
+            elif entry is not None:
+                batch.append(entry)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                # This thread's own connection; never run on a request thread, whose transaction it would close
+                close_old_connections()
+                self._write(batch)
+                batch = []
+                deadline = None
+
+        connection.close()
+
+    def _write(self, batch):
+        try:
+            # A savepoint when called inside the caller's transaction, so a failed write does not break it
+            with transaction.atomic():
+                ActivityLog.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            logger.exception("Failed to write %d activity log records", len(batch))
+        else:
+            for callback in _flush_callbacks:
+                callback(batch)
+
+    def shutdown(self, timeout=5):
+        """Flush queued records and stop the writer thread"""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+
+_writer = AuditLogWriter(
+    batch_size=settings.AUDIT_LOG_BATCH_SIZE,
+    flush_interval=settings.AUDIT_LOG_FLUSH_MS / 1000,
+)
+_flush_callbacks = []
+
+atexit.register(_writer.shutdown)
+
+
+def on_flush(callback):
+    """Register ``callback(entries)`` to run after records are written"""
+    _flush_callbacks.append(callback)
+    return callback
+
+
+def log_activity(user, action, content_type, object_id=0, object_repr='', ip_address=None, obj=None):
+    """
+    Record an admin action in the ActivityLog.
+
+    Pass ``obj`` to take the object id and representation from a model
+    instance. With ``settings.AUDIT_LOG_ASYNC`` off (e.g. in tests) the row
+    is written synchronously.
+    """
+    if obj is not None:
+        object_id = obj.pk
+        object_repr = str(obj)
+
+    entry = ActivityLog(
+        user=user,
+        action=action,
+        content_type=content_type,
+        object_id=object_id,
+        object_repr=object_repr[:200],
+        ip_address=ip_address,
+    )
+
+    if settings.AUDIT_LOG_ASYNC:
+        _writer.enqueue(entry)
+    else:
+        _writer._write([entry])
+
+
+def pending_activity_logs():
+    """Number of records waiting to be written"""
+    return _writer.qsize()
+
+
+def flush_activity_logs(timeout=5):
+    """Write every queued record now and stop the writer (it restarts on the next log)"""
+    _writer.shutdown(timeout)
+
+
+Gauge('audit_log_queue_depth', 'Activity log records waiting to be written', pending_activity_logs)
@@ -0,0 +1,369 @@
+"""
+Two-tier cache: a small in-process LRU (L1) in front of a shared cache (L2).
+
+TwoTierCache is the ``default`` cache, so the page, fragment and facet
+caches, sessions, profiles and bulk job status all go through it. Reads
+are served from L1 when possible and fall back to the L2 alias named by
+OPTIONS['SHARED']. Writes go to both tiers; add/incr/decr, whose results
+must be atomic across workers, always go to L2.
+
+L2 is Redis in production. Without it, LockedFileBasedCache stores L2 in a
+directory: Django's FileBasedCache checks and then writes, so two workers
+could both take the same single-flight lock or generation number; this
+subclass runs add and incr under an exclusive lock on a file in that
+directory. That only makes them atomic between processes sharing the
+directory, i.e. on one host; several hosts need Redis.
+
+L1 entries live at most L1_TIMEOUT seconds and L1 holds at most
+L1_MAX_ENTRIES entries and L1_MAX_BYTES of pickled values, evicting the
+least recently used. Keys starting with one of L1_EXCLUDE (locks,
+sessions, counters) are never held in L1.
+
+Invalidation is broadcast through L2: every write increments a shared
+generation key and records the keys it changed under that generation.
+Each worker reads the generation at most every SYNC_INTERVAL seconds and
+drops the keys written since from its L1 (or all of L1 when it fell too
+far behind), so a worker sees other workers' writes, such as a bumped
+content version, within SYNC_INTERVAL. Lookups are counted per tier, see
+tier_stats().
+"""
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.files import locks
+
+from .metrics import Counter, Gauge
+
+GENERATION_KEY = 'two-tier:generation'
+CHANGES_KEY_PREFIX = 'two-tier:changes:'
+CLEAR_ALL = '*'
+
+# Generations a worker catches up on key by key before clearing its L1 instead
+MAX_CATCH_UP = 200
+
+LOOKUPS = Counter('cache_tier_lookups_total', 'Two-tier cache lookups by tier and outcome', ['tier', 'outcome'])
+L1_EVICTIONS = Counter('cache_l1_evictions_total', 'L1 entries dropped by reason', ['reason'])
+
+_instances = []
+
+
+class LocalLRU:
+    """A thread-safe LRU of pickled values bounded by entry count and bytes, with per-entry expiry"""
+
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """(found, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires, data = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                L1_EVICTIONS.inc(reason='expired')
+                return False, None
+            self._entries.move_to_end(key)
+        return True, pickle.loads(data)
+
+    def set(self, key, value, timeout):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes // 10:
+            # One large value would push out many small ones
+            self.delete(key)
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + timeout, data)
+            self.bytes += len(data)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                L1_EVICTIONS.inc(reason='size')
+
+    def delete(self, key):
+        with self._lock:
+            return self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= len(entry[1])
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+class TwoTierCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.sync_interval = options.get('SYNC_INTERVAL', 1.0)
+        self.l1_exclude = tuple(options.get('L1_EXCLUDE', ()))
+        self.l1 = LocalLRU(options.get('L1_MAX_ENTRIES', 1000), options.get('L1_MAX_BYTES', 16 * 1024 * 1024))
+        self._pid = None
+        self._reset()
+        _instances.append(self)
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._generation = None
+        self._synced_at = 0.0
+        # Generations this process wrote: their keys are already current in its L1
+        self._own_generations = set()
+        self._sync_lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    # L1 bookkeeping
+
+    def _l1_key(self, key, version):
+        """The L1 key for ``key``, or None when it is never held in L1"""
+        if key.startswith(self.l1_exclude):
+            return None
+        return self.make_and_validate_key(key, version=version)
+
+    def _l1_timeout(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.l1_timeout
+        return min(timeout, self.l1_timeout)
+
+    def _sync(self):
+        """Drop L1 entries other workers changed, at most once per SYNC_INTERVAL"""
+        if self._pid != os.getpid():
+            # A forked worker may have inherited the lock held; its L1 copy is still valid until the next sync
+            self._reset()
+        now = time.monotonic()
+        if now - self._synced_at < self.sync_interval or not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            self._synced_at = now
+            generation = self.shared.get(GENERATION_KEY, 0)
+            previous, self._generation = self._generation, generation
+            if previous is None:
+                self._own_generations = {n for n in self._own_generations if n > generation}
+                return
+            if generation == previous:
+                return
+            if generation < previous or generation - previous > MAX_CATCH_UP:
+                # The counter was evicted or this worker was idle for long: start over
+                self.l1.clear()
+                L1_EVICTIONS.inc(reason='invalidated')
+                return
+
+            missed = [n for n in range(previous + 1, generation + 1) if n not in self._own_generations]
+            self._own_generations.difference_update(range(previous + 1, generation + 1))
+            changes = self.shared.get_many([f'{CHANGES_KEY_PREFIX}{n}' for n in missed])
+            if len(changes) < len(missed) or any(CLEAR_ALL in keys for keys in changes.values()):
+                # A change record expired or is still being written: cannot tell what changed
+                self.l1.clear()
+                L1_EVICTIONS.inc(reason='invalidated')
+                return
+            for keys in changes.values():
+                for key in keys:
+                    if self.l1.delete(key):
+                        L1_EVICTIONS.inc(reason='invalidated')
+        finally:
+            self._sync_lock.release()
+
+    def _broadcast(self, l1_keys):
+        """Tell other workers to drop ``l1_keys`` from their L1"""
+        l1_keys = [key for key in l1_keys if key is not None]
+        if not l1_keys:
+            return
+        try:
+            generation = self.shared.incr(GENERATION_KEY)
+        except ValueError:
+            self.shared.add(GENERATION_KEY, 0, timeout=None)
+            generation = self.shared.incr(GENERATION_KEY)
+        self._own_generations.add(generation)
+        # Kept long enough for every worker to sync several times
+        self.shared.set(f'{CHANGES_KEY_PREFIX}{generation}', l1_keys, max(60, self.sync_interval * 10))
+
+    # Reads
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None:
+            found, value = self.l1.get(l1_key)
+            if found:
+                LOOKUPS.inc(tier='l1', outcome='hit')
+                return value
+            LOOKUPS.inc(tier='l1', outcome='miss')
+
+        sentinel = object()
+        value = self.shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            LOOKUPS.inc(tier='l2', outcome='miss')
+            return default
+        LOOKUPS.inc(tier='l2', outcome='hit')
+        if l1_key is not None:
+            self.l1.set(l1_key, value, self.l1_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        remote = []
+        for key in keys:
+            l1_key = self._l1_key(key, version)
+            if l1_key is not None:
+                hit, value = self.l1.get(l1_key)
+                LOOKUPS.inc(tier='l1', outcome='hit' if hit else 'miss')
+                if hit:
+                    found[key] = value
+                    continue
+            remote.append(key)
+
+        if remote:
+            values = self.shared.get_many(remote, version=version)
+            LOOKUPS.inc(len(values), tier='l2', outcome='hit')
+            LOOKUPS.inc(len(remote) - len(values), tier='l2', outcome='miss')
+            for key, value in values.items():
+                l1_key = self._l1_key(key, version)
+                if l1_key is not None:
+                    self.l1.set(l1_key, value, self.l1_timeout)
+            found.update(values)
+        return found
+
+    def has_key(self, key, version=None):
+        self._sync()
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None and self.l1.get(l1_key)[0]:
+            return True
+        return self.shared.has_key(key, version=version)
+
+    # Writes
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version=version)
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None:
+            self.l1.set(l1_key, value, self._l1_timeout(timeout))
+            self._broadcast([l1_key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        l1_keys = []
+        for key, value in data.items():
+            l1_key = self._l1_key(key, version)
+            if l1_key is not None and key not in failed:
+                self.l1.set(l1_key, value, self._l1_timeout(timeout))
+                l1_keys.append(l1_key)
+        self._broadcast(l1_keys)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version=version)
+        l1_key = self._l1_key(key, version)
+        if added and l1_key is not None:
+            self.l1.set(l1_key, value, self._l1_timeout(timeout))
+            self._broadcast([l1_key])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None:
+            self.l1.delete(l1_key)
+            self._broadcast([l1_key])
+        return value
+
+    def decr(self, key, delta=1, version=None):
+        return self.incr(key, -delta, version=version)
+
+    def delete(self, key, version=None):
+        deleted = self.shared.delete(key, version=version)
+        l1_key = self._l1_key(key, version)
+        if l1_key is not None:
+            self.l1.delete(l1_key)
+            self._broadcast([l1_key])
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        l1_keys = [self._l1_key(key, version) for key in keys]
+        for l1_key in l1_keys:
+            if l1_key is not None:
+                self.l1.delete(l1_key)
+        self._broadcast(l1_keys)
+
+    def clear(self):
+        self.shared.clear()
+        self.l1.clear()
+        self._broadcast([CLEAR_ALL])
+
+    def clear_local(self):
+        """Empty this process's L1 only"""
+        self.l1.clear()
+
+
+class LockedFileBasedCache(FileBasedCache):
+    """FileBasedCache whose add and incr/decr are atomic across processes sharing the directory"""
+
+    lock_filename = 'atomic.lock'
+
+    @contextmanager
+    def _locked(self):
+        self._createdir()
+        # Not a .djcache file, so culling and clear() leave it alone
+        with open(os.path.join(self._dir, self.lock_filename), 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._locked():
+            return super().add(key, value, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        # decr() calls incr() with a negative delta
+        with self._locked():
+            return super().incr(key, delta, version)
+
+
+def tier_stats(values):
+    """{tier: {'hit': n, 'miss': n}} from a metrics snapshot or collect() result"""
+    stats = {'l1': {'hit': 0, 'miss': 0}, 'l2': {'hit': 0, 'miss': 0}}
+    for labels, count in values.get(LOOKUPS.name, {}).items():
+        tier, outcome = json.loads(labels)
+        stats.setdefault(tier, {}).setdefault(outcome, 0)
+        stats[tier][outcome] += count
+    return stats
+
+
+Gauge('cache_l1_entries', 'Entries held in this process\'s L1 cache',
+      lambda: sum(len(instance.l1) for instance in _instances))
+Gauge('cache_l1_bytes', 'Pickled bytes held in this process\'s L1 cache',
+      lambda: sum(instance.l1.bytes for instance in _instances))
@@ -0,0 +1,284 @@
+"""
+Session engine that reads from the cache and writes to the database in the background.
+
+SESSION_SAVE_EVERY_REQUEST makes Django save every session on every
+request to slide its expiry. With this engine (SESSION_ENGINE =
+'core.cached_sessions') a save only costs something when it has to:
+
+- sessions are read from SESSION_CACHE_ALIAS and fall back to the
+  database on a miss;
+- a save of unchanged data is skipped while more than
+  SESSION_REFRESH_THRESHOLD seconds of the stored lifetime remain, so
+  the expiry is extended at most once per threshold;
+- changed data and expiry extensions go to the cache at once and to the
+  database from a background thread, which writes the latest version of
+  each session in batches every SESSION_WRITE_FLUSH_MS milliseconds;
+- new sessions and deletions (login, logout) are written synchronously,
+  and a deletion drops any pending write of the same session;
+- background writes only update rows that still exist, and a deletion
+  leaves a tombstone in the cache, so a request that read a session
+  before it was deleted cannot bring it back: its save fails with
+  UpdateError (SessionInterrupted), as with the database engine.
+
+The database stays the source of truth across processes and restarts;
+writes queued in a process are flushed when it exits. A process whose
+cache misses may read a session up to one flush interval old. Disable
+SESSION_WRITE_ASYNC to write every save synchronously.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.db import close_old_connections, connections, router, transaction
+from django.utils import timezone
+
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'core.cached_sessions'
+DELETED_KEY_PREFIX = f'{KEY_PREFIX}:deleted:'
+
+SAVES = Counter('session_saves_total', 'Session saves by what they wrote', ['outcome'])
+
+
+class SessionWriter:
+    """
+    Write session rows from a background thread.
+
+    Only the latest version of each session is kept, so a session saved on
+    many requests between two flushes is written once.
+    """
+
+    def __init__(self, batch_size, flush_interval):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._condition = threading.Condition()
+        # Held while rows are written or deleted, so a deletion cannot be undone by a write in flight
+        self._write_lock = threading.Lock()
+        self._stopping = False
+        self._thread = None
+        self._pid = None
+
+    def enqueue(self, session_key, session_data, expire_date):
+        self._ensure_started()
+        with self._condition:
+            self._pending[session_key] = (session_data, expire_date)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def pending(self, session_key):
+        """(session_data, expire_date) waiting to be written for ``session_key``, or None"""
+        with self._condition:
+            return self._pending.get(session_key)
+
+    def qsize(self):
+        return len(self._pending)
+
+    def delete(self, model, session_key):
+        with self._write_lock:
+            with self._condition:
+                self._pending.pop(session_key, None)
+            model.objects.filter(session_key=session_key).delete()
+
+    def _ensure_started(self):
+        # Restart after a fork: threads do not survive into worker processes
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._condition:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # Sessions queued in the parent are the parent's to write
+                self._pending = {}
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='session-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopping and len(self._pending) < self.batch_size:
+                    self._condition.wait(self.flush_interval)
+                stopping = self._stopping
+            self.flush()
+            if stopping:
+                break
+        connections.close_all()
+
+    def flush(self):
+        """Write every pending session now"""
+        with self._write_lock:
+            with self._condition:
+                batch, self._pending = self._pending, {}
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch):
+        from django.contrib.sessions.models import Session
+
+        close_old_connections()
+        rows = [Session(session_key=key, session_data=data, expire_date=expire_date)
+                for key, (data, expire_date) in batch.items()]
+        using = router.db_for_write(Session)
+        try:
+            with transaction.atomic(using=using):
+                # An UPDATE, never an insert: rows deleted since (logout) stay deleted
+                Session.objects.using(using).bulk_update(
+                    rows, ['session_data', 'expire_date'], batch_size=self.batch_size)
+        except Exception:
+            logger.exception("Failed to write %d sessions", len(rows))
+
+    def shutdown(self, timeout=5):
+        """Write pending sessions and stop the writer thread"""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+
+_writer = SessionWriter(
+    batch_size=settings.SESSION_WRITE_BATCH_SIZE,
+    flush_interval=settings.SESSION_WRITE_FLUSH_MS / 1000,
+)
+
+atexit.register(_writer.shutdown)
+
+Gauge('session_write_queue_depth', 'Sessions waiting to be written to the database', lambda: _writer.qsize())
+
+
+def flush_session_writes():
+    """Write queued sessions now (for tests and management commands)"""
+    _writer.flush()
+
+
+class SessionStore(DBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        # Expiry of the stored copy, to decide whether a save may be skipped
+        self._stored_expiry = None
+
+    @property
+    def cache_key(self):
+        return f'{self.cache_key_prefix}:{self._get_or_create_session_key()}'
+
+    def _cache_entry(self, data, expire_date):
+        timeout = (expire_date - timezone.now()).total_seconds()
+        if timeout > 0:
+            self._cache.set(self.cache_key, (data, expire_date), timeout)
+        self._stored_expiry = expire_date
+
+    def load(self):
+        if self.session_key is None:
+            return {}
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # A cache outage degrades to database reads
+            logger.exception("Session cache read failed")
+            entry = None
+        if entry is not None:
+            data, expire_date = entry
+            if expire_date > timezone.now():
+                self._stored_expiry = expire_date
+                return data
+
+        pending = _writer.pending(self.session_key)
+        if pending is not None and pending[1] > timezone.now():
+            session_data, expire_date = pending
+        else:
+            session = self._get_session_from_db()
+            if session is None:
+                return {}
+            session_data, expire_date = session.session_data, session.expire_date
+        data = self.decode(session_data)
+        self._cache_entry(data, expire_date)
+        return data
+
+    def exists(self, session_key):
+        return (
+            self._cache.has_key(f'{self.cache_key_prefix}:{session_key}')
+            or _writer.pending(session_key) is not None
+            or super().exists(session_key)
+        )
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if must_create:
+            # Writing the row is what reserves the key, so it cannot wait
+            super().save(must_create=True)
+            self._cache_entry(self._get_session(no_load=True), self.get_expiry_date())
+            SAVES.inc(outcome='created')
+            return
+
+        data = self._get_session()
+        if not self.modified and self._stored_expiry is not None:
+            remaining = self._stored_expiry - timezone.now()
+            if remaining > timedelta(seconds=settings.SESSION_REFRESH_THRESHOLD):
+                SAVES.inc(outcome='skipped')
+                return
+
+        expire_date = self.get_expiry_date()
+        self._cache_entry(data, expire_date)
+        # Checked after caching: a deletion tombstones before it uncaches, so one of both sees the other
+        if self._cache.has_key(f'{DELETED_KEY_PREFIX}{self.session_key}'):
+            self._cache.delete(self.cache_key)
+            self._stored_expiry = None
+            SAVES.inc(outcome='refused')
+            raise UpdateError
+        SAVES.inc(outcome='updated' if self.modified else 'refreshed')
+        if settings.SESSION_WRITE_ASYNC:
+            _writer.enqueue(self.session_key, self.encode(data), expire_date)
+        else:
+            super().save()
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        # Refuses saves of requests that loaded the session before it was deleted
+        self._cache.set(f'{DELETED_KEY_PREFIX}{session_key}', True, settings.SESSION_COOKIE_AGE)
+        self._cache.delete(f'{self.cache_key_prefix}:{session_key}')
+        _writer.delete(self.model, session_key)
+        self._stored_expiry = None
+
+    @classmethod
+    def clear_expired(cls):
+        purge_expired_sessions()
+
+
+def purge_expired_sessions(batch_size=None, pause=0.0, stdout=None):
+    """Delete expired session rows ``batch_size`` at a time; returns the number deleted"""
+    from django.contrib.sessions.models import Session
+
+    batch_size = batch_size or settings.SESSION_PURGE_BATCH_SIZE
+    now = timezone.now()
+    deleted = 0
+    while True:
+        # Short deletes by primary key keep each statement's lock footprint small
+        keys = list(Session.objects.filter(expire_date__lt=now)
+                    .values_list('session_key', flat=True)[:batch_size])
+        if not keys:
+            return deleted
+        # Sessions have no dependent rows, so this is a single DELETE per batch
+        deleted += Session.objects.filter(pk__in=keys, expire_date__lt=now).delete()[0]
+        if stdout is not None:
+            stdout.write(f'Deleted {deleted:,} expired sessions')
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,258 @@
+import hashlib
+import math
+import random
+import re
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_cache_control
+
+from .instrumentation import note_cache_event
+from .metrics import CACHE_LOOKUPS
+
+VERSION_KEY_PREFIX = 'content-version:'
+CHANGED_KEY_PREFIX = 'content-changed:'
+PAGE_KEY_PREFIX = 'page:'
+LOCK_KEY_PREFIX = 'lock:'
+METRICS_KEY_PREFIX = 'cache-metrics:'
+
+# Events counted by get_or_recompute, see cache_metrics()
+CACHE_EVENTS = ('hit', 'miss', 'stale', 'early_recompute', 'recompute', 'lock_wait')
+
+# Placeholder stored in cached pages instead of the per-visitor CSRF token
+CSRF_PLACEHOLDER = '__CSRF_TOKEN_PLACEHOLDER__'
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([A-Za-z0-9]+)"')
+
+
+def _version_key(model):
+    return f"{VERSION_KEY_PREFIX}{model._meta.label_lower}"
+
+
+def _new_version():
+    # Seed versions from the clock so an evicted counter never comes back at
+    # a value that older cached pages were keyed on.
+    return int(time.time() * 1000)
+
+
+def get_content_versions(models):
+    """Return the current content version of each model, in order"""
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+
+    missing = {key: _new_version() for key in keys if key not in versions}
+    for key, value in missing.items():
+        if not cache.add(key, value, timeout=None):
+            missing[key] = cache.get(key, value)
+    versions.update(missing)
+
+    return [versions[key] for key in keys]
+
+
+def bump_content_version(model):
+    """Invalidate every cached page that depends on the given model"""
+    if settings.DATABASE_REPLICAS:
+        # Set before the new version can be seen: a page rendered under it
+        # must not read the model from a replica that lacks the change
+        cache.set(CHANGED_KEY_PREFIX + model._meta.label_lower, True,
+                  settings.REPLICA_MAX_LAG + settings.REPLICA_HEALTH_INTERVAL)
+    key = _version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def changed_recently(model):
+    """Whether ``model`` changed recently enough for a replica to lag behind it, see core.replicas"""
+    return cache.get(CHANGED_KEY_PREFIX + model._meta.label_lower) is not None
+
+
+def page_cache_key(request):
+    """Cache key built from the path and the normalised query string"""
+    query = sorted(request.GET.lists())
+    raw = f"{request.path}?{query}"
+    return PAGE_KEY_PREFIX + hashlib.md5(raw.encode()).hexdigest()
+
+
+def _record(event):
+    note_cache_event(event)
+    CACHE_LOOKUPS.inc(event=event)
+    key = METRICS_KEY_PREFIX + event
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def cache_metrics():
+    """Return the cross-worker counters of get_or_recompute events"""
+    counts = cache.get_many([METRICS_KEY_PREFIX + event for event in CACHE_EVENTS])
+    return {event: counts.get(METRICS_KEY_PREFIX + event, 0) for event in CACHE_EVENTS}
+
+
+def reset_cache_metrics():
+    cache.delete_many([METRICS_KEY_PREFIX + event for event in CACHE_EVENTS])
+
+
+def _should_recompute_early(entry, beta):
+    # XFetch: the closer to expiry and the slower the recompute, the more
+    # likely a request volunteers to refresh the value ahead of time.
+    jitter = entry['delta'] * beta * -math.log(1.0 - random.random())
+    return time.time() + jitter >= entry['expires']
+
+
+def get_or_recompute(key, compute, timeout, version=None, beta=1.0):
+    """
+    Return the cached value for ``key``, recomputing it at most once at a time.
+
+    Entries are kept for ``settings.CACHE_STALE_GRACE`` seconds past their
+    ``timeout`` (or past a ``version`` change). While one worker holds the
+    short lock key and recomputes, every other worker is served the stale
+    entry instead of hitting the database. ``compute`` may return None to
+    signal that its result must not be cached.
+    """
+    return _lookup(key, compute, timeout, version, beta)[0]
+
+
+def _lookup(key, compute, timeout, version, beta):
+    """get_or_recompute returning (value, status), status being 'hit', 'stale' or 'computed'"""
+    entry = cache.get(key)
+    fresh = entry is not None and entry['version'] == version
+
+    if fresh and time.time() < entry['expires']:
+        if not _should_recompute_early(entry, beta):
+            _record('hit')
+            return entry['value'], 'hit'
+        _record('early_recompute')
+
+    lock_key = LOCK_KEY_PREFIX + key
+    # Identifies this worker's lock, so only the holder releases it
+    token = uuid.uuid4().hex
+    locked = cache.add(lock_key, token, settings.CACHE_LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            # Someone else is refreshing; an early refresh is still fresh data
+            if fresh and time.time() < entry['expires']:
+                _record('hit')
+                return entry['value'], 'hit'
+            _record('stale')
+            return entry['value'], 'stale'
+
+        # Cold key: wait briefly for the lock holder instead of piling on
+        _record('lock_wait')
+        deadline = time.time() + settings.CACHE_LOCK_WAIT
+        while time.time() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(key)
+            if entry is not None and entry['version'] == version:
+                _record('hit')
+                return entry['value'], 'hit'
+            # The holder finished without caching (or died): take over instead of waiting it out
+            locked = cache.add(lock_key, token, settings.CACHE_LOCK_TIMEOUT)
+            if locked:
+                break
+
+    try:
+        _record('miss' if entry is None else 'recompute')
+        started = time.time()
+        value = compute()
+        if value is not None:
+            cache.set(key, {
+                'value': value,
+                'version': version,
+                'delta': time.time() - started,
+                'expires': time.time() + timeout,
+            }, timeout + settings.CACHE_STALE_GRACE)
+        return value, 'computed'
+    finally:
+        # After a timed-out wait the lock is someone else's; never release it for them
+        if locked and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def is_cacheable_request(request):
+    """Whether the response for this request is the same for every visitor"""
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    if request.user.is_authenticated:
+        return False
+    # Flash messages are rendered into the page and consumed on display
+    if len(get_messages(request)):
+        return False
+    return True
+
+
+def _strip_csrf_token(content):
+    """Swap the rendered CSRF token for a placeholder, or None if not found"""
+    match = CSRF_INPUT_RE.search(content)
+    if not match:
+        return None
+    return content.replace(match.group(1), CSRF_PLACEHOLDER)
+
+
+def cache_public_page(*models, on_hit=None):
+    """
+    Cache a public page for anonymous visitors.
+
+    Each entry records the content version of every model the page depends
+    on, so saving or deleting any of them (see core.signals) marks it stale.
+    Stale pages keep being served while a single worker re-renders them, see
+    get_or_recompute. ``on_hit`` is called with the view
+    arguments when a cached page is served, for side effects such as view
+    counters that must still happen.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            response = None
+
+            def render_page():
+                nonlocal response
+                response = view_func(request, *args, **kwargs)
+                if response.status_code != 200 or response.cookies or response.streaming:
+                    return None
+
+                content = response.content.decode(response.charset)
+                if request.META.get('CSRF_COOKIE_NEEDS_UPDATE'):
+                    content = _strip_csrf_token(content)
+                    if content is None:
+                        return None
+
+                return {'content': content, 'content_type': response['Content-Type']}
+
+            cached, status = _lookup(
+                page_cache_key(request),
+                render_page,
+                settings.PAGE_CACHE_TIMEOUT,
+                get_content_versions(models),
+                beta=1.0,
+            )
+
+            if response is not None:
+                if cached is not None:
+                    response['X-Page-Cache'] = 'MISS'
+                return response
+
+            if on_hit is not None:
+                on_hit(request, *args, **kwargs)
+            content = cached['content'].replace(CSRF_PLACEHOLDER, get_token(request))
+            response = HttpResponse(content, content_type=cached['content_type'])
+            response['X-Page-Cache'] = status.upper()
+            if status == 'stale':
+                # Validators describe the new content, so browsers must not keep this copy
+                patch_cache_control(response, no_store=True)
+            return response
+        # Lets conditional_page validate against the same content versions
+        _wrapped_view.page_models = models
+        return _wrapped_view
+    return decorator
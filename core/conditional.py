@@ -0,0 +1,85 @@
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .caching import get_content_versions, is_cacheable_request, page_cache_key
+
+# First time each page validator was handed out, the page's Last-Modified
+SEEN_KEY_PREFIX = 'page-validator:'
+# Last-Modified has one-second resolution
+STABLE_FOR = timedelta(seconds=1)
+
+
+def content_state(request, models):
+    """
+    Return (last_modified, etag) of a page rendered from ``models``.
+
+    The ETag is derived from the content versions the page cache keys on
+    (see core.caching), so it changes whenever the cached page would and
+    costs no database query. Last-Modified is when that ETag was first
+    handed out, rounded up to the whole second HTTP dates allow.
+
+    Two ETags first seen within the same second would share a Last-Modified,
+    and a client revalidating the older one with If-Modified-Since alone
+    would get a 304 for the newer page. So Last-Modified is None until the
+    ETag has been current for more than a second: any ETag that replaces it
+    afterwards is first seen in a later second.
+    """
+    versions = get_content_versions(models)
+    etag = hashlib.md5(f"{page_cache_key(request)}|{versions}".encode()).hexdigest()
+
+    seen_key = SEEN_KEY_PREFIX + etag
+    now = timezone.now()
+    if not cache.add(seen_key, now, settings.PAGE_CACHE_TIMEOUT):
+        first_seen = cache.get(seen_key, now)
+        if now - first_seen > STABLE_FOR:
+            return _ceil_second(first_seen), etag
+    return None, etag
+
+
+def _ceil_second(moment):
+    if moment.microsecond:
+        moment += timedelta(seconds=1)
+    return moment.replace(microsecond=0)
+
+
+def conditional_page(on_not_modified=None):
+    """
+    Answer If-None-Match / If-Modified-Since with 304 before the view runs.
+
+    Wraps a view decorated with cache_public_page and validates against
+    the same models. ``on_not_modified`` is called with the view arguments
+    when a 304 is returned.
+    """
+    def decorator(view_func):
+        models = view_func.page_models
+
+        def _state(request, *args, **kwargs):
+            if not hasattr(request, '_content_state'):
+                request._content_state = content_state(request, models)
+            return request._content_state
+
+        def _etag(request, *args, **kwargs):
+            return _state(request, *args, **kwargs)[1]
+
+        def _last_modified(request, *args, **kwargs):
+            return _state(request, *args, **kwargs)[0]
+
+        conditional_view = condition(etag_func=_etag, last_modified_func=_last_modified)(view_func)
+
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if not is_cacheable_request(request):
+                return view_func(request, *args, **kwargs)
+
+            response = conditional_view(request, *args, **kwargs)
+            if response.status_code == 304 and on_not_modified is not None:
+                on_not_modified(request, *args, **kwargs)
+            return response
+        return _wrapped_view
+    return decorator
@@ -0,0 +1,300 @@
+"""
+Copying every table from one database alias to another.
+
+Tables are copied in foreign-key dependency order; a table starts as soon
+as every table it references is done, so independent tables are copied
+in parallel threads. Rows are read in primary-key pages of chunk_size and
+written with bulk_create, one transaction per page, so memory use does not
+depend on table size.
+
+Progress is checkpointed to a JSON file. On resume, finished tables are
+skipped and an unfinished table continues after the highest primary key
+already in the target, so a chunk committed just before an interruption
+is never copied twice. verify_table() compares row counts and an
+order-independent checksum of every row on both sides.
+"""
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.db import connections, models, transaction
+from django.db.models import Max
+
+from .load_data import explicit_timestamps
+
+CHECKSUM_MODULUS = 2 ** 128
+
+
+def copied_models(labels=None):
+    """Concrete models stored in the database, including auto-created many-to-many tables"""
+    selected = []
+    for model in apps.get_models(include_auto_created=True):
+        meta = model._meta
+        if not meta.managed or meta.proxy:
+            continue
+        if labels and meta.label_lower not in labels and meta.db_table not in labels:
+            continue
+        selected.append(model)
+    return selected
+
+
+def dependencies(model, candidates):
+    """Models among ``candidates`` that ``model`` has foreign keys to"""
+    return {
+        field.related_model._meta.concrete_model
+        for field in model._meta.concrete_fields
+        if field.is_relation and field.related_model is not None
+        and field.related_model._meta.concrete_model is not model
+        and field.related_model._meta.concrete_model in candidates
+    }
+
+
+def dependency_order(candidates):
+    """``candidates`` sorted so every model comes after the models it references"""
+    remaining = {model: dependencies(model, candidates) for model in candidates}
+    ordered = []
+    while remaining:
+        ready = sorted((model for model, deps in remaining.items() if not deps), key=lambda m: m._meta.label)
+        if not ready:
+            # A reference cycle: break it at the alphabetically first table
+            ready = [min(remaining, key=lambda m: m._meta.label)]
+        for model in ready:
+            ordered.append(model)
+            del remaining[model]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return ordered
+
+
+class Checkpoint:
+    """Per-table progress in a JSON file, written after every chunk"""
+
+    def __init__(self, path, source, target):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.tables = {}
+        if self.path.exists():
+            data = json.loads(self.path.read_text())
+            if (data.get('source'), data.get('target')) != (source, target):
+                raise ValueError(f"{self.path} is a checkpoint of {data.get('source')} -> {data.get('target')}")
+            self.tables = data['tables']
+        self.source = source
+        self.target = target
+
+    def get(self, table):
+        with self.lock:
+            return dict(self.tables.get(table, {}))
+
+    def update(self, table, **values):
+        with self.lock:
+            self.tables.setdefault(table, {}).update(values)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(
+                {'source': self.source, 'target': self.target, 'tables': self.tables}, indent=2, default=str))
+            tmp_path.replace(self.path)
+
+    def is_done(self, table):
+        return self.get(table).get('done', False)
+
+
+@contextmanager
+def _bulk_copy_session(alias):
+    """
+    Relax the target connection's checks while a table is copied.
+
+    Unique checks stay on, so a copy can never leave duplicate keys behind.
+    The previous settings are restored afterwards: the connection may go
+    back to a pool (see core.db_pool) and serve other work.
+    """
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            # Rows of self-referencing and cross-referencing tables may arrive in any order
+            cursor.execute('SELECT @@SESSION.foreign_key_checks')
+            saved = cursor.fetchone()[0]
+            cursor.execute('SET SESSION foreign_key_checks = 0')
+        elif connection.vendor == 'sqlite':
+            # A failed copy is rerun, so the target file need not survive a power cut
+            cursor.execute('PRAGMA synchronous')
+            saved = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('SET SESSION foreign_key_checks = %s', [saved])
+            elif connection.vendor == 'sqlite':
+                cursor.execute(f'PRAGMA synchronous = {int(saved)}')
+
+
+def _integer_pk(model):
+    return isinstance(model._meta.pk, (models.AutoField, models.BigAutoField, models.SmallAutoField,
+                                       models.IntegerField, models.ForeignKey))
+
+
+class Interrupted(Exception):
+    pass
+
+
+def copy_table(model, source, target, checkpoint, chunk_size, progress=None, stop=None):
+    """Copy ``model``'s rows from ``source`` to ``target``, resuming where a previous run stopped"""
+    table = model._meta.db_table
+    manager = model._base_manager
+    target_rows = manager.using(target)
+
+    rows = manager.using(source).order_by('pk')
+    copied = 0
+    if checkpoint.get(table).get('started'):
+        if _integer_pk(model):
+            last_pk = target_rows.aggregate(last=Max('pk'))['last']
+            if last_pk is not None:
+                rows = rows.filter(pk__gt=last_pk)
+                copied = target_rows.count()
+        else:
+            # String keys sort differently across backends, so start the table over
+            target_rows.all()._raw_delete(target)
+    checkpoint.update(table, started=True, copied=copied)
+
+    started = time.perf_counter()
+
+    def flush(batch):
+        nonlocal copied
+        with transaction.atomic(using=target):
+            target_rows.bulk_create(batch, batch_size=chunk_size)
+        copied += len(batch)
+        checkpoint.update(table, copied=copied)
+        if progress is not None:
+            progress(table, copied, time.perf_counter() - started)
+
+    with _bulk_copy_session(target):
+        # Keyset pages rather than one long iterator(): MySQLdb buffers a whole
+        # result set client-side, which for ActivityLog would be the whole table
+        while True:
+            if stop is not None and stop.is_set():
+                raise Interrupted(table)
+            batch = list(rows[:chunk_size].iterator(chunk_size=chunk_size))
+            if not batch:
+                break
+            flush(batch)
+            rows = rows.filter(pk__gt=batch[-1].pk)
+
+    # Backends with sequences (PostgreSQL) must continue after the copied keys
+    connection = connections[target]
+    sequence_sql = connection.ops.sequence_reset_sql(no_style(), [model])
+    if sequence_sql:
+        with connection.cursor() as cursor:
+            for sql in sequence_sql:
+                cursor.execute(sql)
+
+    checkpoint.update(table, done=True, copied=copied)
+    return copied
+
+
+def _normalise(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True, default=str)
+    if isinstance(value, memoryview):
+        return bytes(value)
+    return value
+
+
+def table_checksum(model, alias, chunk_size, stop=None):
+    """(row count, checksum) of ``model``'s table; the checksum does not depend on row order"""
+    pk_name = model._meta.pk.attname
+    fields = [pk_name] + [field.attname for field in model._meta.concrete_fields if field.attname != pk_name]
+    count = 0
+    total = 0
+    rows = model._base_manager.using(alias).values_list(*fields).order_by('pk')
+    while True:
+        if stop is not None and stop.is_set():
+            raise Interrupted(model._meta.db_table)
+        page = list(rows[:chunk_size])
+        if not page:
+            break
+        for row in page:
+            digest = hashlib.md5(repr(tuple(_normalise(value) for value in row)).encode()).digest()
+            total = (total + int.from_bytes(digest, 'big')) % CHECKSUM_MODULUS
+        count += len(page)
+        rows = rows.filter(pk__gt=page[-1][0])
+    return count, f'{total:032x}'
+
+
+def verify_table(model, source, target, chunk_size, stop=None):
+    source_count, source_sum = table_checksum(model, source, chunk_size, stop)
+    target_count, target_sum = table_checksum(model, target, chunk_size, stop)
+    return {
+        'table': model._meta.db_table,
+        'source_rows': source_count,
+        'target_rows': target_count,
+        'source_checksum': source_sum,
+        'target_checksum': target_sum,
+        'ok': source_count == target_count and source_sum == target_sum,
+    }
+
+
+def run_in_dependency_order(models_to_run, task, workers, on_done=None, ordered=True):
+    """
+    Call ``task(model, stop)`` for every model on ``workers`` threads, starting
+    each model only after the models it references have finished (any time
+    at all when ``ordered`` is false). ``stop`` is a threading.Event that is
+    set when the run fails or is interrupted; tasks should return soon after.
+    """
+    candidates = set(models_to_run) if ordered else set()
+    waiting = {model: dependencies(model, candidates) for model in dependency_order(models_to_run)}
+    results = {}
+    stop = threading.Event()
+
+    def run(model):
+        try:
+            return task(model, stop)
+        finally:
+            for alias in connections:
+                connections[alias].close()
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='migrate-database') as executor:
+        running = {}
+        try:
+            while waiting or running:
+                for model in [model for model, deps in waiting.items() if not deps]:
+                    del waiting[model]
+                    running[executor.submit(run, model)] = model
+                if not running:
+                    # Only cycles are left; start them anyway, in order
+                    model = next(iter(waiting))
+                    del waiting[model]
+                    running[executor.submit(run, model)] = model
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    model = running.pop(future)
+                    results[model] = future.result()
+                    if on_done is not None:
+                        on_done(model, results[model])
+                    for deps in waiting.values():
+                        deps.discard(model)
+        except BaseException:
+            # Tables in flight stop at their next page; the checkpoint covers what they committed
+            stop.set()
+            for future in running:
+                future.cancel()
+            raise
+    return results
+
+
+def copy_all(models_to_copy, source, target, checkpoint, chunk_size, workers, progress=None, on_done=None):
+    """Copy every model, skipping tables the checkpoint marks as done; returns {model: rows copied}"""
+    pending = [model for model in models_to_copy if not checkpoint.is_done(model._meta.db_table)]
+    with explicit_timestamps(*pending):
+        return run_in_dependency_order(
+            pending,
+            lambda model, stop: copy_table(model, source, target, checkpoint, chunk_size, progress, stop),
+            workers,
+            on_done,
+        )
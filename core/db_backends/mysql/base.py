@@ -0,0 +1,11 @@
+from django.db.backends.mysql import base
+
+from core.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def ping_connection(self, connection):
+        # COM_PING costs a round trip but no query parsing. Never let the driver
+        # reconnect (PyMySQL does by default): a dead connection must be replaced
+        # by the pool, which counts it.
+        connection.ping(False)
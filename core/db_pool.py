@@ -0,0 +1,277 @@
+"""
+Pooled database connections.
+
+Django opens a connection per request (CONN_MAX_AGE = 0) and, on MySQL, has
+no pool of its own. The backends in core.db_backends keep Django's
+per-request lifecycle but take connections from a bounded pool per worker
+process and give them back when Django closes them, so a request only pays
+for connection setup and the TLS handshake when the pool has nothing idle.
+
+Configure a pool with a ``POOL`` entry in the database settings:
+
+    'POOL': {'MAX_SIZE': 10, 'TIMEOUT': 5, 'MAX_AGE': 300}
+
+MAX_SIZE bounds the connections a process holds open (idle and in use);
+a checkout waits up to TIMEOUT seconds for one to be returned and then
+fails with OperationalError. Connections older than MAX_AGE seconds are
+replaced. Every reused connection is pinged before it is handed out, and
+broken ones are replaced. Without ``POOL`` (or with MAX_SIZE 0) every
+connection is opened and closed as usual, which benchmark_db_pool uses to
+compare both.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+from .metrics import Counter, Gauge, Histogram
+
+logger = logging.getLogger(__name__)
+
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CHECKOUTS = Counter(
+    'db_pool_checkouts_total', 'Connection checkouts by database and whether an idle connection was reused',
+    ['database', 'outcome'])
+RECONNECTS = Counter(
+    'db_pool_reconnects_total', 'Pooled connections replaced by database and reason', ['database', 'reason'])
+WAITS = Histogram(
+    'db_pool_wait_seconds', 'Time checkouts waited for a connection to be returned to a full pool',
+    ['database'], buckets=POOL_WAIT_BUCKETS)
+TIMEOUTS = Counter('db_pool_timeouts_total', 'Checkouts that gave up waiting for a connection', ['database'])
+CONNECT_TIME = Counter(
+    'db_connect_seconds_total', 'Time spent opening new database connections', ['database'])
+
+
+class ConnectionPool:
+    """A bounded, thread-safe set of open DB-API connections to one database"""
+
+    def __init__(self, alias, max_size, timeout, max_age):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self._idle = deque()
+        self._opened_at = {}
+        self._size = 0
+        self._condition = threading.Condition()
+        self.stats = {'opened': 0, 'reused': 0, 'waits': 0, 'wait_time': 0.0, 'connect_time': 0.0,
+                      'reconnects': 0, 'timeouts': 0}
+
+    def _count(self, **amounts):
+        with self._condition:
+            for key, amount in amounts.items():
+                self.stats[key] += amount
+
+    def checkout(self, connect, ping):
+        """
+        An open connection: an idle one that passes ``ping(connection)`` or a
+        new one from ``connect()``. Returns (connection, reused).
+        """
+        deadline = time.monotonic() + self.timeout
+        waited_since = None
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    if waited_since is None:
+                        waited_since = time.monotonic()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats['timeouts'] += 1
+                        TIMEOUTS.inc(database=self.alias)
+                        raise OperationalError(
+                            f"No connection to '{self.alias}' was free within {self.timeout}s "
+                            f"(pool size {self.max_size})")
+                    self._condition.wait(remaining)
+                if self._idle:
+                    connection = self._idle.pop()
+                else:
+                    connection = None
+                    self._size += 1
+
+            if waited_since is not None:
+                waited = time.monotonic() - waited_since
+                self._count(waits=1, wait_time=waited)
+                WAITS.observe(waited, database=self.alias)
+                waited_since = None
+
+            if connection is None:
+                return self._open(connect), False
+
+            reason = self._unusable_reason(connection, ping)
+            if reason is None:
+                self._count(reused=1)
+                CHECKOUTS.inc(database=self.alias, outcome='reused')
+                return connection, True
+            self._count(reconnects=1)
+            RECONNECTS.inc(database=self.alias, reason=reason)
+            self._discard(connection)
+
+    def _open(self, connect):
+        started = time.perf_counter()
+        try:
+            connection = connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        elapsed = time.perf_counter() - started
+        self._count(opened=1, connect_time=elapsed)
+        CONNECT_TIME.inc(elapsed, database=self.alias)
+        CHECKOUTS.inc(database=self.alias, outcome='new')
+        self._opened_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _unusable_reason(self, connection, ping):
+        if time.monotonic() - self._opened_at.get(id(connection), 0) > self.max_age:
+            return 'expired'
+        try:
+            ping(connection)
+        except Exception:
+            return 'unusable'
+        return None
+
+    def checkin(self, connection):
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def _discard(self, connection):
+        self._opened_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    def discard(self, connection):
+        """Close a checked-out connection instead of returning it"""
+        self._discard(connection)
+
+    def counts(self):
+        with self._condition:
+            return {'idle': len(self._idle), 'in_use': self._size - len(self._idle)}
+
+    def close_idle(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection)
+
+
+_pools = {}
+_pools_pid = None
+_pools_lock = threading.Lock()
+
+
+def pool_for(alias, settings_dict):
+    """This process's pool for ``alias``, or None when it is not configured for pooling"""
+    global _pools, _pools_pid
+    config = settings_dict.get('POOL') or {}
+    if not config.get('MAX_SIZE'):
+        return None
+    if _pools_pid != os.getpid():
+        with _pools_lock:
+            if _pools_pid != os.getpid():
+                # Connections inherited through a fork share the parent's sockets: drop, never close, them
+                _pools, _pools_pid = {}, os.getpid()
+    # Keyed by where connections go too: the test runner renames the database under the same alias
+    key = (alias, settings_dict['NAME'], settings_dict.get('HOST'), settings_dict.get('PORT'),
+           settings_dict.get('USER'))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(key, ConnectionPool(
+                alias, config['MAX_SIZE'], config.get('TIMEOUT', 5), config.get('MAX_AGE', 300)))
+    return pool
+
+
+def pools():
+    """This process's pools: [pool]"""
+    return list(_pools.values()) if _pools_pid == os.getpid() else []
+
+
+def close_pools():
+    """Close every idle pooled connection of this process"""
+    for pool in pools():
+        pool.close_idle()
+
+
+atexit.register(close_pools)
+
+Gauge('db_pool_connections', 'Pooled connections by database and state',
+      lambda: {(pool.alias, state): count for pool in pools() for state, count in pool.counts().items()},
+      ['database', 'state'])
+
+
+class PooledDatabaseWrapperMixin:
+    """Take connections from the alias's pool and return them when Django closes them"""
+
+    _pool_reused = False
+
+    def _pool(self):
+        if self.vendor == 'sqlite' and self.is_in_memory_db():
+            # Each in-memory connection is its own database
+            return None
+        return pool_for(self.alias, self.settings_dict)
+
+    def ping_connection(self, connection):
+        """Raise if a pooled DB-API connection can no longer run queries"""
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def get_new_connection(self, conn_params):
+        pool = self._pool()
+        if pool is None:
+            started = time.perf_counter()
+            connection = super().get_new_connection(conn_params)
+            CONNECT_TIME.inc(time.perf_counter() - started, database=self.alias)
+            CHECKOUTS.inc(database=self.alias, outcome='new')
+            return connection
+        connection, self._pool_reused = pool.checkout(
+            lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(conn_params), self.ping_connection)
+        return connection
+
+    def connect(self):
+        try:
+            super().connect()
+        finally:
+            self._pool_reused = False
+
+    def _set_autocommit(self, autocommit):
+        # Pooled connections are only returned in autocommit mode
+        if self._pool_reused and autocommit:
+            return
+        super()._set_autocommit(autocommit)
+
+    def init_connection_state(self):
+        # Session state set when the connection was opened is still in place
+        if self._pool_reused:
+            return
+        super().init_connection_state()
+
+    def _close(self):
+        pool = self._pool()
+        if pool is None or self.connection is None:
+            return super()._close()
+
+        connection = self.connection
+        if self.in_atomic_block or not self.get_autocommit():
+            # Django keeps a reference to connections closed mid-transaction, so never share them
+            pool.discard(connection)
+            return
+        if self.errors_occurred and not self.is_usable():
+            pool.discard(connection)
+            return
+        pool.checkin(connection)
@@ -0,0 +1,257 @@
+"""
+Per-request instrumentation.
+
+RequestTimingMiddleware measures every request (wall time, database queries
+and their time, template render time, cache hits and misses), reports it in
+a ``Server-Timing`` header and folds it into in-memory histograms keyed by
+URL name. The histograms are per process; see route_stats(). Each request
+also gets an ID (reusing a well-formed incoming ``X-Request-ID``) that is
+returned in the response and attached to log records.
+"""
+import bisect
+import contextvars
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import connections
+from django.template.base import Template
+
+from . import slow_queries
+from .metrics import observe_request
+from .query_budgets import budget_for
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in milliseconds, each ~10% wider than the last, so
+# percentiles read from the buckets are within 10% of the true value.
+LATENCY_BUCKETS = [round(0.5 * 1.1 ** i, 3) for i in range(120)]
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+# Outlives the middleware so records logged by the handler after the response
+# (e.g. django.request's 4xx/5xx warnings) still carry the request ID
+_logging_context = contextvars.ContextVar('request_logging_context', default=None)
+
+# Incoming X-Request-ID values are reused only if they look like IDs
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+
+def _request_id(request):
+    incoming = request.META.get('HTTP_X_REQUEST_ID', '') if request is not None else ''
+    return incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+
+
+class RequestMetrics:
+    """Measurements of the request being served"""
+
+    def __init__(self, request=None):
+        self.request = request
+        self.request_id = _request_id(request)
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current_metrics():
+    """Metrics of the request being served by this thread, or None"""
+    return _current.get()
+
+
+def logging_context():
+    """Metrics of the request whose log records are being emitted, or None"""
+    return _logging_context.get()
+
+
+def _clear_logging_context(**kwargs):
+    _logging_context.set(None)
+
+
+request_finished.connect(_clear_logging_context)
+
+
+def note_cache_event(event):
+    """Count a core.caching event against the current request"""
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if event in ('hit', 'stale'):
+        metrics.cache_hits += 1
+    elif event in ('miss', 'recompute', 'early_recompute'):
+        metrics.cache_misses += 1
+
+
+def _query_timer(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        metrics.queries += 1
+        metrics.db_time += duration
+        if slow_queries.should_capture(duration):
+            slow_queries.capture(sql, params, many, duration, context['connection'].alias,
+                                 _route_name(metrics.request))
+
+
+_template_render = Template.render
+
+
+def _timed_template_render(self, context):
+    metrics = _current.get()
+    if metrics is None:
+        return _template_render(self, context)
+
+    # Included templates render inside their parent; only time the outermost
+    metrics.template_depth += 1
+    started = time.perf_counter()
+    try:
+        return _template_render(self, context)
+    finally:
+        metrics.template_depth -= 1
+        if metrics.template_depth == 0:
+            metrics.template_time += time.perf_counter() - started
+
+
+Template.render = _timed_template_render
+
+
+class RouteStats:
+    """Latency and query-count histograms of one URL name"""
+
+    def __init__(self):
+        self.requests = 0
+        self.latency = Counter()
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, latency_ms, metrics):
+        self.requests += 1
+        self.latency[bisect.bisect_left(LATENCY_BUCKETS, latency_ms)] += 1
+        self.queries[metrics.queries] += 1
+        self.db_time += metrics.db_time
+        self.template_time += metrics.template_time
+        self.cache_hits += metrics.cache_hits
+        self.cache_misses += metrics.cache_misses
+
+    @staticmethod
+    def _percentile(histogram, fraction, value=lambda key: key):
+        rank = fraction * sum(histogram.values())
+        seen = 0
+        for key in sorted(histogram):
+            seen += histogram[key]
+            if seen >= rank:
+                return value(key)
+        return 0
+
+    def latency_percentile(self, fraction):
+        def upper_bound(bucket):
+            return LATENCY_BUCKETS[bucket] if bucket < len(LATENCY_BUCKETS) else float('inf')
+        return self._percentile(self.latency, fraction, upper_bound)
+
+    def query_percentile(self, fraction):
+        return self._percentile(self.queries, fraction)
+
+    def summary(self):
+        requests = self.requests or 1
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            'requests': self.requests,
+            'p50': self.latency_percentile(0.50),
+            'p95': self.latency_percentile(0.95),
+            'p99': self.latency_percentile(0.99),
+            'queries_mean': sum(k * v for k, v in self.queries.items()) / requests,
+            'queries_p95': self.query_percentile(0.95),
+            'queries_max': max(self.queries, default=0),
+            'db_ms_mean': self.db_time * 1000 / requests,
+            'template_ms_mean': self.template_time * 1000 / requests,
+            'cache_hit_ratio': self.cache_hits / lookups if lookups else None,
+        }
+
+
+_routes = {}
+_routes_lock = threading.Lock()
+
+
+def record_request(route, latency_ms, metrics):
+    with _routes_lock:
+        stats = _routes.get(route)
+        if stats is None:
+            stats = _routes[route] = RouteStats()
+        stats.add(latency_ms, metrics)
+
+
+def route_stats():
+    """{url_name: summary} of every route served by this process"""
+    with _routes_lock:
+        return {route: stats.summary() for route, stats in _routes.items()}
+
+
+def reset_route_stats():
+    with _routes_lock:
+        _routes.clear()
+
+
+def _route_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.url_name:
+        return None
+    return match.view_name
+
+
+class RequestTimingMiddleware:
+    """Time each request and report it in Server-Timing and the route histograms"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        _logging_context.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_timer))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        latency_ms = metrics.elapsed() * 1000
+        route = _route_name(request)
+        if route is not None:
+            record_request(route, latency_ms, metrics)
+            budget = budget_for(request.resolver_match)
+            if budget is not None and metrics.queries > budget:
+                logger.warning("%s ran %d queries, over its budget of %d", route, metrics.queries, budget)
+        observe_request(route or 'unresolved', response.status_code, latency_ms / 1000,
+                        metrics.queries, metrics.db_time)
+
+        response['X-Request-ID'] = metrics.request_id
+        if settings.SERVER_TIMING_HEADER:
+            response['Server-Timing'] = ', '.join([
+                f'total;dur={latency_ms:.1f}',
+                f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"',
+                f'tpl;dur={metrics.template_time * 1000:.1f}',
+                f'cache;desc="{metrics.cache_hits} hits, {metrics.cache_misses} misses"',
+            ])
+        return response
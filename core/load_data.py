@@ -0,0 +1,429 @@
+"""
+Synthetic data at performance-testing volumes.
+
+generate() tops every model up to a target row count with batched
+bulk_create. The rows to create are split into chunks of CHUNK_SIZE that
+worker processes build and insert, each in its own transaction. Every
+chunk draws from a random generator seeded with the seed, the model and
+the chunk's first row number, so the same seed gives the same data
+whatever the number of workers. Timestamps are relative to the start of
+the current day.
+
+Models whose rows reference others (event registrations, activity logs)
+are generated after the rows they point to.
+"""
+import functools
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .activity_facets import rebuild_facets
+from .caching import bump_content_version
+from .models import (
+    AboutUs, ActivityLog, Article, BlogPost, ContactInquiry, CustomUser, Event, EventRegistration,
+    Feedback, GalleryItem, Newsletter, SiteSettings, Solution, TeamMember,
+)
+from .registrations import recount_registrations
+
+CHUNK_SIZE = 20000
+BATCH_SIZE = 2000
+
+USER_PREFIX = 'loadtest-user-'
+
+DEFAULT_VOLUMES = {
+    'users': 25,
+    'solutions': 30,
+    'team': 20,
+    'posts': 3000,
+    'articles': 500,
+    'inquiries': 100000,
+    'feedback': 2000,
+    'newsletter': 5000,
+    'events': 300,
+    'gallery': 600,
+    'registrations_per_event': 20,
+    'activity_logs': 1000000,
+}
+
+VOCABULARY = (
+    'model', 'data', 'pipeline', 'health', 'finance', 'learning', 'insight', 'vision', 'language',
+    'automation', 'analytics', 'forecast', 'patient', 'risk', 'student', 'platform', 'cloud', 'ethics',
+    'agent', 'report', 'scale', 'quality', 'signal', 'network', 'training', 'inference', 'privacy',
+    'clinical', 'fraud', 'portfolio', 'curriculum', 'outcome', 'latency', 'governance', 'dataset',
+)
+FIRST_NAMES = ('Aarav', 'Maya', 'Liam', 'Sofia', 'Noah', 'Priya', 'Elena', 'Kenji', 'Amara', 'Lucas', 'Zara', 'Omar')
+LAST_NAMES = ('Sharma', 'Smith', 'Garcia', 'Kim', 'Müller', 'Okafor', 'Rossi', 'Tanaka', 'Silva', 'Dubois', 'Thapa')
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let bulk_create store the given created/updated times instead of now().
+    Builders must then set every such field themselves.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class _Text:
+    """Cheap random text: sentences and paragraphs drawn from per-chunk pools"""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.sentences = [self._sentence() for _ in range(200)]
+        self.paragraphs = [' '.join(rng.choices(self.sentences, k=rng.randint(3, 7))) for _ in range(60)]
+        self.titles = [self.words(4).title() for _ in range(500)]
+        self.ips = [f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}' for _ in range(1000)]
+
+    def _sentence(self):
+        words = self.rng.choices(VOCABULARY, k=self.rng.randint(6, 16))
+        return ' '.join(words).capitalize() + '.'
+
+    def words(self, count):
+        return ' '.join(self.rng.choices(VOCABULARY, k=count))
+
+    def title(self, count=5):
+        return self.words(count).title()
+
+    def sentence(self):
+        return self.rng.choice(self.sentences)
+
+    def paragraph(self):
+        return self.rng.choice(self.paragraphs)
+
+    def name(self):
+        return f'{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)}'
+
+    def html(self, sections):
+        """An article body with headings, paragraphs, a list and a quote"""
+        parts = []
+        for _ in range(sections):
+            parts.append(f'<h2>{self.title(4)}</h2>')
+            parts.extend(f'<p>{self.paragraph()}</p>' for _ in range(self.rng.randint(2, 4)))
+            if self.rng.random() < 0.4:
+                items = ''.join(f'<li>{self.sentence()}</li>' for _ in range(self.rng.randint(3, 6)))
+                parts.append(f'<ul>{items}</ul>')
+            if self.rng.random() < 0.15:
+                parts.append(f'<blockquote>{self.sentence()}</blockquote>')
+        return '\n'.join(parts)
+
+
+@functools.cache
+def _choices(model, field):
+    return [value for value, _ in model._meta.get_field(field).choices]
+
+
+def _ago(rng, now, days):
+    return now - timedelta(seconds=rng.randrange(days * 86400))
+
+
+# Row builders: (rng, text, now, row number, context) -> model instance
+
+def _user(rng, text, now, n, context):
+    joined = _ago(rng, now, 1095)
+    return CustomUser(username=f'{USER_PREFIX}{n}', email=f'user{n}@loadtest.invalid', role='viewer',
+                      password='!', first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES),
+                      date_joined=joined, created_at=joined, updated_at=joined)
+
+
+def _solution(rng, text, now, n, context):
+    stamp = _ago(rng, now, 720)
+    return Solution(
+        title=f'{text.title(3)} {n}', description=text.paragraph(), detailed_content=text.html(3),
+        category=rng.choice(_choices(Solution, 'category')), icon='cpu',
+        features=[text.words(4) for _ in range(5)], benefits=[text.words(4) for _ in range(4)],
+        use_cases=[text.sentence() for _ in range(3)],
+        faqs=[{'question': text.sentence(), 'answer': text.paragraph()} for _ in range(3)],
+        is_featured=rng.random() < 0.1, order=n, created_at=stamp, updated_at=stamp)
+
+
+def _team_member(rng, text, now, n, context):
+    return TeamMember(name=text.name(), role=text.title(2), bio=text.paragraph(),
+                      email=f'team{n}@loadtest.invalid', order=n, created_at=now, updated_at=now)
+
+
+def _post(rng, text, now, n, context):
+    published = _ago(rng, now, 1095)
+    title = text.title(rng.randint(4, 9))
+    status = rng.choices(('published', 'draft', 'archived'), (90, 7, 3))[0]
+    return BlogPost(
+        title=title, slug=f'{slugify(title)[:40]}-{n}', excerpt=text.sentence()[:300],
+        content=text.html(rng.randint(3, 6)), author=text.name(),
+        category=rng.choice(_choices(BlogPost, 'category')), tags=rng.sample(VOCABULARY, 3),
+        status=status, is_featured=rng.random() < 0.02, read_time=rng.randint(2, 15),
+        views_count=int(rng.paretovariate(1.2) * 50),
+        published_at=published if status == 'published' else None, created_at=published, updated_at=published)
+
+
+def _article(rng, text, now, n, context):
+    stamp = _ago(rng, now, 1095)
+    return Article(
+        title=text.title(rng.randint(4, 9)), content=text.html(rng.randint(4, 8)), excerpt=text.paragraph(),
+        category=rng.choice(('healthcare', 'finance', 'education')), status='published',
+        article_type=rng.choice(_choices(Article, 'article_type')), author=text.name(),
+        published_at=stamp, created_at=stamp, updated_at=stamp, download_count=rng.randrange(500))
+
+
+def _inquiry(rng, text, now, n, context):
+    stamp = _ago(rng, now, 730)
+    return ContactInquiry(
+        name=text.name(), email=f'inquiry{n}@example.com', phone=f'+1 555 {rng.randrange(10**7):07d}',
+        company=text.title(2), message=text.paragraph(),
+        country=rng.choice(_choices(ContactInquiry, 'country')),
+        job_title=rng.choice(_choices(ContactInquiry, 'job_title')),
+        is_read=rng.random() < 0.8, is_responded=rng.random() < 0.5, created_at=stamp, updated_at=stamp)
+
+
+def _feedback(rng, text, now, n, context):
+    stamp = _ago(rng, now, 730)
+    return Feedback(
+        name=text.name(), email=f'feedback{n}@example.com', company=text.title(2),
+        rating=rng.choices((1, 2, 3, 4, 5), (3, 5, 12, 35, 45))[0], comment=text.paragraph(),
+        is_approved=rng.random() < 0.7, is_featured=rng.random() < 0.05, created_at=stamp, updated_at=stamp)
+
+
+def _subscriber(rng, text, now, n, context):
+    return Newsletter(email=f'subscriber{n}@example.com', name=text.name(), is_active=rng.random() < 0.9,
+                      subscribed_at=_ago(rng, now, 1095))
+
+
+def _event(rng, text, now, n, context):
+    day = (now + timedelta(days=rng.randint(-365, 365))).date()
+    per_event = context['registrations_per_event']
+    return Event(
+        title=f'{text.title(4)} {n}', description=text.html(2),
+        event_type=rng.choice(_choices(Event, 'event_type')), date=day, time=f'{rng.randint(8, 18):02d}:00',
+        location=text.title(2), capacity=max(per_event, rng.choice((50, 100, 250, 500))) + rng.randrange(100),
+        status='upcoming' if day >= now.date() else 'completed', is_featured=rng.random() < 0.05,
+        speakers=[{'name': text.name(), 'title': text.title(2)} for _ in range(rng.randint(1, 4))],
+        agenda=[{'time': f'{9 + i}:00', 'title': text.title(3)} for i in range(rng.randint(2, 6))],
+        created_at=now, updated_at=now)
+
+
+def _gallery_item(rng, text, now, n, context):
+    return GalleryItem(
+        title=text.title(4), description=f'<p>{text.paragraph()}</p>', image=f'gallery/loadtest-{n % 20}.jpg',
+        category=rng.choice(_choices(GalleryItem, 'category')), event_date=_ago(rng, now, 1095).date(),
+        location=text.title(2), event_name=text.title(3), order=n, created_at=now, updated_at=now)
+
+
+def _activity_log(rng, text, now, n, context):
+    return ActivityLog(
+        user_id=rng.choice(context['user_ids']),
+        action=rng.choices(('view', 'update', 'create', 'delete'), (70, 20, 8, 2))[0],
+        content_type=rng.choice(('BlogPost', 'Inquiries', 'Feedback', 'Event', 'Article')),
+        object_id=rng.randrange(1, 100000), object_repr=rng.choice(text.titles), ip_address=rng.choice(text.ips),
+        # Spread over the retention window so partitions and archives see realistic months
+        timestamp=_ago(rng, now, context['log_days']))
+
+
+# kind: (model, builder, whether rows may collide with unique values already stored and are skipped)
+GENERATORS = {
+    'users': (CustomUser, _user, True),
+    'solutions': (Solution, _solution, False),
+    'team': (TeamMember, _team_member, False),
+    'posts': (BlogPost, _post, True),
+    'articles': (Article, _article, False),
+    'inquiries': (ContactInquiry, _inquiry, False),
+    'feedback': (Feedback, _feedback, False),
+    'newsletter': (Newsletter, _subscriber, True),
+    'events': (Event, _event, False),
+    'gallery': (GalleryItem, _gallery_item, False),
+    'activity_logs': (ActivityLog, _activity_log, False),
+}
+
+# Generated once the rows they reference exist
+DEPENDENT_KINDS = ('activity_logs',)
+
+
+def _existing(kind):
+    model = GENERATORS[kind][0]
+    if kind == 'users':
+        return model.objects.filter(username__startswith=USER_PREFIX).count()
+    return model.objects.count()
+
+
+def _anchor():
+    return timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# Worker side
+
+@contextmanager
+def _bulk_load_session():
+    """
+    Trade durability for speed on this process's connection while a chunk is inserted.
+
+    Unique checks stay on: bulk_create(ignore_conflicts=True) relies on them
+    to skip rows that collide with existing data. The previous settings are
+    restored afterwards, so a pooled connection goes back unchanged.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute('SELECT @@SESSION.foreign_key_checks')
+            saved = cursor.fetchone()[0]
+            cursor.execute('SET SESSION foreign_key_checks = 0')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('PRAGMA synchronous')
+            saved = cursor.fetchone()[0]
+            cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('SET SESSION foreign_key_checks = %s', [saved])
+            elif connection.vendor == 'sqlite':
+                cursor.execute(f'PRAGMA synchronous = {int(saved)}')
+
+
+def _init_worker():
+    # Forked workers must open their own connections, never reuse the parent's sockets
+    for conn in connections.all(initialized_only=True):
+        conn.connection = None
+        conn.close()
+
+
+def generate_chunk(kind, start, count, seed, context):
+    """Build and insert rows ``start`` to ``start + count`` of ``kind``; returns rows inserted"""
+    model, build, unique = GENERATORS[kind]
+    rng = random.Random(f'{seed}:{kind}:{start}')
+    text = _Text(rng)
+    now = context['now']
+    with _bulk_load_session(), explicit_timestamps(model), transaction.atomic():
+        rows = [build(rng, text, now, n, context) for n in range(start, start + count)]
+        model.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=unique)
+    return count
+
+
+def generate_registrations(event_ids, per_event, seed, context):
+    """``per_event`` registrations for each event"""
+    rng = random.Random(f'{seed}:registrations:{event_ids[0]}')
+    text = _Text(rng)
+    now = context['now']
+    rows = []
+    for event_id in event_ids:
+        for n in range(per_event):
+            rows.append(EventRegistration(
+                event_id=event_id, name=text.name(), email=f'attendee{n}.{event_id}@example.com',
+                company=text.title(2), job_title=text.title(2),
+                registration_date=_ago(rng, now, 90), attended=rng.random() < 0.6))
+    with _bulk_load_session(), explicit_timestamps(EventRegistration), transaction.atomic():
+        EventRegistration.objects.bulk_create(rows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    return len(rows)
+
+
+# Parent side
+
+def ensure_singletons():
+    """Every page renders these; without them SiteSettings.load() is never cached"""
+    if not SiteSettings.objects.exists():
+        SiteSettings.objects.create(site_name='AI-Solution', contact_email='info@loadtest.invalid')
+    if not AboutUs.objects.exists():
+        AboutUs.objects.create(company_background='<p>AI-Solution builds AI platforms.</p>',
+                               mission='<p>Useful AI for everyone.</p>', vision='<p>Trustworthy AI.</p>')
+
+
+def _workers_for(requested):
+    if connection.vendor == 'sqlite':
+        # SQLite has a single writer, and a test database only exists in this process
+        return 1
+    return max(requested or os.cpu_count() or 1, 1)
+
+
+def generate(volumes, seed=0, workers=None, stdout=None):
+    """
+    Top the database up to ``volumes`` ({kind: rows}) and return {kind: rows created}.
+
+    ``registrations_per_event`` gives every event without registrations that
+    many. ``workers`` defaults to one process per CPU (always one on SQLite).
+    """
+    workers = _workers_for(workers)
+    context = {
+        'now': _anchor(),
+        'registrations_per_event': volumes.get('registrations_per_event', 0),
+        'log_days': settings.ACTIVITY_LOG_RETENTION_MONTHS * 30,
+    }
+    ensure_singletons()
+
+    executor = None
+    if workers > 1:
+        # Children must not share the parent's database sockets
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('fork'), initializer=_init_worker)
+
+    def run(tasks):
+        if executor is None:
+            return [function(*args) for function, args in tasks]
+        futures = [executor.submit(function, *args) for function, args in tasks]
+        return [future.result() for future in futures]
+
+    def report(kind, rows, started):
+        if stdout is not None and rows:
+            elapsed = time.perf_counter() - started
+            stdout.write(f'  {kind}: {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)')
+
+    created = {}
+    try:
+        independent = [kind for kind in GENERATORS if kind in volumes and kind not in DEPENDENT_KINDS]
+        if 'activity_logs' in volumes and 'users' not in independent:
+            independent.insert(0, 'users')
+        for phase in (independent, [kind for kind in DEPENDENT_KINDS if kind in volumes]):
+            if 'activity_logs' in phase:
+                context['user_ids'] = list(CustomUser.objects.filter(
+                    username__startswith=USER_PREFIX).values_list('pk', flat=True))
+            for kind in phase:
+                started = time.perf_counter()
+                target = volumes.get(kind, DEFAULT_VOLUMES[kind])
+                first = _existing(kind)
+                tasks = [
+                    (generate_chunk, (kind, start, min(CHUNK_SIZE, target - start), seed, context))
+                    for start in range(first, target, CHUNK_SIZE)
+                ]
+                created[kind] = sum(run(tasks))
+                report(kind, created[kind], started)
+
+        per_event = context['registrations_per_event']
+        if per_event:
+            started = time.perf_counter()
+            event_ids = list(Event.objects.filter(registrations__isnull=True).order_by('pk')
+                             .values_list('pk', flat=True))
+            events_per_chunk = max(CHUNK_SIZE // per_event, 1)
+            tasks = [
+                (generate_registrations, (event_ids[i:i + events_per_chunk], per_event, seed, context))
+                for i in range(0, len(event_ids), events_per_chunk)
+            ]
+            created['registrations'] = sum(run(tasks))
+            # bulk_create skips the signals that keep registered_count in step
+            recount_registrations(event_ids)
+            report('registrations', created['registrations'], started)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for kind, rows in created.items():
+        if rows and kind in GENERATORS:
+            bump_content_version(GENERATORS[kind][0])
+    if created.get('activity_logs') or created.get('users'):
+        rebuild_facets()
+    return created
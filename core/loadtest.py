@@ -0,0 +1,372 @@
+"""
+Load testing of the site's endpoints.
+
+seed_dataset() tops the database up to a realistic volume of content (see
+core.load_data).
+endpoint_plans() turns every URL pattern of core.urls and admin_dashboard.urls
+into a request plan, filling URL arguments from the seeded data and
+rotating through them so detail pages are not all served from one cache
+entry. run_endpoint() drives one plan over HTTP with concurrent clients
+and summarises throughput and latency; compare_results() flags
+regressions against a stored baseline. See the ``load_test`` command.
+"""
+import http.client
+import importlib
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.tokens import default_token_generator
+from django.urls import URLPattern, reverse
+from django.utils.crypto import get_random_string
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from django.utils.module_loading import import_string
+
+from . import load_data
+from .models import ActivityLog, Article, BlogPost, ContactInquiry, CustomUser, Event, Feedback, GalleryItem, Solution
+
+LOADTEST_ADMIN = 'loadtest-admin'
+
+# URL argument values are rotated through this many sampled objects
+SAMPLE_SIZE = 50
+
+# URL namespaces under test and the prefix they are included at
+URLCONFS = (('core.urls', ''), ('admin_dashboard.urls', 'admin/'))
+
+# Endpoints that are not driven, with the reason shown in the report
+SKIPPED = {
+    'admin_logout': 'ends the load-test session',
+    'content_delete': 'deletes content',
+    'metrics': 'requires METRICS_TOKEN',
+}
+
+# Content types of admin_dashboard's content views, and which views take which
+ADMIN_CONTENT_TYPES = {
+    'inquiries': ContactInquiry,
+    'feedback': Feedback,
+    'blog': BlogPost,
+    'articles': Article,
+    'events': Event,
+    'gallery': GalleryItem,
+    'solutions': Solution,
+}
+_FORM_CONTENT_TYPES = ('solutions', 'blog', 'events', 'gallery', 'articles')
+CONTENT_TYPES_BY_URL = {
+    'content_list': ('inquiries', 'feedback', 'blog', 'articles', 'events', 'gallery'),
+    'export_csv': ('inquiries', 'feedback', 'blog', 'solutions'),
+    'content_add': _FORM_CONTENT_TYPES,
+    'add_content': _FORM_CONTENT_TYPES,
+    'content_edit': _FORM_CONTENT_TYPES,
+    'edit_content': _FORM_CONTENT_TYPES,
+}
+
+
+# Seeding
+
+def seed_dataset(volumes=None, seed=0, workers=None, stdout=None):
+    """Top the database up to the load-test volumes; returns {kind: rows created}"""
+    return load_data.generate({**load_data.DEFAULT_VOLUMES, **(volumes or {})}, seed=seed, workers=workers,
+                              stdout=stdout)
+
+
+def dataset_counts():
+    return {
+        'posts': BlogPost.objects.count(),
+        'inquiries': ContactInquiry.objects.count(),
+        'activity_logs': ActivityLog.objects.count(),
+        'feedback': Feedback.objects.count(),
+        'events': Event.objects.count(),
+        'gallery': GalleryItem.objects.count(),
+        'articles': Article.objects.count(),
+        'solutions': Solution.objects.count(),
+    }
+
+
+# Sessions
+
+def loadtest_admin():
+    user, created = CustomUser.objects.get_or_create(
+        username=LOADTEST_ADMIN,
+        defaults={'email': 'admin@loadtest.invalid', 'role': 'admin', 'is_staff': True},
+    )
+    if created:
+        user.set_unusable_password()
+        user.save(update_fields=['password'])
+    return user
+
+
+def admin_session_key(user):
+    """A session key logged in as ``user``, created without going through the login form"""
+    engine = importlib.import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    # The cookie is sent on every request, so the session never idles out
+    session.set_expiry(24 * 60 * 60)
+    session.save()
+    return session.session_key
+
+
+# Request plans
+
+class EndpointPlan:
+    """How to request one URL name: a method and a rotation of paths and bodies"""
+
+    def __init__(self, name, method, requests, admin=False):
+        self.name = name
+        self.method = method
+        # [(path, body bytes or None, content type or None)]
+        self.requests = requests
+        self.admin = admin
+
+    def request(self, i):
+        return self.requests[i % len(self.requests)]
+
+
+def _sample_ids(queryset):
+    return list(queryset.order_by('?').values_list('pk', flat=True)[:SAMPLE_SIZE])
+
+
+def _url_kwargs(user):
+    """Candidate values for each URL argument name"""
+    return {
+        'solution_id': _sample_ids(Solution.objects.filter(is_active=True)),
+        'slug': list(BlogPost.objects.filter(status='published').order_by('?')
+                     .values_list('slug', flat=True)[:SAMPLE_SIZE]),
+        'pk': _sample_ids(Article.objects.filter(status='published')),
+        'article_id': _sample_ids(Article.objects.all()),
+        'event_id': _sample_ids(Event.objects.filter(status='upcoming')),
+        'item_id': _sample_ids(GalleryItem.objects.all()),
+        'uidb64': [urlsafe_base64_encode(force_bytes(user.pk))],
+        'token': [default_token_generator.make_token(user)],
+        'job_id': ['loadtest'],
+        'profile_id': ['loadtest'],
+    }
+
+
+def _json_body(data):
+    return json.dumps(data).encode(), 'application/json'
+
+
+def _form_body(data):
+    return urlencode(data).encode(), 'application/x-www-form-urlencoded'
+
+
+def _post_bodies(name, kwargs_list):
+    """Request bodies of the POST-only endpoints, one per rotation slot"""
+    def unique():
+        return f'{uuid.uuid4().hex[:12]}@loadtest.invalid'
+
+    feedback_ids = _sample_ids(Feedback.objects.all())
+    inquiry_ids = _sample_ids(ContactInquiry.objects.all())
+    builders = {
+        'submit_feedback': lambda i: _form_body(
+            {'name': 'Load Test', 'email': unique(), 'rating': 5, 'comment': 'Load test feedback'}),
+        'newsletter_signup': lambda i: _form_body({'email': unique()}),
+        'chatbot_response': lambda i: _json_body(
+            {'message': ('hello', 'what services do you offer', 'pricing', 'unknown question')[i % 4]}),
+        'event_registration': lambda i: _form_body({'name': 'Load Test', 'email': unique()}),
+        'toggle_approval': lambda i: _json_body({'id': feedback_ids[i % len(feedback_ids)]}),
+        'mark_as_read': lambda i: _json_body({'id': inquiry_ids[i % len(inquiry_ids)]}),
+        'bulk_action': lambda i: _json_body({
+            'action': 'mark_read', 'content_type': 'inquiries', 'object_ids': inquiry_ids[:10]}),
+    }
+    return builders.get(name)
+
+
+def endpoint_plans(only=None):
+    """(plans, skipped) for every URL pattern under test; skipped maps name to reason"""
+    user = loadtest_admin()
+    candidates = _url_kwargs(user)
+    plans, skipped, seen = [], {}, set()
+
+    for urlconf, prefix in URLCONFS:
+        admin = urlconf.startswith('admin_dashboard')
+        for pattern in import_string(f'{urlconf}.urlpatterns'):
+            if not isinstance(pattern, URLPattern) or not pattern.name:
+                continue
+            name = pattern.name
+            route = str(pattern.pattern)
+            if name in seen or (prefix + route) in seen or (only and name not in only):
+                continue
+            seen.update((name, prefix + route))
+            if name in SKIPPED:
+                skipped[name] = SKIPPED[name]
+                continue
+
+            arguments = list(pattern.pattern.converters)
+            content_types = CONTENT_TYPES_BY_URL.get(name, ())
+            if arguments == ['content_type', 'object_id']:
+                kwargs_list = [
+                    {'content_type': content_type, 'object_id': pk}
+                    for content_type in content_types
+                    for pk in _sample_ids(ADMIN_CONTENT_TYPES[content_type].objects.all())[:5]
+                ]
+            elif arguments == ['content_type']:
+                kwargs_list = [{'content_type': content_type} for content_type in content_types]
+            else:
+                missing = [argument for argument in arguments if not candidates.get(argument)]
+                if missing:
+                    skipped[name] = f"no data for {', '.join(missing)}"
+                    continue
+                rotation = max((len(candidates[argument]) for argument in arguments), default=1)
+                kwargs_list = [
+                    {argument: candidates[argument][i % len(candidates[argument])] for argument in arguments}
+                    for i in range(rotation)
+                ]
+
+            paths = [reverse(name, kwargs=kwargs) for kwargs in kwargs_list]
+            body = _post_bodies(name, kwargs_list)
+            if body is None:
+                requests = [(path, None, None) for path in paths]
+                method = 'GET'
+            else:
+                requests = [(path, *body(i)) for i, path in enumerate(paths * 4)]
+                method = 'POST'
+            plans.append(EndpointPlan(name, method, requests, admin=admin))
+    return plans, skipped
+
+
+# Running
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class _Client:
+    """One keep-alive connection per worker thread"""
+
+    def __init__(self, base_url, cookies):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.cookie_header = '; '.join(f'{key}={value}' for key, value in cookies.items())
+        self.csrf_token = cookies[settings.CSRF_COOKIE_NAME]
+        self.connection = None
+
+    def send(self, method, path, body, content_type):
+        headers = {'Cookie': self.cookie_header, 'User-Agent': 'core.loadtest'}
+        if body is not None:
+            headers['Content-Type'] = content_type
+            headers['X-CSRFToken'] = self.csrf_token
+        for attempt in (1, 2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            try:
+                self.connection.request(method, path, body=body, headers=headers)
+                response = self.connection.getresponse()
+                response.read()
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; retry once
+                self.connection.close()
+                self.connection = None
+                if attempt == 2:
+                    raise
+                continue
+            if response.will_close:
+                self.connection.close()
+                self.connection = None
+            return response.status
+
+
+def run_endpoint(plan, base_url, session_key, requests, concurrency):
+    """
+    Send ``requests`` requests for ``plan`` over ``concurrency`` connections
+    and summarise them. Admin endpoints are requested with the session
+    ``session_key``; public ones anonymously, as most visitors are.
+    """
+    # Any well-formed secret works as long as the header repeats it
+    cookies = {settings.CSRF_COOKIE_NAME: get_random_string(32)}
+    if plan.admin:
+        cookies[settings.SESSION_COOKIE_NAME] = session_key
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+
+    def one(client, i):
+        path, body, content_type = plan.request(i)
+        started = time.perf_counter()
+        try:
+            status = client.send(plan.method, path, body, content_type)
+        except OSError:
+            status = None
+        return status, (time.perf_counter() - started) * 1000
+
+    def worker(n):
+        client = _Client(base_url, cookies)
+        # One unmeasured request per connection opens it and warms the server thread
+        one(client, n)
+        results = []
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return results
+            results.append(one(client, i))
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(worker, n) for n in range(concurrency)]
+        results = [result for future in futures for result in future.result()]
+    wall = time.perf_counter() - started
+
+    latencies = sorted(latency for _, latency in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(count for status, count in statuses.items() if status == 'None' or status.startswith('5'))
+    return {
+        'method': plan.method,
+        'path': plan.request(0)[0],
+        'requests': len(results),
+        'errors': errors,
+        'statuses': statuses,
+        'rps': len(results) / wall if wall else 0.0,
+        'mean_ms': sum(latencies) / len(latencies) if latencies else 0.0,
+        'p50_ms': percentile(latencies, 0.50),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+    }
+
+
+# Baselines
+
+def compare_results(results, baseline, threshold):
+    """
+    Per-endpoint comparison with a baseline run.
+
+    An endpoint regresses when its p95 latency grows, or its throughput
+    drops, by more than ``threshold`` (a fraction), or when it starts
+    returning errors.
+    """
+    rows = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            rows.append({'name': name, 'new': True, 'regressed': False, 'reasons': []})
+            continue
+        p95_change = (current['p95_ms'] - previous['p95_ms']) / previous['p95_ms'] if previous['p95_ms'] else 0.0
+        rps_change = (current['rps'] - previous['rps']) / previous['rps'] if previous['rps'] else 0.0
+        reasons = []
+        if p95_change > threshold:
+            reasons.append(f'p95 +{p95_change:.0%}')
+        if rps_change < -threshold:
+            reasons.append(f'rps {rps_change:.0%}')
+        if current['errors'] and not previous['errors']:
+            reasons.append(f"{current['errors']} errors")
+        rows.append({
+            'name': name, 'new': False, 'regressed': bool(reasons), 'reasons': reasons,
+            'p95_change': p95_change, 'rps_change': rps_change,
+        })
+    return rows
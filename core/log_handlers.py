@@ -0,0 +1,217 @@
+"""
+Logging handlers that keep disk I/O off the request thread.
+
+QueueFileHandler only puts records on an in-memory queue; a QueueListener
+thread formats them and writes them through CompressingRotatingFileHandler,
+which rotates on size and on time and gzips rotated files. JsonFormatter
+writes one JSON object per line including the request ID and view name that
+RequestContextFilter attaches on the emitting thread.
+"""
+import atexit
+import copy
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from .instrumentation import logging_context
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request's ID, view name and path to each record"""
+
+    def filter(self, record):
+        metrics = logging_context()
+        request = metrics.request if metrics is not None else None
+        match = getattr(request, 'resolver_match', None)
+        record.request_id = metrics.request_id if metrics is not None else '-'
+        record.view = match.view_name if match is not None else '-'
+        record.path = request.path if request is not None else '-'
+        record.method = request.method if request is not None else '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', '-'),
+            'view': getattr(record, 'view', '-'),
+            'method': getattr(record, 'method', '-'),
+            'path': getattr(record, 'path', '-'),
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class CompressingRotatingFileHandler(logging.handlers.BaseRotatingHandler):
+    """
+    Rotate when the file reaches ``max_bytes`` or at the next ``when``
+    boundary ('midnight' or 'hourly'), whichever comes first.
+
+    Rotated files are named ``<file>.<YYYYmmdd-HHMMSS-ffffff>.gz`` and only the
+    newest ``backup_count`` are kept. Worker processes sharing the file
+    notice when another one has rotated it and just reopen it.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=7, when='midnight', compress=True, encoding='utf-8'):
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        super().__init__(filename, 'a', encoding=encoding, delay=False)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.when = when
+        self.compress = compress
+        self.rollover_at = self._next_rollover(time.time())
+
+    def _next_rollover(self, now):
+        current = datetime.fromtimestamp(now)
+        if self.when == 'hourly':
+            boundary = current.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        else:
+            boundary = datetime.combine(current.date() + timedelta(days=1), datetime.min.time())
+        return boundary.timestamp()
+
+    def shouldRollover(self, record):
+        if self.stream is None:
+            self.stream = self._open()
+        if time.time() >= self.rollover_at:
+            return True
+        if self.max_bytes > 0:
+            # fstat sees what every process appended, not just this one
+            return os.fstat(self.stream.fileno()).st_size >= self.max_bytes
+        return False
+
+    def _rotated_by_other_process(self):
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except FileNotFoundError:
+            return True
+
+    def doRollover(self):
+        self.rollover_at = self._next_rollover(time.time())
+        if self.stream is not None:
+            if self._rotated_by_other_process():
+                self.stream.close()
+                self.stream = self._open()
+                return
+            self.stream.close()
+            self.stream = None
+
+        # Microseconds keep names unique and in rotation order when sorted
+        rotated = f"{self.baseFilename}.{datetime.now():%Y%m%d-%H%M%S-%f}"
+
+        try:
+            os.rename(self.baseFilename, rotated)
+        except FileNotFoundError:
+            rotated = None
+        self.stream = self._open()
+
+        if rotated and self.compress:
+            with open(rotated, 'rb') as source, gzip.open(rotated + '.gz', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.remove(rotated)
+        self._delete_old_backups()
+
+    def _delete_old_backups(self):
+        if self.backup_count <= 0:
+            return
+        directory, base = os.path.split(self.baseFilename)
+        backups = sorted(
+            name for name in os.listdir(directory)
+            if name.startswith(base + '.') and name[len(base) + 1:][:1].isdigit()
+        )
+        for name in backups[:-self.backup_count]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
+
+class QueueFileHandler(logging.handlers.QueueHandler):
+    """
+    Hand records to a background listener that writes the log file.
+
+    The emitting thread only merges the message arguments and puts the record
+    on a bounded queue; when the queue is full the record is dropped rather
+    than blocking the request, and the number of dropped records is logged
+    once the queue drains. The listener is restarted after a fork.
+    """
+
+    def __init__(self, filename, max_bytes=0, backup_count=7, when='midnight', compress=True, queue_size=10000):
+        # SimpleQueue puts are lock-free; the size bound is checked by hand
+        super().__init__(queue.SimpleQueue())
+        self.queue_size = queue_size
+        self.target = CompressingRotatingFileHandler(
+            filename, max_bytes=max_bytes, backup_count=backup_count, when=when, compress=compress)
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks must be rendered while the frames still exist
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._listener = logging.handlers.QueueListener(self.queue, self.target)
+            self._listener.start()
+
+    def enqueue(self, record):
+        self._ensure_started()
+        if self.queue.qsize() >= self.queue_size:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+        if self.dropped and self.queue.qsize() == 1:
+            dropped, self.dropped = self.dropped, 0
+            notice = logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f'Log queue was full; dropped {dropped} records',
+                'request_id': '-', 'view': '-', 'method': '-', 'path': '-',
+            })
+            self.queue.put_nowait(notice)
+
+    def stop(self):
+        """Write queued records and stop the listener"""
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+        self.target.close()
+
+    def close(self):
+        self.stop()
+        super().close()
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.activity_archive import archive_month, ensure_partitions, expired_months, purge_month
+
+
+class Command(BaseCommand):
+    help = 'Move activity log months older than the retention window into compressed JSONL archives'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=settings.ACTIVITY_LOG_RETENTION_MONTHS,
+                            help='Number of recent months to keep in the database')
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Create monthly partitions this many months ahead (MySQL only)')
+        parser.add_argument('--dry-run', action='store_true', help='List the months that would be archived')
+
+    def handle(self, *args, **options):
+        months = expired_months(options['keep_months'])
+
+        if options['dry_run']:
+            for year, month in months:
+                self.stdout.write(f'Would archive {year:04d}-{month:02d}')
+            return
+
+        for name in ensure_partitions(options['months_ahead']):
+            self.stdout.write(f'Created partition {name}')
+
+        for year, month in months:
+            count = archive_month(year, month)
+            if count is None:
+                self.stdout.write(f'{year:04d}-{month:02d} already archived, purging')
+            else:
+                self.stdout.write(f'Archived {count} logs from {year:04d}-{month:02d}')
+            purge_month(year, month)
+
+        self.stdout.write(self.style.SUCCESS(f'{len(months)} months archived.'))
@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from core import loadtest
+from core.db_pool import PooledDatabaseWrapperMixin, pool_for
+
+DEFAULT_ENDPOINTS = ['newsletter_signup', 'chatbot_response']
+
+
+class Command(BaseCommand):
+    help = ('Serve the same requests with a connection opened per request and with pooled connections, and '
+            'compare latency and time spent connecting. Requests run in-process on worker threads that close '
+            'their connection after every request, as the web server does with CONN_MAX_AGE = 0.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', action='append', dest='endpoints', metavar='URL_NAME',
+                            help=f"URL name to request (repeatable, default {', '.join(DEFAULT_ENDPOINTS)})")
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=4, help='Worker threads')
+        parser.add_argument('--pool-size', type=int, default=4, help='MAX_SIZE of the pool under test')
+        parser.add_argument('--connect-latency', type=float, default=0.0, metavar='MS',
+                            help='Add this delay to every new connection, to stand in for a remote '
+                                 'server and a TLS handshake')
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if not isinstance(connection, PooledDatabaseWrapperMixin):
+            raise CommandError("The default database must use a core.db_backends ENGINE")
+
+        plans, skipped = loadtest.endpoint_plans(options['endpoints'] or DEFAULT_ENDPOINTS)
+        if not plans:
+            raise CommandError(f"No endpoints to request: {skipped}")
+
+        settings_dict = connection.settings_dict
+        saved_pool = settings_dict.get('POOL')
+        mro = type(connection).__mro__
+        driver = mro[mro.index(PooledDatabaseWrapperMixin) + 1]
+        original_connect = driver.get_new_connection
+        delay = options['connect_latency'] / 1000
+        self.connects = []
+
+        def get_new_connection(wrapper, conn_params):
+            # Opening a connection is what pooling saves: count it and time it
+            started = time.perf_counter()
+            if delay:
+                time.sleep(delay)
+            try:
+                return original_connect(wrapper, conn_params)
+            finally:
+                self.connects.append(time.perf_counter() - started)
+
+        driver.get_new_connection = get_new_connection
+        connection.close()
+        # Lets the test client in and keeps signup emails in memory
+        setup_test_environment()
+        try:
+            self.stdout.write(f"{'endpoint':<22} {'mode':<12} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                              f"{'connects':>9} {'connect ms/req':>15} {'waits':>6}")
+            for plan in plans:
+                for mode, pool in (('per-request', None), ('pooled', {'MAX_SIZE': options['pool_size'],
+                                                                       'TIMEOUT': 30, 'MAX_AGE': 300})):
+                    settings_dict['POOL'] = pool
+                    self.report(plan, mode, settings_dict, options['requests'], options['concurrency'])
+        finally:
+            settings_dict['POOL'] = saved_pool
+            driver.get_new_connection = original_connect
+            teardown_test_environment()
+
+    def report(self, plan, mode, settings_dict, count, concurrency):
+        pool = pool_for(DEFAULT_DB_ALIAS, settings_dict)
+
+        errors = []
+
+        def send(i):
+            path, body, content_type = plan.request(i)
+            client = Client(raise_request_exception=False)
+            started = time.perf_counter()
+            if plan.method == 'POST':
+                response = client.post(path, body, content_type=content_type)
+            else:
+                response = client.get(path)
+            # The test client skips the request_finished cleanup the web server runs
+            close_old_connections()
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 500:
+                errors.append(response.status_code)
+            return elapsed
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # One warm-up request per thread, so the pooled run starts with a full pool
+            list(executor.map(send, range(concurrency)))
+            self.connects.clear()
+            waits_before = pool.stats['waits'] if pool else 0
+            timings = sorted(executor.map(send, range(count)))
+        waits = pool.stats['waits'] - waits_before if pool else 0
+
+        mean = sum(timings) / len(timings) * 1000
+        self.stdout.write(
+            f'{plan.name:<22} {mode:<12} {mean:>8.2f} {loadtest.percentile(timings, 0.5) * 1000:>8.2f} '
+            f'{loadtest.percentile(timings, 0.95) * 1000:>8.2f} {len(self.connects):>9} '
+            f'{sum(self.connects) / count * 1000:>15.3f} {waits:>6}')
+        if errors:
+            self.stdout.write(self.style.WARNING(f'  {len(errors)} requests failed with a server error'))
@@ -0,0 +1,77 @@
+import logging
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from core.log_handlers import JsonFormatter, QueueFileHandler, RequestContextFilter
+
+TEXT_FORMAT = '{asctime} {levelname} {name} [{request_id}] {message}'
+
+
+class Command(BaseCommand):
+    help = ('Measure the time a log call costs the emitting thread with the old synchronous '
+            'FileHandler and with the queued handler, in text and JSON formats.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=20000, help='Records logged per handler')
+        parser.add_argument('--fsync', action='store_true',
+                            help='fsync after every record, to stand in for a slow or busy disk')
+
+    def handle(self, *args, **options):
+        count = options['records']
+
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            setups = [
+                ('FileHandler (text)', lambda: logging.FileHandler(directory / 'sync.log'), 'text'),
+                ('QueueFileHandler (text)', lambda: QueueFileHandler(directory / 'queued.log'), 'text'),
+                ('QueueFileHandler (json)', lambda: QueueFileHandler(directory / 'json.log'), 'json'),
+            ]
+
+            self.stdout.write(f"{'handler':<26} {'emit us':>9} {'p99 us':>9} {'drained ms':>11}")
+            for name, make_handler, fmt in setups:
+                handler = make_handler()
+                if options['fsync']:
+                    self.fsync_writes(handler.target if isinstance(handler, QueueFileHandler) else handler)
+                handler.addFilter(RequestContextFilter())
+                handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT, style='{'))
+                mean, p99, drained = self.measure(handler, count)
+                self.stdout.write(f'{name:<26} {mean:>9.2f} {p99:>9.2f} {drained:>11.1f}')
+
+    def fsync_writes(self, handler):
+        flush = handler.flush
+
+        def flush_and_sync():
+            flush()
+            if handler.stream is not None:
+                os.fsync(handler.stream.fileno())
+        handler.flush = flush_and_sync
+
+    def measure(self, handler, count):
+        """Mean and p99 microseconds per log call, and ms until every record is on disk"""
+        logger = logging.getLogger('benchmark.logging')
+        logger.handlers = [handler]
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+
+        logger.info('warm-up')
+        timings = []
+        started = time.perf_counter()
+        for i in range(count):
+            before = time.perf_counter()
+            logger.info('Rendered %s for user %d in %.1f ms', '/blog/', i, 12.5)
+            timings.append(time.perf_counter() - before)
+
+        # Stopping the listener waits for the queue to drain
+        if isinstance(handler, QueueFileHandler):
+            handler.stop()
+        handler.close()
+        drained = (time.perf_counter() - started) * 1000
+
+        timings.sort()
+        mean = sum(timings) / count * 1e6
+        p99 = timings[int(count * 0.99)] * 1e6
+        return mean, p99, drained
@@ -0,0 +1,59 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory, override_settings
+
+from core import views
+
+PAGES = {
+    'home': views.home,
+    'about': views.about,
+    'solutions': views.solutions,
+    'blog': views.blog,
+    'events': views.events,
+}
+
+
+class Command(BaseCommand):
+    help = ('Measure per-request template CPU time with and without header/footer fragment caching. '
+            'Run with DEBUG=False so templates go through the cached loader as in production.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests rendered per page and mode')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        count = options['requests']
+
+        self.stdout.write(f"{'page':<12} {'uncached ms':>12} {'cached ms':>12} {'saved':>8}")
+        for name, view in PAGES.items():
+            # Bypass the page and conditional caches so every request renders
+            while hasattr(view, '__wrapped__'):
+                view = view.__wrapped__
+
+            results = []
+            for timeout in (0, 3600):
+                with override_settings(FRAGMENT_CACHE_TIMEOUT=timeout):
+                    cache.clear()
+                    results.append(self.measure(factory, view, count))
+
+            uncached, cached = results
+            saved = (uncached - cached) / uncached if uncached else 0
+            self.stdout.write(f'{name:<12} {uncached:>12.3f} {cached:>12.3f} {saved:>8.1%}')
+
+    def measure(self, factory, view, count):
+        """Average CPU milliseconds per request, after one warm-up render"""
+        def render():
+            request = factory.get('/')
+            request.user = AnonymousUser()
+            request.session = {}
+            request._messages = []
+            view(request)
+
+        render()
+        started = time.process_time()
+        for _ in range(count):
+            render()
+        return (time.process_time() - started) * 1000 / count
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.cache_backends import tier_stats
+from core.caching import cache_metrics, reset_cache_metrics
+from core.metrics import collect
+
+
+class Command(BaseCommand):
+    help = ('Show how often cached pages and fragments were hit, recomputed or served stale, and how '
+            'lookups were served by the in-process (L1) and shared (L2) cache tiers')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them')
+
+    def handle(self, *args, **options):
+        metrics = cache_metrics()
+        lookups = metrics['hit'] + metrics['stale'] + metrics['miss'] + metrics['recompute']
+
+        for event, count in metrics.items():
+            self.stdout.write(f'{event:<16} {count}')
+
+        if lookups:
+            self.stdout.write(f"{'stale ratio':<16} {metrics['stale'] / lookups:.2%}")
+            self.stdout.write(f"{'hit ratio':<16} {(metrics['hit'] + metrics['stale']) / lookups:.2%}")
+
+        # Tier counters are per process; collect() sums every live and exited worker
+        self.stdout.write('')
+        self.stdout.write(f"{'tier':<6} {'hits':>10} {'misses':>10} {'hit ratio':>10}")
+        for tier, counts in tier_stats(collect()).items():
+            total = counts['hit'] + counts['miss']
+            ratio = f"{counts['hit'] / total:.2%}" if total else '-'
+            self.stdout.write(f"{tier:<6} {counts['hit']:>10} {counts['miss']:>10} {ratio:>10}")
+
+        if options['reset']:
+            reset_cache_metrics()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
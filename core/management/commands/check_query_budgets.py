@@ -0,0 +1,124 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_databases, setup_test_environment, \
+    teardown_databases, teardown_test_environment
+
+from core import load_data, loadtest
+from core.query_budgets import budget_for, growing_queries, query_profile, repeated_queries
+
+SMALL_VOLUMES = {
+    'users': 5,
+    'solutions': 6,
+    'team': 4,
+    'posts': 20,
+    'articles': 10,
+    'inquiries': 60,
+    'feedback': 20,
+    'newsletter': 20,
+    'events': 10,
+    'gallery': 30,
+    'registrations_per_event': 3,
+    'activity_logs': 200,
+}
+
+# Detail views are checked for this many objects, list views for this many content types
+PATHS_PER_ENDPOINT = 6
+
+# Every lookup misses, so budgets hold for a cold cache
+NO_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class Command(BaseCommand):
+    help = ('Render every GET endpoint of core and admin_dashboard against a throwaway test database at two '
+            'dataset sizes, and fail when a view exceeds its @query_budget or runs more queries on more data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=5, help='Size of the second dataset relative to the first')
+        parser.add_argument('--only', action='append', metavar='URL_NAME', help='Only this URL name (repeatable)')
+        parser.add_argument('--show-sql', action='store_true', help='List the repeated queries of every view')
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        setup_test_environment()
+        old_config = setup_databases(verbosity=max(verbosity - 1, 0), interactive=False)
+        try:
+            failures = self.check_views(options)
+        finally:
+            teardown_databases(old_config, verbosity=max(verbosity - 1, 0))
+            teardown_test_environment()
+
+        if failures:
+            raise CommandError(f"{len(failures)} views failing, over budget or growing with data: "
+                               f"{', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('Every view is within its query budget.'))
+
+    def check_views(self, options):
+        """Names of the views that failed, in the current (test) database; see core.tests"""
+        # Sessions saved synchronously are read back from the database, as on a cold cache
+        with override_settings(CACHES=NO_CACHE, SESSION_WRITE_ASYNC=False):
+            return self._check_views(options)
+
+    def _check_views(self, options):
+        scale = options['scale']
+        load_data.generate(SMALL_VOLUMES)
+        plans, skipped = loadtest.endpoint_plans(options['only'])
+        plans = [plan for plan in plans if plan.method == 'GET']
+
+        # Broken views are reported like the others instead of aborting the run
+        public, admin = Client(raise_request_exception=False), Client(raise_request_exception=False)
+        admin.force_login(loadtest.loadtest_admin())
+
+        small = {plan.name: self.render(plan, admin if plan.admin else public) for plan in plans}
+        load_data.generate({kind: count * scale for kind, count in SMALL_VOLUMES.items()})
+        large = {plan.name: self.render(plan, admin if plan.admin else public) for plan in plans}
+
+        self.stdout.write(f"{'endpoint':<28} {'status':>6} {'small':>6} {f'x{scale}':>6} {'budget':>7}  path")
+        failures = []
+        for plan in plans:
+            for i, ((path, status, budget, small_queries), (_, large_status, _, large_queries)) in enumerate(zip(
+                    small[plan.name], large[plan.name])):
+                small_count, large_count = len(small_queries), len(large_queries)
+                problems = []
+                if max(status, large_status) >= 500:
+                    # A broken view cannot be measured, and must not pass
+                    problems.append('server error')
+                if large_count > small_count:
+                    problems.append('grows with data')
+                if budget is not None and max(small_count, large_count) > budget:
+                    problems.append('over budget')
+
+                line = (f"{plan.name:<28} {status:>6} {small_count:>6} {large_count:>6} "
+                        f"{budget if budget is not None else '-':>7}  {path}  {', '.join(problems)}")
+                if problems:
+                    self.stdout.write(self.style.ERROR(line))
+                elif i and options['verbosity'] < 2:
+                    # Other paths of a view only show up when something is wrong with them
+                    pass
+                else:
+                    self.stdout.write(line)
+
+                small_profile, large_profile = query_profile(small_queries), query_profile(large_queries)
+                if 'grows with data' in problems:
+                    for before, after, sql in growing_queries(small_profile, large_profile):
+                        self.stdout.write(f'    {before} -> {after}x  {sql}')
+                if 'over budget' in problems or (options['show_sql'] and not problems):
+                    for count, sql in repeated_queries(large_profile):
+                        self.stdout.write(f'    {count}x  {sql}')
+                if problems and plan.name not in failures:
+                    failures.append(plan.name)
+
+        for name, reason in skipped.items():
+            self.stdout.write(f'skipped {name}: {reason}')
+        return failures
+
+    def render(self, plan, client):
+        """[(path, status, budget, queries)] for the first few distinct paths of ``plan``"""
+        paths = list(dict.fromkeys(path for path, _, _ in plan.requests))[:PATHS_PER_ENDPOINT]
+        rendered = []
+        for path in paths:
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get(path)
+            match = getattr(response, 'resolver_match', None)
+            rendered.append((path, response.status_code, budget_for(match), captured.captured_queries))
+        return rendered
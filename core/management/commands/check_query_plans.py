@@ -0,0 +1,120 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from core.models import ActivityLog, BlogPost, ContactInquiry, Event, Feedback, Solution
+from core.views import gallery_queryset
+
+
+def _boolean_led(index_name, sqlite_fallback=None):
+    # Django renders boolean filters as a bare "WHERE flag" on SQLite, which
+    # SQLite cannot match against an index (MySQL compares "flag = true").
+    # On SQLite these queries fall back to an index that matches the sort.
+    return {'sqlite': sqlite_fallback, 'default': index_name}
+
+
+def hot_queries():
+    """(description, queryset, expected index) for the hot queries in core and admin_dashboard views.
+
+    The expected index is either a name or a {vendor: name} mapping; a None
+    expectation means the plan is not checked on that vendor.
+    """
+    now = timezone.now()
+    month_ago = now - timedelta(days=30)
+    # Any position works: the plan does not depend on the values
+    cursor = (now.date(), 0, 1)
+
+    return [
+        ('home: featured solutions',
+         Solution.objects.filter(is_featured=True, is_active=True).order_by('order', 'title')[:3],
+         _boolean_led('solution_featured_idx')),
+        ('home: testimonials',
+         Feedback.objects.filter(is_approved=True).order_by('-created_at')[:4],
+         _boolean_led('feedback_approved_idx', 'feedback_created_idx')),
+        ('home: recent blog posts',
+         BlogPost.objects.filter(status='published').order_by('-published_at')[:3],
+         'blogpost_status_pub_idx'),
+        ('blog: category listing',
+         BlogPost.objects.filter(status='published', category='news'),
+         'blogpost_status_cat_idx'),
+        ('events: by status',
+         Event.objects.filter(status='upcoming').order_by('date', 'time'),
+         'event_status_date_idx'),
+        ('events: by type and status',
+         Event.objects.filter(event_type='webinar', status='upcoming').order_by('date', 'time'),
+         'event_type_status_idx'),
+        ('gallery: first page',
+         gallery_queryset()[:13],
+         'galleryitem_date_idx'),
+        ('gallery: category page',
+         gallery_queryset('demo')[:13],
+         'galleryitem_cat_date_idx'),
+        ('gallery: next page',
+         gallery_queryset(cursor=cursor)[:13],
+         'galleryitem_date_idx'),
+        ('gallery: next category page',
+         gallery_queryset('demo', cursor)[:13],
+         'galleryitem_cat_date_idx'),
+        ('dashboard: unread inquiries',
+         ContactInquiry.objects.filter(is_read=False),
+         _boolean_led('inquiry_read_created_idx', 'inquiry_created_idx')),
+        ('dashboard: pending feedback',
+         Feedback.objects.filter(is_approved=False),
+         _boolean_led('feedback_approved_idx', 'feedback_created_idx')),
+        ('dashboard: monthly inquiries',
+         ContactInquiry.objects.filter(created_at__gte=month_ago, created_at__lt=now),
+         'inquiry_created_idx'),
+        ('dashboard: monthly feedback',
+         Feedback.objects.filter(created_at__gte=month_ago, created_at__lt=now),
+         'feedback_created_idx'),
+        ('dashboard: upcoming events',
+         Event.objects.filter(status='upcoming', date__gte=now.date()).order_by('date')[:5],
+         'event_status_date_idx'),
+        ('dashboard: recent activity',
+         ActivityLog.objects.order_by('-timestamp')[:10],
+         'activitylog_ts_idx'),
+        ('content list: inquiries',
+         ContactInquiry.objects.order_by('-created_at')[:20],
+         'inquiry_created_idx'),
+        ('activity logs: by action',
+         ActivityLog.objects.filter(action='delete').order_by('-timestamp')[:50],
+         'activitylog_action_ts_idx'),
+        ('activity logs: by user',
+         ActivityLog.objects.filter(user_id=1).order_by('-timestamp')[:50],
+         'activitylog_user_ts_idx'),
+    ]
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN every hot query and fail if it does not use its intended index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Database alias to explain against')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        vendor = connections[alias].vendor
+        failures = []
+
+        for description, queryset, expected in hot_queries():
+            index_name = expected.get(vendor, expected['default']) if isinstance(expected, dict) else expected
+            if index_name is None:
+                self.stdout.write(f"{self.style.WARNING('skipped'):<8} {description:<30} (not checked on {vendor})")
+                continue
+
+            plan = queryset.using(alias).explain()
+            used = index_name in plan
+            status = self.style.SUCCESS('ok') if used else self.style.ERROR('MISSING')
+            self.stdout.write(f'{status:<8} {description:<30} {index_name}')
+
+            if options['verbose_plans'] or not used:
+                self.stdout.write(f'    {plan}'.replace('\n', '\n    '))
+            if not used:
+                failures.append(description)
+
+        if failures:
+            raise CommandError(f"{len(failures)} hot queries do not use their index on {vendor}: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS(f'All hot queries use their intended index on {vendor}.'))
@@ -0,0 +1,146 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import load_data, loadtest
+
+
+class Command(BaseCommand):
+    help = ('Drive every URL of core and admin_dashboard with concurrent clients and report requests '
+            'per second and p50/p95/p99 latency per endpoint. Starts a local server unless --url is given. '
+            'Requests write to the database (feedback, registrations, etc.), so run it against a load-test copy.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true',
+                            help='Top the dataset up to the volumes below first (see generate_load_data)')
+        parser.add_argument('--posts', type=int, default=load_data.DEFAULT_VOLUMES['posts'])
+        parser.add_argument('--inquiries', type=int, default=load_data.DEFAULT_VOLUMES['inquiries'])
+        parser.add_argument('--activity-logs', type=int, default=load_data.DEFAULT_VOLUMES['activity_logs'])
+        parser.add_argument('--url', help='Base URL of an already running server')
+        parser.add_argument('--port', type=int, default=8765, help='Port of the local server started otherwise')
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--only', action='append', metavar='URL_NAME', help='Only this URL name (repeatable)')
+        parser.add_argument('--output', help='Results file (default logs/loadtest/<timestamp>.json)')
+        parser.add_argument('--compare', metavar='BASELINE', help='Flag regressions against this results file')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Regression threshold as a fraction of the baseline (default 0.2)')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.stdout.write('Seeding dataset...')
+            loadtest.seed_dataset({
+                'posts': options['posts'],
+                'inquiries': options['inquiries'],
+                'activity_logs': options['activity_logs'],
+            }, stdout=self.stdout)
+
+        baseline = None
+        if options['compare']:
+            try:
+                baseline = json.loads(Path(options['compare']).read_text())
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        plans, skipped = loadtest.endpoint_plans(options['only'])
+        if not plans:
+            raise CommandError('No endpoints to test')
+        session_key = loadtest.admin_session_key(loadtest.loadtest_admin())
+
+        server = None
+        base_url = options['url']
+        if base_url is None:
+            base_url = f"http://127.0.0.1:{options['port']}"
+            server = self.start_server(options['port'])
+        try:
+            results = self.run(plans, base_url, session_key, options)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+        results['skipped'] = skipped
+        output = Path(options['output'] or Path(settings.BASE_DIR) / 'logs' / 'loadtest'
+                      / f"{timezone.now():%Y%m%d-%H%M%S}.json")
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2))
+        for name, reason in skipped.items():
+            self.stdout.write(f'skipped {name}: {reason}')
+        self.stdout.write(f'Results written to {output}')
+
+        if baseline is not None:
+            self.report_comparison(results, baseline, options['threshold'])
+
+    def start_server(self, port):
+        with socket.socket() as probe:
+            if probe.connect_ex(('127.0.0.1', port)) == 0:
+                raise CommandError(f'Port {port} is already in use; pass --url to test a running server')
+
+        manage = Path(settings.BASE_DIR) / 'manage.py'
+        server = subprocess.Popen(
+            [sys.executable, str(manage), 'runserver', '--noreload', f'127.0.0.1:{port}'],
+            env=os.environ.copy(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'The local server exited with status {server.returncode}')
+            with socket.socket() as probe:
+                if probe.connect_ex(('127.0.0.1', port)) == 0:
+                    return server
+            time.sleep(0.2)
+        server.terminate()
+        raise CommandError('The local server did not start within 30 seconds')
+
+    def run(self, plans, base_url, session_key, options):
+        self.stdout.write(f"Testing {len(plans)} endpoints at {base_url} "
+                          f"({options['requests']} requests, {options['concurrency']} clients each)")
+        self.stdout.write(f"{'endpoint':<28} {'method':<6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'errors':>7}  statuses")
+        endpoints = {}
+        for plan in plans:
+            result = loadtest.run_endpoint(plan, base_url, session_key, options['requests'],
+                                           options['concurrency'])
+            endpoints[plan.name] = result
+            statuses = ' '.join(f'{status}:{count}' for status, count in sorted(result['statuses'].items()))
+            line = (f"{plan.name:<28} {plan.method:<6} {result['rps']:>8.1f} {result['p50_ms']:>8.1f} "
+                    f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['errors']:>7}  {statuses}")
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+
+        return {
+            'started_at': timezone.now().isoformat(),
+            'base_url': urlsplit(base_url)._replace(path='').geturl(),
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'dataset': loadtest.dataset_counts(),
+            'endpoints': endpoints,
+        }
+
+    def report_comparison(self, results, baseline, threshold):
+        rows = loadtest.compare_results(results, baseline, threshold)
+        self.stdout.write(f"\nCompared with baseline from {baseline.get('started_at', '?')} "
+                          f"(threshold {threshold:.0%})")
+        if baseline.get('dataset') != results['dataset']:
+            self.stdout.write(self.style.WARNING('The dataset differs from the baseline run'))
+
+        regressions = [row for row in rows if row['regressed']]
+        for row in rows:
+            if row['new']:
+                self.stdout.write(f"{row['name']:<28} new endpoint")
+            elif row['regressed']:
+                self.stdout.write(self.style.ERROR(f"{row['name']:<28} REGRESSED {', '.join(row['reasons'])}"))
+            else:
+                self.stdout.write(f"{row['name']:<28} p95 {row['p95_change']:+.0%}  rps {row['rps_change']:+.0%}")
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} endpoint(s) regressed')
+        self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,118 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core import database_migration
+
+
+class Command(BaseCommand):
+    help = ('Copy every table from one database alias to another (by default the legacy SQLite database into '
+            'the default database) in dependency order, checkpointing progress so an interrupted run resumes, '
+            'then compare row counts and checksums of both sides.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default='sqlite_old', help='Database alias to copy from (default sqlite_old)')
+        parser.add_argument('--target', default='default', help='Database alias to copy into (default default)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per read and per insert transaction')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Tables copied in parallel (default 4, always 1 into SQLite)')
+        parser.add_argument('--checkpoint', help='Progress file (default logs/migrate_database/<source>-<target>.json)')
+        parser.add_argument('--truncate', action='store_true',
+                            help='Empty the target tables first, e.g. the content types and permissions migrate created')
+        parser.add_argument('--table', action='append', dest='tables', metavar='APP_LABEL.MODEL',
+                            help='Only this model or table (repeatable)')
+        parser.add_argument('--verify-only', action='store_true', help='Skip the copy and only compare both sides')
+        parser.add_argument('--no-verify', action='store_true', help='Skip the comparison after copying')
+
+    def handle(self, *args, **options):
+        source, target = options['source'], options['target']
+        for alias in (source, target):
+            if alias not in settings.DATABASES:
+                raise CommandError(f"Unknown database alias '{alias}'")
+        if source == target:
+            raise CommandError('--source and --target must be different databases')
+
+        models = database_migration.copied_models({label.lower() for label in options['tables'] or ()})
+        if not models:
+            raise CommandError('No models selected')
+        workers = 1 if connections[target].vendor == 'sqlite' else max(options['workers'], 1)
+
+        checkpoint_path = Path(options['checkpoint'] or Path(settings.BASE_DIR) / 'logs' / 'migrate_database' /
+                               f'{source}-{target}.json')
+        try:
+            checkpoint = database_migration.Checkpoint(checkpoint_path, source, target)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if not options['verify_only']:
+            self.copy(models, source, target, checkpoint, options, workers)
+        if options['no_verify']:
+            return
+        self.verify(models, source, target, options['chunk_size'], workers)
+
+    def copy(self, models, source, target, checkpoint, options, workers):
+        if options['truncate']:
+            for model in reversed(database_migration.dependency_order(models)):
+                model._base_manager.using(target).all()._raw_delete(target)
+                checkpoint.update(model._meta.db_table, started=False, done=False, copied=0)
+        else:
+            # Rows the checkpoint does not account for would collide with the copied ones
+            occupied = [
+                model._meta.db_table for model in models
+                if not checkpoint.get(model._meta.db_table).get('started')
+                and model._base_manager.using(target).exists()
+            ]
+            if occupied:
+                raise CommandError(f"Target tables already hold rows: {', '.join(occupied)}. "
+                                   f"Pass --truncate to replace them.")
+
+        done = [model for model in models if checkpoint.is_done(model._meta.db_table)]
+        if done:
+            self.stdout.write(f'Resuming from {checkpoint.path}: {len(done)} of {len(models)} tables already copied')
+
+        def progress(table, copied, elapsed):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f'  {table}: {copied:,} rows ({copied / elapsed if elapsed else 0:,.0f} rows/s)')
+
+        def on_done(model, copied):
+            self.stdout.write(f'{model._meta.db_table:<40} {copied:>12,} rows')
+
+        started = time.perf_counter()
+        try:
+            copied = database_migration.copy_all(
+                models, source, target, checkpoint, options['chunk_size'], workers, progress, on_done)
+        except KeyboardInterrupt:
+            raise CommandError(f'Interrupted; run the same command again to resume from {checkpoint.path}')
+        elapsed = time.perf_counter() - started
+        total = sum(copied.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Copied {total:,} rows from {len(copied)} tables in {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:,.0f} rows/s)'))
+
+    def verify(self, models, source, target, chunk_size, workers):
+        self.stdout.write(f"{'table':<40} {source:>12} {target:>12}  checksum")
+        mismatched = []
+
+        def on_done(model, result):
+            line = (f"{result['table']:<40} {result['source_rows']:>12,} {result['target_rows']:>12,}  "
+                    f"{'ok' if result['ok'] else 'MISMATCH'}")
+            if result['ok']:
+                self.stdout.write(line)
+            else:
+                mismatched.append(result['table'])
+                self.stdout.write(self.style.ERROR(line))
+
+        # Checksums only read, so every table can run at once whatever the dependencies
+        database_migration.run_in_dependency_order(
+            models,
+            lambda model, stop: database_migration.verify_table(model, source, target, chunk_size, stop),
+            max(workers, 4),
+            on_done,
+            ordered=False,
+        )
+        if mismatched:
+            raise CommandError(f"{len(mismatched)} tables differ: {', '.join(sorted(mismatched))}")
+        self.stdout.write(self.style.SUCCESS(f'All {len(models)} tables match.'))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.cached_sessions import flush_session_writes, purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = ('Delete expired sessions in small batches, so the session table is never locked for long. '
+            'Run it from cron; Django\'s clearsessions does the same through the session engine.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SESSION_PURGE_BATCH_SIZE,
+                            help='Rows deleted per statement')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches, to leave room for other writers')
+
+    def handle(self, *args, **options):
+        # Expiry extensions queued in this process must land before rows are judged expired
+        flush_session_writes()
+        deleted = purge_expired_sessions(
+            options['batch_size'], options['pause'], stdout=self.stdout if options['verbosity'] >= 2 else None)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted:,} expired sessions.'))
@@ -0,0 +1,59 @@
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.activity_archive import archived_months, index_archive, search_archives
+
+
+def _parse_day(value):
+    try:
+        return timezone.make_aware(datetime.strptime(value, '%Y-%m-%d'))
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+class Command(BaseCommand):
+    help = 'Search archived activity logs through their block indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='', help='Username (substring match)')
+        parser.add_argument('--action', default='', help='Exact action, e.g. delete')
+        parser.add_argument('--content-type', default='', help='Exact content type, e.g. blog')
+        parser.add_argument('--object', default='', help='Object representation (substring match)')
+        parser.add_argument('--since', help='First day to include (YYYY-MM-DD)')
+        parser.add_argument('--until', help='Last day to include (YYYY-MM-DD)')
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--reindex', action='store_true',
+                            help='Index archives written before indexing existed, then exit')
+
+    def handle(self, *args, **options):
+        if options['reindex']:
+            for year, month in archived_months():
+                if index_archive(year, month):
+                    self.stdout.write(f'Indexed {year:04d}-{month:02d}')
+            return
+
+        start = _parse_day(options['since']) if options['since'] else None
+        end = _parse_day(options['until']) + timedelta(days=1) if options['until'] else None
+
+        started = time.perf_counter()
+        records = search_archives(
+            username=options['user'],
+            action=options['action'],
+            start=start,
+            end=end,
+            content_type=options['content_type'],
+            object_query=options['object'],
+            limit=options['limit'],
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+
+        for record in records:
+            self.stdout.write(
+                f"{record['timestamp']:%Y-%m-%d %H:%M:%S}  {record['username'] or '-':<15} "
+                f"{record['action']:<8} {record['content_type']:<12} "
+                f"#{record['object_id']} {record['object_repr']}"
+            )
+        self.stdout.write(self.style.SUCCESS(f'{len(records)} records in {elapsed:.1f} ms'))
@@ -0,0 +1,371 @@
+"""
+Application metrics in the Prometheus text exposition format.
+
+Counters and histograms are updated without locks: every thread increments
+its own shard, and shards are only merged when a snapshot is taken. Each
+process periodically writes its snapshot to ``METRICS_MULTIPROC_DIR`` (one
+file per process); the /metrics view merges every file, so a scrape of any
+worker reports the totals of all of them. Clear the directory when the
+server starts. Gauges are computed from callbacks when a snapshot is taken
+and only counted for processes that are still alive.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_registry = {}
+
+
+class _ThreadShards:
+    """
+    Per-thread dicts of metric values, merged on read.
+
+    Servers replace their worker threads, so the shards of threads that
+    have exited are folded into one retired shard instead of being kept.
+    """
+
+    def __init__(self):
+        self._reset()
+        os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # A forked worker must not report the values its parent collected
+        self._local = threading.local()
+        self._shards = []
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                self._prune()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+
+    def shards(self):
+        with self._lock:
+            self._prune()
+            return [self._retired.copy()] + [shard.copy() for _, shard in self._shards]
+
+    def _prune(self):
+        # A dead thread no longer writes its shard, so it can be read without copying
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _add_values(self._retired, shard)
+        self._shards = live
+
+
+def _add_values(total, values):
+    for key, value in values.items():
+        current = total.get(key)
+        if current is None:
+            total[key] = value[:] if isinstance(value, list) else value
+        elif isinstance(value, list):
+            total[key] = [a + b for a, b in zip(current, value)]
+        else:
+            total[key] = current + value
+
+
+_values = _ThreadShards()
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        _registry[name] = self
+
+    def _key(self, labels):
+        return self.name, tuple(str(labels[name]) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = _values.get()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = _values.get()
+        key = self._key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the sum
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+
+class Gauge(_Metric):
+    """
+    A value computed when a snapshot is taken.
+
+    ``collect`` returns a number, or a dict mapping label value tuples to
+    numbers for labelled gauges.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, collect, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def values(self):
+        value = self.collect()
+        if isinstance(value, dict):
+            return {tuple(str(v) for v in labels): amount for labels, amount in value.items()}
+        return {(): value}
+
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name', ['view'])
+REQUESTS = Counter(
+    'http_requests_total', 'Requests by URL name and status code', ['view', 'status'])
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'Database queries per request by URL name', ['view'],
+    buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = Counter(
+    'db_query_duration_seconds_total', 'Time spent in database queries by URL name', ['view'])
+CACHE_LOOKUPS = Counter(
+    'cache_events_total', 'Page and fragment cache lookups by outcome', ['event'])
+CHATBOT_MESSAGES = Counter(
+    'chatbot_messages_total', 'Chatbot messages by whether a canned answer matched', ['matched'])
+INQUIRIES = Counter('inquiries_total', 'Contact inquiries received')
+EVENT_REGISTRATIONS = Counter('event_registrations_total', 'Event registrations')
+NEWSLETTER_SUBSCRIPTIONS = Counter('newsletter_subscriptions_total', 'Newsletter subscriptions')
+FEEDBACK_SUBMISSIONS = Counter('feedback_submissions_total', 'Feedback submissions')
+
+
+def observe_request(view, status, duration, queries, db_time):
+    """Record one served request (called by RequestTimingMiddleware)"""
+    REQUEST_LATENCY.observe(duration, view=view)
+    REQUESTS.inc(view=view, status=status)
+    DB_QUERIES.observe(queries, view=view)
+    DB_TIME.inc(db_time, view=view)
+    _flusher.ensure_started()
+
+
+# Snapshots and aggregation
+
+def _encode(labels):
+    return json.dumps(labels)
+
+
+def snapshot():
+    """This process's metric values: {name: {labels_json: value}}"""
+    merged = {}
+    for shard in _values.shards():
+        for (name, labels), value in shard.items():
+            series = merged.setdefault(name, {})
+            label_key = _encode(labels)
+            if isinstance(value, list):
+                current = series.get(label_key)
+                series[label_key] = value[:] if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                series[label_key] = series.get(label_key, 0) + value
+
+    for metric in list(_registry.values()):
+        if metric.kind != 'gauge':
+            continue
+        try:
+            values = metric.values()
+        except Exception:
+            logger.exception("Failed to collect gauge %s", metric.name)
+            continue
+        merged[metric.name] = {_encode(labels): value for labels, value in values.items()}
+    return merged
+
+
+def _multiproc_dir():
+    path = settings.METRICS_MULTIPROC_DIR
+    return Path(path) if path else None
+
+
+class _SnapshotWriter:
+    """Write this process's snapshot to the shared directory every few seconds"""
+
+    def __init__(self):
+        self._thread = None
+        self._pid = None
+        self._started_at = None
+        self._lock = threading.Lock()
+
+    def path(self):
+        return _multiproc_dir() / f'{self._pid}-{self._started_at}.json'
+
+    def ensure_started(self):
+        if self._pid == os.getpid() or _multiproc_dir() is None:
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._started_at = int(time.time() * 1000)
+            self._thread = threading.Thread(target=self._run, name='metrics-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            self.write()
+
+    def write(self):
+        if self._pid != os.getpid():
+            return
+        directory = _multiproc_dir()
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            path = self.path()
+            tmp_path = path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps({'pid': self._pid, 'metrics': snapshot()}))
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Failed to write metrics snapshot")
+
+
+_flusher = _SnapshotWriter()
+
+atexit.register(_flusher.write)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(total, metrics, include_gauges):
+    for name, series in metrics.items():
+        metric = _registry.get(name)
+        if metric is None or (metric.kind == 'gauge' and not include_gauges):
+            continue
+        target = total.setdefault(name, {})
+        for label_key, value in series.items():
+            current = target.get(label_key)
+            if current is None:
+                target[label_key] = value
+            elif isinstance(value, list):
+                target[label_key] = [a + b for a, b in zip(current, value)]
+            else:
+                target[label_key] = current + value
+
+
+def collect():
+    """Metric values summed over every worker process"""
+    directory = _multiproc_dir()
+    if directory is None or not directory.exists():
+        return snapshot()
+
+    _flusher.ensure_started()
+    _flusher.write()
+
+    total = {}
+    for path in directory.glob('*.json'):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        _merge(total, data['metrics'], include_gauges=_pid_alive(data['pid']))
+    return total
+
+
+# Text exposition
+
+def _escape(value):
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _ratio(series, numerator, denominator):
+    """Share of the label values in ``denominator`` that are in ``numerator``"""
+    counts = {json.loads(key)[0]: value for key, value in series.items()}
+    total = sum(counts.get(label, 0) for label in denominator)
+    if not total:
+        return None
+    return sum(counts.get(label, 0) for label in numerator) / total
+
+
+def render(values=None):
+    """Format metric values (default: collect()) in the Prometheus text format"""
+    values = collect() if values is None else values
+    lines = []
+
+    for name, metric in sorted(_registry.items()):
+        series = values.get(name, {})
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for label_key, value in sorted(series.items()):
+            label_values = json.loads(label_key)
+            if metric.kind == 'histogram':
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[:-1]):
+                    cumulative += count
+                    le = _labels(metric.labelnames, label_values, [('le', _number(bound))])
+                    lines.append(f'{name}_bucket{le} {cumulative}')
+                labels = _labels(metric.labelnames, label_values)
+                lines.append(f'{name}_sum{labels} {_number(value[-1])}')
+                lines.append(f'{name}_count{labels} {cumulative}')
+            else:
+                lines.append(f'{name}{_labels(metric.labelnames, label_values)} {_number(value)}')
+
+    # Ratios derived from the aggregated counters, for dashboards without PromQL
+    for name, documentation, source, numerator, denominator in (
+        ('cache_hit_ratio', 'Share of cache lookups served from the cache',
+         CACHE_LOOKUPS.name, ('hit', 'stale'), ('hit', 'stale', 'miss', 'recompute')),
+        ('chatbot_match_ratio', 'Share of chatbot messages that matched a canned answer',
+         CHATBOT_MESSAGES.name, ('true',), ('true', 'false')),
+    ):
+        ratio = _ratio(values.get(source, {}), numerator, denominator)
+        if ratio is not None:
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {_number(ratio)}')
+
+    return '\n'.join(lines) + '\n'
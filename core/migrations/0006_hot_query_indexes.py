@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_teammember_photo'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contactinquiry',
+            name='country',
+            field=models.CharField(blank=True, choices=[('US', 'United States'), ('CA', 'Canada'), ('UK', 'United Kingdom'), ('DE', 'Germany'), ('FR', 'France'), ('AU', 'Australia'), ('JP', 'Japan'), ('KR', 'South Korea'), ('SG', 'Singapore'), ('IN', 'India'), ('BR', 'Brazil'), ('MX', 'Mexico'), ('NP', 'Nepal'), ('OTHER', 'Other')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['timestamp'], name='activitylog_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['action', 'timestamp'], name='activitylog_action_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['user', 'timestamp'], name='activitylog_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['status', 'published_at'], name='blogpost_status_pub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='blogpost',
+            index=models.Index(fields=['status', 'category', 'published_at'], name='blogpost_status_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactinquiry',
+            index=models.Index(fields=['created_at'], name='inquiry_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contactinquiry',
+            index=models.Index(fields=['is_read', 'created_at'], name='inquiry_read_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['status', 'date', 'time'], name='event_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['event_type', 'status', 'date', 'time'], name='event_type_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['created_at'], name='feedback_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['is_approved', 'created_at'], name='feedback_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='galleryitem',
+            index=models.Index(fields=['-event_date', 'order'], name='galleryitem_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='galleryitem',
+            index=models.Index(fields=['category', '-event_date', 'order'], name='galleryitem_cat_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='solution',
+            index=models.Index(fields=['is_featured', 'is_active', 'order'], name='solution_featured_idx'),
+        ),
+    ]
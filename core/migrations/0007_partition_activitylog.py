@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:52
+
+import django.db.models.deletion
+from datetime import datetime
+from django.conf import settings
+from django.db import migrations, models
+
+TABLE = 'core_activitylog'
+MONTHS_AHEAD = 3
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def partition_activity_log(apps, schema_editor):
+    """Partition the activity log by month on MySQL (other backends keep one table)"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(timestamp), UTC_TIMESTAMP() FROM {TABLE}")
+        oldest, now = cursor.fetchone()
+    oldest = oldest or now
+
+    year, month = oldest.year, oldest.month
+    last = (now.year, now.month)
+    for _ in range(MONTHS_AHEAD):
+        last = _next_month(*last)
+
+    partitions = []
+    while (year, month) <= last:
+        end = datetime(*_next_month(year, month), 1)
+        partitions.append(f"PARTITION p{year:04d}{month:02d} VALUES LESS THAN ('{end:%Y-%m-%d}')")
+        year, month = _next_month(year, month)
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+
+    # Every unique key of a partitioned table must contain the partition column
+    schema_editor.execute(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id, timestamp)")
+    schema_editor.execute(f"ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(timestamp) ({', '.join(partitions)})")
+
+
+def unpartition_activity_log(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(f"ALTER TABLE {TABLE} REMOVE PARTITIONING")
+    schema_editor.execute(f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (id)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activitylog',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(partition_activity_log, unpartition_activity_log),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 12:57
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_facets(apps, schema_editor):
+    ActivityLog = apps.get_model('core', 'ActivityLog')
+    ActivityLogFacet = apps.get_model('core', 'ActivityLogFacet')
+    db_alias = schema_editor.connection.alias
+    now = timezone.now()
+
+    rows = [
+        ActivityLogFacet(kind='action', value=action, label=action, last_seen=now)
+        for action in ActivityLog.objects.using(db_alias).order_by().values_list('action', flat=True).distinct()
+    ]
+    rows += [
+        ActivityLogFacet(kind='user', value=str(user_id), label=username, last_seen=now)
+        for user_id, username in ActivityLog.objects.using(db_alias).order_by().values_list('user_id', 'user__username').distinct()
+    ]
+    ActivityLogFacet.objects.using(db_alias).bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_partition_activitylog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityLogFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('action', 'Action'), ('user', 'User')], max_length=10)),
+                ('value', models.CharField(max_length=150)),
+                ('label', models.CharField(max_length=150)),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['kind', 'label'],
+                'unique_together': {('kind', 'value')},
+            },
+        ),
+        migrations.RunPython(seed_facets, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,8 @@ from tinymce.models import HTMLField
 from django.apps import apps  # Importing apps to avoid circular imports
 from tinymce.models import HTMLField  # If you're using TinyMCE for rich text
 from django.contrib.auth import get_user_model
+
+from .caching import get_content_versions, get_or_recompute
 # Custom User model
 class CustomUser(AbstractUser):
     ROLE_CHOICES = [
@@ -62,7 +64,13 @@ class SiteSettings(models.Model):
     # Load method to retrieve the SiteSettings instance
     @classmethod
     def load(cls):
-        return cls.objects.first()  # Assumes only one instance of SiteSettings should exist
+        # Assumes only one instance of SiteSettings should exist. Cached until
+        # a save or delete bumps the SiteSettings content version.
+        timeout = settings.FRAGMENT_CACHE_TIMEOUT
+        if not timeout:
+            return cls.objects.first()
+        return get_or_recompute('site-settings', cls.objects.first, timeout,
+                                version=get_content_versions([cls]))
 
 # Activity Log model
 class ActivityLog(models.Model):
@@ -73,7 +81,9 @@ class ActivityLog(models.Model):
         ('view', 'Viewed'),
     ]
     
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    # No database constraint: MySQL partitioned tables cannot have foreign keys.
+    # Deleting a user still cascades to its logs through the ORM.
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_constraint=False)
     action = models.CharField(max_length=10, choices=ACTION_CHOICES)
     content_type = models.CharField(max_length=50)
     object_id = models.PositiveIntegerField()
@@ -83,10 +93,34 @@ class ActivityLog(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='activitylog_ts_idx'),
+            models.Index(fields=['action', 'timestamp'], name='activitylog_action_ts_idx'),
+            models.Index(fields=['user', 'timestamp'], name='activitylog_user_ts_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} {self.action} {self.content_type} at {self.timestamp}"
 
+class ActivityLogFacet(models.Model):
+    """Distinct filter values of the activity log, maintained as logs are written"""
+    KIND_CHOICES = [
+        ('action', 'Action'),
+        ('user', 'User'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    value = models.CharField(max_length=150)
+    label = models.CharField(max_length=150)
+    last_seen = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['kind', 'value']
+        ordering = ['kind', 'label']
+    
+    def __str__(self):
+        return f"{self.kind}: {self.label}"
+
 # About Us model
 class AboutUs(models.Model):
     title = models.CharField(max_length=200, default="About AI-Solution")
@@ -137,6 +171,9 @@ class Solution(models.Model):
     
     class Meta:
         ordering = ['order', 'title']
+        indexes = [
+            models.Index(fields=['is_featured', 'is_active', 'order'], name='solution_featured_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} ({self.get_category_display()})"
@@ -193,6 +230,10 @@ class ContactInquiry(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='inquiry_created_idx'),
+            models.Index(fields=['is_read', 'created_at'], name='inquiry_read_created_idx'),
+        ]
     
     def __str__(self):
         return f"Inquiry from {self.name} - {self.company}"
@@ -213,6 +254,10 @@ class Feedback(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='feedback_created_idx'),
+            models.Index(fields=['is_approved', 'created_at'], name='feedback_approved_idx'),
+        ]
     
     def __str__(self):
         return f"Feedback from {self.name} - {self.rating} stars"
@@ -253,6 +298,10 @@ class BlogPost(models.Model):
     
     class Meta:
         ordering = ['-published_at', '-created_at']
+        indexes = [
+            models.Index(fields=['status', 'published_at'], name='blogpost_status_pub_idx'),
+            models.Index(fields=['status', 'category', 'published_at'], name='blogpost_status_cat_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -289,6 +338,8 @@ class Event(models.Model):
     time = models.TimeField()
     location = models.CharField(max_length=200)
     capacity = models.PositiveIntegerField()
+    # Maintained by core.registrations with conditional UPDATEs, never by save()
+    registered_count = models.PositiveIntegerField(default=0, editable=False)
     price = models.CharField(max_length=50, default='Free')
     featured_image = models.ImageField(upload_to='events/', blank=True, null=True)
     speakers = models.JSONField(default=list)
@@ -302,10 +353,21 @@ class Event(models.Model):
     
     class Meta:
         ordering = ['date', 'time']
+        indexes = [
+            models.Index(fields=['status', 'date', 'time'], name='event_status_date_idx'),
+            models.Index(fields=['event_type', 'status', 'date', 'time'], name='event_type_status_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.date}"
 
+    def save(self, *args, **kwargs):
+        # A copy loaded before registrations came in must not write back its stale count
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name != 'registered_count']
+        super().save(*args, **kwargs)
+
 # GalleryItem model
 class GalleryItem(models.Model):
     CATEGORY_CHOICES = [
@@ -335,6 +397,10 @@ class GalleryItem(models.Model):
     
     class Meta:
         ordering = ['-event_date', 'order']
+        indexes = [
+            models.Index(fields=['-event_date', 'order'], name='galleryitem_date_idx'),
+            models.Index(fields=['category', '-event_date', 'order'], name='galleryitem_cat_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.event_date}"
@@ -0,0 +1,223 @@
+"""
+On-demand profiling of single requests.
+
+An admin runs one request under a profiler by adding a signed
+``?_profile=<token>`` parameter (see profile_url()) or by switching on the
+profiling flag in their session. ``_profile_mode=cprofile`` selects the
+deterministic profiler; the default samples the request thread's stack
+every ``PROFILE_SAMPLE_INTERVAL_MS``. Profiles go into a bounded store in
+the shared cache and are listed in admin_dashboard.
+
+Requests that are not profiled only pay for a dictionary lookup.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.utils import timezone
+
+PROFILE_PARAM = '_profile'
+PROFILE_MODE_PARAM = '_profile_mode'
+PROFILE_SESSION_KEY = '_profile_requests'
+PROFILE_KEY_PREFIX = 'profile:'
+PROFILE_INDEX_KEY = 'profile-index'
+PROFILE_TTL = 24 * 60 * 60
+TOKEN_SALT = 'core.profiling'
+
+# Flame graph boxes narrower than this share of the total are dropped
+MIN_FLAME_WIDTH = 0.002
+
+
+def make_profile_token(user):
+    return signing.dumps({'user': user.pk}, salt=TOKEN_SALT)
+
+
+def profile_url(user, path):
+    """``path`` with a signed parameter that profiles it for ``user``"""
+    separator = '&' if '?' in path else '?'
+    return f'{path}{separator}{PROFILE_PARAM}={make_profile_token(user)}'
+
+
+def _is_admin(request):
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated and user.has_admin_access()
+
+
+def _token_valid(request, token):
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return data.get('user') == request.user.pk
+
+
+def should_profile(request):
+    token = request.GET.get(PROFILE_PARAM)
+    if token is not None:
+        return _is_admin(request) and _token_valid(request, token)
+
+    # The session is only looked at when the visitor has one
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.session.get(PROFILE_SESSION_KEY):
+        return _is_admin(request)
+    return False
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    base_dir = str(settings.BASE_DIR)
+    if filename.startswith(base_dir):
+        filename = filename[len(base_dir) + 1:]
+    elif 'site-packages' in filename:
+        filename = filename.split('site-packages' + os.sep, 1)[1]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+class SamplingProfiler:
+    """Sample one thread's stack from a helper thread, counting collapsed stacks"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+def flame_boxes(stacks):
+    """Lay collapsed stacks out as icicle boxes: (depth, left, width, label, samples)"""
+    root = {'children': {}, 'value': 0}
+    for stack, count in stacks.items():
+        node = root
+        node['value'] += count
+        for frame in stack.split(';'):
+            node = node['children'].setdefault(frame, {'children': {}, 'value': 0})
+            node['value'] += count
+
+    total = root['value']
+    boxes = []
+    if not total:
+        return boxes, 0
+
+    def walk(node, depth, left):
+        for label, child in sorted(node['children'].items()):
+            width = child['value'] / total
+            if width >= MIN_FLAME_WIDTH:
+                boxes.append({
+                    'depth': depth,
+                    'left': left * 100,
+                    'width': width * 100,
+                    'label': label,
+                    'samples': child['value'],
+                })
+                walk(child, depth + 1, left)
+            left += width
+
+    walk(root, 0, 0.0)
+    return boxes, max((box['depth'] for box in boxes), default=0) + 1
+
+
+def _store(profile):
+    index = cache.get(PROFILE_INDEX_KEY, [])
+    index.insert(0, profile['id'])
+    for expired in index[settings.PROFILE_STORE_SIZE:]:
+        cache.delete(PROFILE_KEY_PREFIX + expired)
+    cache.set(PROFILE_INDEX_KEY, index[:settings.PROFILE_STORE_SIZE], PROFILE_TTL)
+    cache.set(PROFILE_KEY_PREFIX + profile['id'], profile, PROFILE_TTL)
+
+
+def stored_profiles():
+    """Summaries of stored profiles, newest first"""
+    index = cache.get(PROFILE_INDEX_KEY, [])
+    profiles = cache.get_many([PROFILE_KEY_PREFIX + profile_id for profile_id in index])
+    summaries = []
+    for profile_id in index:
+        profile = profiles.get(PROFILE_KEY_PREFIX + profile_id)
+        if profile is not None:
+            summaries.append({k: v for k, v in profile.items() if k not in ('stacks', 'stats')})
+    return summaries
+
+
+def get_profile(profile_id):
+    return cache.get(PROFILE_KEY_PREFIX + profile_id)
+
+
+def _run_profiled(request, get_response, mode):
+    started = time.perf_counter()
+    stacks = {}
+    stats = ''
+
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        response = profiler.runcall(get_response, request)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(40)
+        stats = stream.getvalue()
+    else:
+        profiler = SamplingProfiler(settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
+        profiler.start()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.stop()
+        stacks = dict(profiler.stacks)
+
+    match = getattr(request, 'resolver_match', None)
+    profile = {
+        'id': uuid.uuid4().hex[:12],
+        'mode': mode,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': match.view_name if match else None,
+        'user': request.user.username,
+        'status': response.status_code,
+        'duration_ms': (time.perf_counter() - started) * 1000,
+        'samples': sum(stacks.values()),
+        'created_at': timezone.now(),
+        'stacks': stacks,
+        'stats': stats,
+    }
+    _store(profile)
+    response['X-Profile-Id'] = profile['id']
+    return response
+
+
+class ProfilingMiddleware:
+    """Run admin-requested requests under a profiler (after AuthenticationMiddleware)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if PROFILE_PARAM not in request.GET and settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return self.get_response(request)
+        if not should_profile(request):
+            return self.get_response(request)
+
+        mode = 'cprofile' if request.GET.get(PROFILE_MODE_PARAM) == 'cprofile' else 'sample'
+        return _run_profiled(request, self.get_response, mode)
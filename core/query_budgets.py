@@ -0,0 +1,56 @@
+"""
+Per-view database query budgets.
+
+A view declares the most queries one request may run with @query_budget.
+The budget covers the whole request as RequestTimingMiddleware counts it
+(session and auth queries included) with every cache cold. The
+``check_query_budgets`` command renders each view at two dataset sizes and
+fails when a view exceeds its budget or its query count grows with the
+data; in production RequestTimingMiddleware logs requests over budget.
+"""
+from collections import Counter
+
+from .slow_queries import fingerprint
+
+
+def query_budget(max_queries):
+    """Declare the most queries a request to the decorated view may run"""
+    def decorator(view_func):
+        # Attributes survive functools.wraps, so the order of decorators does not matter
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+def budget_for(resolver_match):
+    """The budget of the view ``resolver_match`` resolved to, or None"""
+    if resolver_match is None:
+        return None
+    return getattr(resolver_match.func, 'query_budget', None)
+
+
+def query_profile(queries):
+    """{fingerprint: (count, normalised SQL, example SQL)} of captured queries"""
+    counts = Counter()
+    examples = {}
+    for query in queries:
+        key, normalized = fingerprint(query['sql'])
+        counts[key] += 1
+        examples.setdefault(key, (normalized, query['sql']))
+    return {key: (count, *examples[key]) for key, count in counts.items()}
+
+
+def growing_queries(small, large):
+    """Queries run more often at the larger size: [(small count, large count, example SQL)]"""
+    rows = []
+    for key, (count, _, sql) in large.items():
+        before = small.get(key, (0,))[0]
+        if count > before:
+            rows.append((before, count, sql))
+    return sorted(rows, key=lambda row: row[1] - row[0], reverse=True)
+
+
+def repeated_queries(profile, limit=10):
+    """The most repeated queries of a request: [(count, example SQL)]"""
+    rows = [(count, sql) for count, _, sql in profile.values()]
+    return sorted(rows, key=lambda row: row[0], reverse=True)[:limit]
@@ -0,0 +1,102 @@
+"""
+Event registration with capacity enforcement.
+
+Event.registered_count is kept next to Event.capacity so a seat can be
+taken with one conditional statement:
+
+    UPDATE core_event SET registered_count = registered_count + 1
+    WHERE id = %s AND registered_count < capacity
+
+The UPDATE and the registration row are written in one transaction, so
+concurrent registrations queue on the event row and the last seat goes to
+exactly one of them. The (event, email) unique constraint makes a repeated
+submit fail its insert, which rolls the seat back, so double-clicks
+register once and are reported as duplicates.
+
+Registrations saved or deleted any other way (admin, cascades) adjust the
+count through signals; bulk inserts skip signals and call
+recount_registrations() afterwards. Queryset updates send no post_save,
+so every count change bumps the Event content version itself once it is
+committed, which refreshes the cached events page and its ETag.
+"""
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .caching import bump_content_version
+from .metrics import Counter
+from .models import Event, EventRegistration
+
+REGISTERED = 'registered'
+DUPLICATE = 'duplicate'
+FULL = 'full'
+
+ATTEMPTS = Counter('event_registration_attempts_total', 'Event registration attempts by outcome', ['outcome'])
+
+
+def register(event, email, **fields):
+    """
+    Register ``email`` for ``event``; returns REGISTERED, DUPLICATE or FULL.
+
+    ``fields`` are the other EventRegistration fields (name, phone, ...).
+    """
+    outcome = _register(event, email, fields)
+    ATTEMPTS.inc(outcome=outcome)
+    return outcome
+
+
+def _register(event, email, fields):
+    registrations = EventRegistration.objects.filter(event=event, email=email)
+    # Repeated submits are common: answer them without taking the event row lock
+    if registrations.exists():
+        return DUPLICATE
+
+    using = router.db_for_write(EventRegistration)
+    try:
+        with transaction.atomic(using=using):
+            taken = (Event.objects.using(using)
+                     .filter(pk=event.pk, registered_count__lt=F('capacity'))
+                     .update(registered_count=F('registered_count') + 1))
+            if not taken:
+                return FULL
+            registration = EventRegistration(event=event, email=email, **fields)
+            # The seat is already counted; see count_registration
+            registration._seat_taken = True
+            registration.save(using=using, force_insert=True)
+            _count_changed(using)
+    except IntegrityError:
+        # A concurrent submit of the same email won; its seat stands and this one was rolled back
+        if registrations.exists():
+            return DUPLICATE
+        raise
+    return REGISTERED
+
+
+def count_registration(sender, instance, created, **kwargs):
+    """Count registrations created without register(), e.g. in the admin"""
+    if created and not getattr(instance, '_seat_taken', False):
+        Event.objects.filter(pk=instance.event_id).update(registered_count=F('registered_count') + 1)
+        _count_changed(router.db_for_write(Event))
+
+
+def uncount_registration(sender, instance, **kwargs):
+    if Event.objects.filter(pk=instance.event_id, registered_count__gt=0).update(
+            registered_count=F('registered_count') - 1):
+        _count_changed(router.db_for_write(Event))
+
+
+def recount_registrations(event_ids=None, using=None):
+    """Set registered_count from the registration rows (all events, or ``event_ids``)"""
+    events = Event.objects.using(using) if using else Event.objects.all()
+    if event_ids is not None:
+        events = events.filter(pk__in=event_ids)
+    counts = (EventRegistration.objects.filter(event=OuterRef('pk')).order_by()
+              .values('event').annotate(total=Count('pk')).values('total'))
+    updated = events.update(registered_count=Coalesce(Subquery(counts), Value(0)))
+    _count_changed(using or router.db_for_write(Event))
+    return updated
+
+
+def _count_changed(using):
+    # Not before commit: a page rendered in between would cache the old count under the new version
+    transaction.on_commit(lambda: bump_content_version(Event), using=using)
@@ -0,0 +1,263 @@
+"""
+Read replicas for anonymous public traffic.
+
+DATABASE_REPLICAS maps replica database aliases to weights. For GET and
+HEAD requests from anonymous visitors to views in REPLICA_VIEW_MODULES,
+ReplicaRoutingMiddleware lets ReplicaRouter send reads to one replica,
+picked by weight among the healthy ones and kept for the whole request.
+Everything else reads from the primary:
+
+- writes, and every read after a write in the same request;
+- reads inside a transaction on the primary;
+- reads of a model whose content version was bumped in the last
+  REPLICA_MAX_LAG (plus one health check interval) seconds. Pages, fragments
+  and ETags are cached under the new version, so they must not be rendered
+  from a replica that has not caught up with the change;
+- sessions, which are written on every request;
+- requests within REPLICA_PIN_SECONDS of a write by the same browser. A
+  request that writes sets a short-lived cookie, so a visitor who has no
+  session still sees their own writes on the next page despite lag.
+  Writes the visitor never reads back, such as view counters, are made
+  inside unpinned() and neither set the cookie nor move later reads.
+
+A background thread per process checks every replica each
+REPLICA_HEALTH_INTERVAL seconds (and, on MySQL, its replication lag
+against REPLICA_MAX_LAG, or whether replication has stopped). Replicas that fail or have not been checked yet
+get no traffic; with none healthy, reads go to the primary.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .caching import changed_recently
+from .metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'primary_pin'
+
+# Replication lag of a replica whose replication threads are not running
+STOPPED = 'stopped'
+
+# Models whose reads must always see the latest write
+PRIMARY_ONLY_APPS = ('sessions',)
+
+READS = Counter('db_routed_reads_total', 'Reads routed by the replica router by database', ['database'])
+
+
+class _RequestRouting:
+    """Routing decisions of the request being served"""
+
+    def __init__(self):
+        self.enabled = False
+        self.replica = None
+        self.wrote = False
+        # Model -> whether it changed within the replication lag, looked up once per request
+        self.changed = {}
+
+
+_routing = contextvars.ContextVar('replica_routing', default=None)
+
+
+@contextmanager
+def unpinned():
+    """Make writes that the request and the visitor's next pages need not read back"""
+    routing = _routing.get()
+    wrote = routing is not None and routing.wrote
+    try:
+        yield
+    finally:
+        if routing is not None:
+            routing.wrote = wrote
+
+
+class ReplicaPool:
+    """Replica aliases with weights and health, checked from a background thread"""
+
+    def __init__(self, weights, interval, max_lag):
+        self.weights = dict(weights)
+        self.interval = interval
+        self.max_lag = max_lag
+        # None until the first check: unknown replicas get no traffic
+        self.healthy = {alias: None for alias in self.weights}
+        self.lag = {}
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._checked = threading.Event()
+
+    def choose(self):
+        """A healthy replica alias picked by weight, or None"""
+        self._ensure_started()
+        aliases = [alias for alias, healthy in self.healthy.items() if healthy]
+        if not aliases:
+            return None
+        return random.choices(aliases, weights=[self.weights[alias] for alias in aliases])[0]
+
+    def _ensure_started(self):
+        # Restart after a fork: threads do not survive into worker processes
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self.healthy = {alias: None for alias in self.weights}
+            self._checked.clear()
+            self._thread = threading.Thread(target=self._run, name='replica-health', daemon=True)
+            self._thread.start()
+
+    def wait_until_checked(self, timeout=None):
+        """Block until every replica has been checked once (for tests and tools)"""
+        self._ensure_started()
+        return self._checked.wait(timeout)
+
+    def _run(self):
+        while True:
+            for alias in self.weights:
+                self.healthy[alias] = self.check(alias)
+            self._checked.set()
+            time.sleep(self.interval)
+
+    def check(self, alias):
+        """Whether ``alias`` answers and, where it can be measured, is not lagging too far behind"""
+        connection = connections[alias]
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+                cursor.fetchone()
+                lag = self._replication_lag(connection, cursor)
+        except Exception as exc:
+            if self.healthy.get(alias) is not False:
+                logger.warning("Replica %s failed its health check: %s", alias, exc)
+            # Reconnect from scratch on the next check
+            connection.close()
+            return False
+
+        self.lag[alias] = lag
+        if lag is STOPPED:
+            if self.healthy.get(alias) is not False:
+                logger.warning("Replica %s has stopped replicating", alias)
+            return False
+        if lag is not None and lag > self.max_lag:
+            if self.healthy.get(alias) is not False:
+                logger.warning("Replica %s is %ss behind the primary", alias, lag)
+            return False
+        if self.healthy.get(alias) is False:
+            logger.info("Replica %s is healthy again", alias)
+        return True
+
+    def _replication_lag(self, connection, cursor):
+        """Seconds behind the primary, STOPPED, or None where lag cannot be measured"""
+        if connection.vendor != 'mysql':
+            return None
+        try:
+            cursor.execute('SHOW REPLICA STATUS')
+        except Exception:
+            # Older servers, or no REPLICATION CLIENT privilege: lag is unknown
+            return None
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        columns = [column[0] for column in cursor.description]
+        status = dict(zip(columns, row))
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        # NULL while the IO or SQL thread is stopped: the replica is falling further behind
+        return STOPPED if lag is None else lag
+
+
+pool = ReplicaPool(
+    settings.DATABASE_REPLICAS,
+    interval=settings.REPLICA_HEALTH_INTERVAL,
+    max_lag=settings.REPLICA_MAX_LAG,
+)
+
+Gauge('db_replica_healthy', 'Whether each read replica passes its health check',
+      lambda: {(alias,): int(bool(healthy)) for alias, healthy in pool.healthy.items()}, ['database'])
+
+
+class ReplicaRouter:
+    """Send reads of replica-enabled requests to a replica and everything else to the primary"""
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not routing.enabled or routing.wrote or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        if model not in routing.changed:
+            routing.changed[model] = changed_recently(model)
+        if routing.changed[model]:
+            return None
+        if routing.replica is None:
+            routing.replica = pool.choose() or DEFAULT_DB_ALIAS
+        READS.inc(database=routing.replica)
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            routing.wrote = True
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in pool.weights:
+            # Objects read from a replica are saved to the primary
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so objects from any of them relate
+        databases = {DEFAULT_DB_ALIAS, *pool.weights}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema by replicating the primary
+        if db in pool.weights:
+            return False
+        return None
+
+
+def _replica_view(view_func):
+    module = getattr(view_func, '__module__', '') or ''
+    return any(module == name or module.startswith(name + '.') for name in settings.REPLICA_VIEW_MODULES)
+
+
+class ReplicaRoutingMiddleware:
+    """Enable replica reads for anonymous public GETs (after AuthenticationMiddleware)"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = _RequestRouting()
+        request._replica_routing = routing
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+
+        if routing.wrote and pool.weights and settings.REPLICA_PIN_SECONDS:
+            # Replicas may not have this write yet; read this browser's next pages from the primary
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite='Lax', secure=request.is_secure())
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not pool.weights or request.method not in ('GET', 'HEAD'):
+            return None
+        if PIN_COOKIE in request.COOKIES or not _replica_view(view_func):
+            return None
+        # Resolves the session and user on the primary, before replica reads are enabled
+        if request.user.is_authenticated:
+            return None
+        request._replica_routing.enabled = True
+        return None
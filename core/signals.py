@@ -0,0 +1,51 @@
+from django.db.models.signals import post_save, post_delete
+
+from .caching import bump_content_version
+from .metrics import EVENT_REGISTRATIONS, FEEDBACK_SUBMISSIONS, INQUIRIES, NEWSLETTER_SUBSCRIPTIONS
+from .models import (
+    SiteSettings, AboutUs, TeamMember, Solution, Feedback,
+    BlogPost, Article, Event, GalleryItem,
+    ContactInquiry, EventRegistration, Newsletter,
+)
+from .registrations import count_registration, uncount_registration
+
+# Models whose changes invalidate cached public pages
+PAGE_CACHE_MODELS = (
+    SiteSettings, AboutUs, TeamMember, Solution, Feedback,
+    BlogPost, Article, Event, GalleryItem,
+)
+
+
+def invalidate_page_cache(sender, **kwargs):
+    """Bump the content version of the saved or deleted model"""
+    bump_content_version(sender)
+
+
+# Connected per model so bulk deletes of other models (logs, newsletter rows)
+# keep Django's fast delete path
+for model in PAGE_CACHE_MODELS:
+    post_save.connect(invalidate_page_cache, sender=model)
+    post_delete.connect(invalidate_page_cache, sender=model)
+
+
+# Business counters exported on /metrics
+BUSINESS_COUNTERS = {
+    ContactInquiry: INQUIRIES,
+    EventRegistration: EVENT_REGISTRATIONS,
+    Newsletter: NEWSLETTER_SUBSCRIPTIONS,
+    Feedback: FEEDBACK_SUBMISSIONS,
+}
+
+
+def count_business_event(sender, created, **kwargs):
+    if created:
+        BUSINESS_COUNTERS[sender].inc()
+
+
+for model in BUSINESS_COUNTERS:
+    post_save.connect(count_business_event, sender=model)
+
+
+# Registrations made outside core.registrations.register() keep Event.registered_count in step
+post_save.connect(count_registration, sender=EventRegistration)
+post_delete.connect(uncount_registration, sender=EventRegistration)
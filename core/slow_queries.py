@@ -0,0 +1,159 @@
+"""
+Capture of slow database queries.
+
+RequestTimingMiddleware times every query through ``execute_wrapper``;
+queries slower than ``SLOW_QUERY_THRESHOLD_MS`` are sampled (at
+``SLOW_QUERY_SAMPLE_RATE``) together with their parameters, the view that
+ran them and a summary of the application frames on the stack. EXPLAIN runs
+on a background worker so the request is not slowed down further. Samples
+are kept in a per-process ring buffer of ``SLOW_QUERY_BUFFER_SIZE`` entries
+and grouped by a normalised fingerprint for display.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+STACK_DEPTH = 6
+PARAM_REPR_LENGTH = 200
+
+# Parameters of queries touching these are never stored
+SENSITIVE_SQL_MARKERS = ('django_session', '"password"', '`password`')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_samples = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+_samples_lock = threading.Lock()
+
+# One worker: EXPLAIN is diagnostic and must not compete with requests
+_explainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='slow-query-explain')
+
+
+def fingerprint(sql):
+    """Normalise literals and IN lists so variants of one query group together"""
+    normalized = _STRING_RE.sub('?', sql)
+    normalized = _NUMBER_RE.sub('?', normalized)
+    normalized = _IN_LIST_RE.sub('IN (...)', normalized)
+    normalized = _WHITESPACE_RE.sub(' ', normalized).strip()
+    return hashlib.md5(normalized.encode()).hexdigest()[:12], normalized
+
+
+def _stack_summary():
+    """The innermost application frames, skipping Django and this module"""
+    base_dir = str(settings.BASE_DIR)
+    frames = []
+    for frame in reversed(traceback.extract_stack()[:-1]):
+        if not frame.filename.startswith(base_dir) or 'site-packages' in frame.filename:
+            continue
+        if frame.filename.endswith(('slow_queries.py', 'instrumentation.py')):
+            continue
+        frames.append(f"{frame.filename[len(base_dir) + 1:]}:{frame.lineno} in {frame.name}")
+        if len(frames) >= STACK_DEPTH:
+            break
+    return frames
+
+
+def _param_reprs(sql, params):
+    if params is None:
+        return []
+    if any(marker in sql for marker in SENSITIVE_SQL_MARKERS):
+        return ['<redacted>']
+    if isinstance(params, dict):
+        params = params.values()
+    return [repr(param)[:PARAM_REPR_LENGTH] for param in params]
+
+
+def should_capture(duration):
+    threshold = settings.SLOW_QUERY_THRESHOLD_MS
+    rate = settings.SLOW_QUERY_SAMPLE_RATE
+    return duration * 1000 >= threshold and rate > 0 and random.random() < rate
+
+
+def capture(sql, params, many, duration, alias, view):
+    """Record a slow query and queue its EXPLAIN"""
+    key, normalized = fingerprint(sql)
+    sample = {
+        'fingerprint': key,
+        'normalized': normalized,
+        'sql': sql,
+        'params': [] if many else _param_reprs(sql, params),
+        'many': many,
+        'duration_ms': duration * 1000,
+        'alias': alias,
+        'view': view,
+        'stack': _stack_summary(),
+        'captured_at': timezone.now(),
+        'explain': None,
+    }
+    with _samples_lock:
+        _samples.append(sample)
+
+    if not many and sql.lstrip().upper().startswith('SELECT'):
+        _explainer.submit(_explain, sample, params)
+
+
+def _explain(sample, params):
+    close_old_connections()
+    try:
+        connection = connections[sample['alias']]
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sample['sql']}", params)
+            rows = cursor.fetchall()
+        sample['explain'] = '\n'.join(' | '.join(str(col) for col in row) for row in rows)
+    except Exception as e:
+        logger.warning("EXPLAIN failed for slow query %s: %s", sample['fingerprint'], e)
+        sample['explain'] = f'EXPLAIN failed: {e}'
+    finally:
+        close_old_connections()
+
+
+def slow_query_groups():
+    """Captured samples grouped by fingerprint, slowest group first"""
+    with _samples_lock:
+        samples = list(_samples)
+
+    groups = {}
+    for sample in samples:
+        group = groups.get(sample['fingerprint'])
+        if group is None:
+            group = groups[sample['fingerprint']] = {
+                'fingerprint': sample['fingerprint'],
+                'normalized': sample['normalized'],
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': set(),
+                'last_seen': sample['captured_at'],
+                'slowest': sample,
+            }
+        group['count'] += 1
+        group['total_ms'] += sample['duration_ms']
+        group['views'].add(sample['view'] or '-')
+        group['last_seen'] = max(group['last_seen'], sample['captured_at'])
+        if sample['duration_ms'] >= group['max_ms']:
+            group['max_ms'] = sample['duration_ms']
+            group['slowest'] = sample
+
+    for group in groups.values():
+        group['mean_ms'] = group['total_ms'] / group['count']
+        group['views'] = sorted(group['views'])
+    return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+
+
+def clear_slow_queries():
+    with _samples_lock:
+        _samples.clear()
@@ -0,0 +1,70 @@
+from django import template
+from django.conf import settings
+from django.template.defaulttags import CsrfTokenNode
+
+from core.caching import CSRF_PLACEHOLDER, get_content_versions, get_or_recompute
+from core.models import SiteSettings
+
+register = template.Library()
+
+FRAGMENT_KEY_PREFIX = 'fragment:'
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+        self.uses_csrf = bool(nodelist.get_nodes_by_type(CsrfTokenNode))
+
+    def render(self, context):
+        timeout = settings.FRAGMENT_CACHE_TIMEOUT
+        if not timeout:
+            return self.nodelist.render(context)
+
+        user = context.get('user')
+        auth_state = 'auth' if user is not None and user.is_authenticated else 'anon'
+        vary = ':'.join(str(var.resolve(context)) for var in self.vary_on)
+        key = f"{FRAGMENT_KEY_PREFIX}{self.name}:{auth_state}:{vary}"
+
+        def render_fragment():
+            content = self.nodelist.render(context)
+            if self.uses_csrf:
+                content = content.replace(str(context.get('csrf_token')), CSRF_PLACEHOLDER)
+            return content
+
+        content = get_or_recompute(
+            key,
+            render_fragment,
+            timeout,
+            version=get_content_versions([SiteSettings]),
+        )
+        if self.uses_csrf:
+            content = content.replace(CSRF_PLACEHOLDER, str(context.get('csrf_token')))
+        return content
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """
+    Cache shared page chrome until SiteSettings changes.
+
+    Usage::
+
+        {% load fragment_cache %}
+        {% cachedfragment "footer" [vary_on ...] %} ... {% endcachedfragment %}
+
+    Fragments are keyed on their name, the visitor's auth state and any extra
+    ``vary_on`` values. A ``{% csrf_token %}`` inside the fragment is
+    rendered per request.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name.")
+
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+
+    name = bits[1].strip('"\'')
+    vary_on = [parser.compile_filter(bit) for bit in bits[2:]]
+    return CachedFragmentNode(nodelist, name, vary_on)
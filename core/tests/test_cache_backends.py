@@ -0,0 +1,27 @@
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.test import SimpleTestCase
+
+from core.cache_backends import LockedFileBasedCache
+
+
+class LockedFileBasedCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = LockedFileBasedCache(directory.name, {})
+
+    def test_concurrent_incr_hands_out_distinct_values(self):
+        self.cache.add('generation', 0, timeout=None)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            values = list(executor.map(lambda _: self.cache.incr('generation'), range(200)))
+
+        self.assertEqual(sorted(values), list(range(1, 201)))
+
+    def test_concurrent_add_succeeds_once(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            added = list(executor.map(lambda token: self.cache.add('lock:page', token, 60), range(50)))
+
+        self.assertEqual(added.count(True), 1)
+        self.assertEqual(self.cache.get('lock:page'), added.index(True))
@@ -0,0 +1,16 @@
+from io import StringIO
+
+from django.test import TransactionTestCase
+
+from core.management.commands import check_query_budgets
+
+
+class QueryBudgetTests(TransactionTestCase):
+    """Not a TestCase: load_data sets session options that cannot change inside a transaction"""
+
+    def test_views_work_and_stay_within_their_budgets(self):
+        output = StringIO()
+        command = check_query_budgets.Command(stdout=output)
+        failures = command.check_views({'scale': 5, 'only': None, 'show_sql': False, 'verbosity': 1})
+
+        self.assertEqual(failures, [], output.getvalue())
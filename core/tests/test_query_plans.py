@@ -0,0 +1,10 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_their_index(self):
+        # Raises CommandError naming every hot query that does not
+        call_command('check_query_plans', stdout=StringIO())
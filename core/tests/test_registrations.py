@@ -0,0 +1,84 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.db import close_old_connections, connection
+from django.db.models import Count
+from django.db.models.query import QuerySet
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import registrations
+from core.models import Event, EventRegistration
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RegistrationTests(TransactionTestCase):
+    """Not a TestCase: register() commits, and the stress test needs other threads to see its rows"""
+
+    def create_event(self, capacity):
+        return Event.objects.create(
+            title='Registration test', description='<p>Test event.</p>', event_type='webinar',
+            date=timezone.localdate() + timedelta(days=30), time='10:00', location='Online',
+            capacity=capacity, status='upcoming')
+
+    def assertSeats(self, event, registered):
+        event.refresh_from_db()
+        self.assertEqual(event.registered_count, registered)
+        self.assertEqual(EventRegistration.objects.filter(event=event).count(), registered)
+
+    def test_last_seat_goes_to_one_registration(self):
+        event = self.create_event(capacity=1)
+
+        self.assertEqual(registrations.register(event, 'first@example.com', name='First'), registrations.REGISTERED)
+        # The conditional UPDATE matches no row once registered_count reaches capacity
+        self.assertEqual(registrations.register(event, 'second@example.com', name='Second'), registrations.FULL)
+        self.assertSeats(event, 1)
+
+    def test_repeated_email_is_a_duplicate(self):
+        event = self.create_event(capacity=5)
+
+        registrations.register(event, 'same@example.com', name='First')
+        self.assertEqual(registrations.register(event, 'same@example.com', name='Again'), registrations.DUPLICATE)
+        self.assertSeats(event, 1)
+
+    def test_concurrent_duplicate_is_rolled_back_and_reported(self):
+        event = self.create_event(capacity=5)
+        registrations.register(event, 'same@example.com', name='First')
+
+        # As if the other submit committed between this one's check and its insert
+        with mock.patch.object(QuerySet, 'exists', side_effect=[False, True]):
+            outcome = registrations.register(event, 'same@example.com', name='Again')
+
+        self.assertEqual(outcome, registrations.DUPLICATE)
+        # The unique constraint failed the insert, which gave the seat back
+        self.assertSeats(event, 1)
+
+    def test_concurrent_registrations_do_not_overbook(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('threads cannot write to an in-memory SQLite database concurrently')
+        capacity = 20
+        event = self.create_event(capacity=capacity)
+        url = reverse('event_registration', args=[event.pk])
+        # Every fifth request repeats the email before it, so double submits race each other
+        emails = [f'stress{i - 1 if i % 5 == 4 else i}@example.com' for i in range(100)]
+
+        def send(email):
+            try:
+                response = Client().post(url, {'name': 'Stress Test', 'email': email})
+                return json.loads(response.content)['success']
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            told_registered = sum(executor.map(send, emails))
+
+        self.assertSeats(event, capacity)
+        self.assertEqual(told_registered, capacity)
+        repeated = (EventRegistration.objects.filter(event=event)
+                    .values('email').annotate(n=Count('pk')).filter(n__gt=1))
+        self.assertFalse(repeated.exists())
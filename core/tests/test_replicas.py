@@ -0,0 +1,68 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core.models import BlogPost, SiteSettings
+from core.replicas import PIN_COOKIE, ReplicaRouter, pool
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, DATABASE_REPLICAS={'replica': 1})
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Every alias is the test database here: the router's choices are recorded
+    and the queries themselves run on the primary.
+    """
+
+    def setUp(self):
+        self.post = BlogPost.objects.create(
+            title='Original title', slug='lag', excerpt='Excerpt', content='<p>Body</p>',
+            category='news', status='published', published_at=timezone.now())
+        # Long enough ago for every replica to have caught up
+        cache.clear()
+
+        self.routed = []
+        route = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            self.routed.append((model, route(router, model, **hints)))
+            return None
+
+        for patcher in (mock.patch.object(pool, 'weights', {'replica': 1}),
+                        mock.patch.object(pool, 'healthy', {'replica': True}),
+                        mock.patch.object(pool, '_ensure_started'),
+                        mock.patch.object(ReplicaRouter, 'db_for_read', record)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def reads(self, model):
+        return {alias for routed, alias in self.routed if routed is model}
+
+    def test_view_counter_does_not_pin_readers(self):
+        for _ in range(2):
+            # A render, then a cache hit
+            response = self.client.get(self.post.get_absolute_url())
+            self.assertNotIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(self.reads(BlogPost), {'replica'})
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views_count, 2)
+
+    def test_page_rendered_after_a_change_does_not_read_it_from_a_replica(self):
+        self.client.get(self.post.get_absolute_url())
+        self.assertEqual(self.reads(BlogPost), {'replica'})
+
+        # Bumps the BlogPost content version, see core.signals
+        self.post.title = 'New title'
+        self.post.save()
+        self.routed.clear()
+        response = self.client.get(self.post.get_absolute_url())
+
+        # The page is cached under the new version, so it must not be
+        # rendered from a replica that may not have the new title yet
+        self.assertContains(response, 'New title')
+        self.assertEqual(self.reads(BlogPost), {None})
+        self.assertEqual(self.reads(SiteSettings), {'replica'})
@@ -27,4 +27,9 @@ urlpatterns = [
     path('api/chatbot/', views.chatbot_response, name='chatbot_response'),
     path('api/download-article/<int:article_id>/', views.download_article, name='download_article'),
     path('api/register-event/<int:event_id>/', views.event_registration, name='event_registration'),
+    path('api/gallery/', views.gallery_items_api, name='gallery_items_api'),
+    path('api/gallery/<int:item_id>/', views.gallery_item_api, name='gallery_item_api'),
+    
+    # Monitoring
+    path('metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -2,14 +2,25 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.http import JsonResponse, HttpResponse, Http404
 from django.contrib import messages
 from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Q, F
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.utils.crypto import constant_time_compare
+from datetime import date
 import json
 import random
 
+from .caching import cache_public_page
+from .conditional import conditional_page
+from .metrics import CHATBOT_MESSAGES, render as render_metrics
+from .query_budgets import query_budget
+from .replicas import unpinned
+from . import registrations
 from .forms import ContactForm, FeedbackForm, NewsletterForm, ArticleForm ,EventForm, GalleryItemForm
 from .models import *
 
@@ -19,6 +30,9 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 
+@query_budget(7)
+@conditional_page()
+@cache_public_page(SiteSettings, AboutUs, Solution, Feedback, BlogPost)
 def home(request):
     """Homepage view"""
     
@@ -59,6 +73,9 @@ def home(request):
     return render(request, 'frontend/index.html', context)
 
 
+@query_budget(5)
+@conditional_page()
+@cache_public_page(SiteSettings, AboutUs, TeamMember)
 def about(request):
     """About us page"""
     about_us = AboutUs.objects.first()
@@ -72,6 +89,9 @@ def about(request):
     
     return render(request, 'frontend/about.html', context)
 
+@query_budget(4)
+@conditional_page()
+@cache_public_page(SiteSettings, Solution)
 def solutions(request):
     """Solutions page with filtering"""
     category = request.GET.get('category', '')
@@ -93,6 +113,9 @@ def solutions(request):
     
     return render(request, 'frontend/solutions.html', context)
 
+@query_budget(5)
+@conditional_page()
+@cache_public_page(SiteSettings, Solution)
 def solution_detail(request, solution_id):
     """Solution detail page"""
     solution = get_object_or_404(Solution, id=solution_id, is_active=True)
@@ -106,6 +129,7 @@ def solution_detail(request, solution_id):
     
     return render(request, 'frontend/solution_detail.html', context)
 
+@query_budget(2)
 def contact(request):
     """Contact page with form"""
     if request.method == 'POST':
@@ -124,6 +148,9 @@ def contact(request):
     
     return render(request, 'frontend/contact.html', context)
 
+@query_budget(5)
+@conditional_page()
+@cache_public_page(SiteSettings, BlogPost)
 def blog(request):
     """Blog listing page"""
     category = request.GET.get('category', '')
@@ -157,12 +184,21 @@ def blog(request):
     
     return render(request, 'frontend/blog.html', context)
 
+def _count_blog_view(request, slug):
+    """Increment the view counter without touching the page cache version"""
+    # Runs on every view, cache hits included: it must not pin readers to the primary
+    with unpinned():
+        BlogPost.objects.filter(slug=slug, status='published').update(views_count=F('views_count') + 1)
+
+@query_budget(6)
+@conditional_page(on_not_modified=_count_blog_view)
+@cache_public_page(SiteSettings, BlogPost, on_hit=_count_blog_view)
 def blog_detail(request, slug):
     """Blog post detail page"""
     post = get_object_or_404(BlogPost, slug=slug, status='published')
     
+    _count_blog_view(request, slug)
     post.views_count += 1
-    post.save(update_fields=['views_count'])
     
     related_posts = BlogPost.objects.filter(category=post.category, status='published').exclude(id=post.id)[:3]
     
@@ -174,6 +210,9 @@ def blog_detail(request, slug):
     
     return render(request, 'frontend/blog_detail.html', context)
 
+@query_budget(5)
+@conditional_page()
+@cache_public_page(SiteSettings, Article)
 def articles(request):
     """Articles page"""
     article_type = request.GET.get('type', '')
@@ -208,13 +247,14 @@ def add_article(request):
     else:
         form = ArticleForm()
     
-    return render(request, 'add_article.html', {'form': form})
+    return render(request, 'core/add_article.html', {'form': form})
 
 def article_list(request):
     """List all articles"""
     articles = Article.objects.filter(status='published')
     return render(request, 'core/article_list.html', {'articles': articles})
 
+@query_budget(2)
 def article_detail(request, pk):
     """Display a single article"""
     article = get_object_or_404(Article, pk=pk)
@@ -225,19 +265,87 @@ def event_list(request):
     events = Event.objects.filter(status='upcoming')
     return render(request, 'core/event_list.html', {'events': events})
 
-def gallery(request):
-    """Gallery page"""
-    category = request.GET.get('category', '')
-    queryset = GalleryItem.objects.all()
-    
+GALLERY_PAGE_SIZE = 12
+
+
+def _encode_gallery_cursor(item):
+    """Encode the (event_date, order, id) position of a gallery item"""
+    raw = f"{item.event_date.isoformat()}|{item.order}|{item.id}"
+    return urlsafe_base64_encode(raw.encode())
+
+
+def _decode_gallery_cursor(cursor):
+    """Decode a gallery cursor, returning None if it is malformed"""
+    try:
+        event_date, order, item_id = urlsafe_base64_decode(cursor).decode().split('|')
+        return date.fromisoformat(event_date), int(order), int(item_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def _gallery_page(category='', cursor=None):
+    """Return one page of gallery items and the cursor for the next page.
+
+    Items are ordered by (-event_date, order, id) and paginated by keyset, so
+    fetching a deep page costs the same as fetching the first one.
+    """
+    items = list(gallery_queryset(category, cursor)[:GALLERY_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(items) > GALLERY_PAGE_SIZE:
+        items = items[:GALLERY_PAGE_SIZE]
+        next_cursor = _encode_gallery_cursor(items[-1])
+
+    return items, next_cursor
+
+
+def gallery_queryset(category='', cursor=None):
+    """Gallery items in page order, starting after the decoded ``cursor`` (see check_query_plans)"""
+    queryset = GalleryItem.objects.only(
+        'id', 'title', 'description', 'image', 'category', 'event_date',
+        'location', 'event_name', 'is_featured', 'order',
+    )
+
     if category:
         queryset = queryset.filter(category=category)
-    
-    gallery_items = queryset.order_by('-event_date', 'order')
+
+    if cursor:
+        event_date, order, item_id = cursor
+        queryset = queryset.filter(
+            Q(event_date__lt=event_date) |
+            Q(event_date=event_date, order__gt=order) |
+            Q(event_date=event_date, order=order, id__gt=item_id)
+        )
+
+    return queryset.order_by('-event_date', 'order', 'id')
+
+
+def _gallery_card(item):
+    """Compact gallery record used by the infinite-scroll grid"""
+    return {
+        'id': item.id,
+        'title': item.title,
+        'excerpt': Truncator(strip_tags(item.description)).words(15),
+        'category': item.get_category_display(),
+        'event_date': item.event_date.strftime('%b %d, %Y'),
+        'location': item.location,
+        'event_name': item.event_name,
+        'image': item.image.url if item.image else '',
+        'is_featured': item.is_featured,
+    }
+
+
+@query_budget(4)
+@conditional_page()
+@cache_public_page(SiteSettings, GalleryItem)
+def gallery(request):
+    """Gallery page (first screen only, the rest is fetched on scroll)"""
+    category = request.GET.get('category', '')
+    gallery_items, next_cursor = _gallery_page(category)
     categories = GalleryItem.CATEGORY_CHOICES
     
     context = {
         'gallery_items': gallery_items,
+        'next_cursor': next_cursor,
         'categories': categories,
         'selected_category': category,
         'settings': SiteSettings.load(),
@@ -245,6 +353,50 @@ def gallery(request):
     
     return render(request, 'frontend/gallery.html', context)
 
+@query_budget(1)
+@require_http_methods(["GET"])
+def gallery_items_api(request):
+    """Paginated gallery items for infinite scroll"""
+    category = request.GET.get('category', '')
+    cursor = request.GET.get('cursor', '')
+
+    decoded = None
+    if cursor:
+        decoded = _decode_gallery_cursor(cursor)
+        if decoded is None:
+            return JsonResponse({'success': False, 'error': 'Invalid cursor'}, status=400)
+
+    items, next_cursor = _gallery_page(category, decoded)
+
+    return JsonResponse({
+        'success': True,
+        'items': [_gallery_card(item) for item in items],
+        'next_cursor': next_cursor,
+    })
+
+@query_budget(1)
+@require_http_methods(["GET"])
+def gallery_item_api(request, item_id):
+    """Full gallery item data for the lightbox modal"""
+    item = get_object_or_404(GalleryItem, id=item_id)
+
+    return JsonResponse({
+        'success': True,
+        'item': {
+            'id': item.id,
+            'title': item.title,
+            'description': strip_tags(item.description),
+            'category': item.get_category_display(),
+            'event_date': item.event_date.strftime('%B %d, %Y'),
+            'location': item.location,
+            'event_name': item.event_name,
+            'image': item.image.url if item.image else '',
+        },
+    })
+
+@query_budget(4)
+@conditional_page()
+@cache_public_page(SiteSettings, Event)
 def events(request):
     """Events page"""
     event_type = request.GET.get('type', '')
@@ -412,25 +564,46 @@ def chatbot_response(request):
         }
         
         response = "I'm sorry, I didn't understand that. Could you please rephrase your question or contact our support team?"
+        matched = False
         
         for keyword, reply in responses.items():
             if keyword in message:
                 response = reply
+                matched = True
                 break
         
+        CHATBOT_MESSAGES.inc(matched=str(matched).lower())
+        
         return JsonResponse({'success': True, 'response': response})
     except Exception:
         return JsonResponse({'success': False, 'response': 'Sorry, I encountered an error. Please try again.'})
 
+def _metrics_authorized(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if constant_time_compare(header, f'Bearer {token}'):
+            return True
+    # REMOTE_ADDR, not X-Forwarded-For, which clients can set themselves
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+def metrics(request):
+    """Prometheus metrics of every worker, for the monitoring scraper"""
+    if not _metrics_authorized(request):
+        return HttpResponse('Forbidden', status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 def download_article(request, article_id):
     """Download article PDF"""
     article = get_object_or_404(Article, id=article_id)
+    # Article has no PDF field yet: answer 404 instead of failing until it does
+    pdf_file = getattr(article, 'pdf_file', None)
     
-    if article.pdf_file:
+    if pdf_file:
         article.download_count += 1
         article.save(update_fields=['download_count'])
         
-        response = HttpResponse(article.pdf_file.read(), content_type='application/pdf')
+        response = HttpResponse(pdf_file.read(), content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="{article.title}.pdf"'
         return response
     else:
@@ -447,14 +620,14 @@ def event_registration(request, event_id):
         phone = request.POST.get('phone', '')
         company = request.POST.get('company', '')
         
-        registration, created = EventRegistration.objects.get_or_create(
-            event=event,
-            email=email,
-            defaults={'name': name, 'phone': phone, 'company': company}
-        )
-        
-        if created:
+        if not name or not email:
+            return JsonResponse({'success': False, 'message': 'Please enter your name and email.'})
+
+        outcome = registrations.register(event, email, name=name, phone=phone, company=company)
+        if outcome == registrations.REGISTERED:
             return JsonResponse({'success': True, 'message': 'Successfully registered for the event!'})
+        if outcome == registrations.FULL:
+            return JsonResponse({'success': False, 'message': 'Sorry, this event is fully booked.'})
         return JsonResponse({'success': False, 'message': 'You are already registered for this event.'})
     except Exception:
         return JsonResponse({'success': False, 'message': 'An error occurred. Please try again.'})
@@ -472,6 +645,7 @@ def add_event(request):
         form = EventForm()
 
     return render(request, 'core/add_event.html', {'form': form})
+@query_budget(1)
 def add_gallery_item(request):
     """View for adding a new gallery item."""
     if request.method == 'POST':